@@ -0,0 +1,137 @@
+"""
+Cold import time of the src entry points.
+
+    python -m benchmarks.import_time                   # compare to import_baseline.json
+    python -m benchmarks.import_time --save-baseline
+
+Each module is imported in a fresh interpreter, best of --repeat rounds;
+every round imports all modules one after the other, so a busy machine
+slows them all alike. The run fails (exit code 1) when a heavy dependency
+(src/lazy_imports.py) gets imported just by importing the module, or when
+an import is slower than the baseline by more than --tolerance. The
+baseline is first scaled by how much slower importing numpy (a fixed cost
+outside this repo) is than when it was saved, so a machine that is
+uniformly slower does not count as a regression.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.lazy_imports import HEAVY_MODULES
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).resolve().parent / "import_baseline.json"
+ENTRY_POINTS = (
+    "src.fin_data_yf",
+    "src.stock_valuation",
+    "src.llm_valuation_summary",
+    "src.valuation_pipeline",
+    "src.fetch_pipeline",
+    "src.jobs",
+)
+# Slowdowns below this are interpreter start-up noise, never flagged
+NOISE_FLOOR_MS = 30.0
+# Reference import measured in the same rounds as the entry points
+CALIBRATION = "numpy"
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _probe(module: str) -> dict:
+    code = _PROBE.format(module=module, heavy=sorted(HEAVY_MODULES))
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(modules: List[str], repeat: int = 7) -> Dict[str, dict]:
+    """
+    Best import time of each module over `repeat` rounds (one fresh
+    interpreter per module and round), and the heavy modules it pulled in.
+    """
+    runs: Dict[str, List[dict]] = {module: [] for module in modules}
+    for _ in range(repeat):
+        for module in modules:
+            runs[module].append(_probe(module))
+    return {
+        module: {"ms": round(min(r["ms"] for r in results), 2), "loaded": results[0]["loaded"]}
+        for module, results in runs.items()
+    }
+
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict], tolerance: float,
+            scale: float = 1.0) -> List[str]:
+    """Regressions of `current` against `baseline` (times multiplied by `scale`), as printable lines."""
+    problems = []
+    for module, stats in current.items():
+        if stats["loaded"]:
+            problems.append(f"{module}: imports {', '.join(stats['loaded'])}")
+        ref = baseline.get(module)
+        if ref is None:
+            continue
+        now, before = stats["ms"], ref["ms"] * scale
+        if now - before > NOISE_FLOOR_MS and now > before * (1 + tolerance):
+            problems.append(f"{module}: {now:.1f} ms vs baseline {before:.1f} (+{(now / before - 1) * 100:.0f}%)")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.import_time", description="Cold import benchmark.")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown (0.5 = 50%%)")
+    args = parser.parse_args(argv)
+
+    measured = measure([CALIBRATION, *ENTRY_POINTS], args.repeat)
+    calibration_ms = measured.pop(CALIBRATION)["ms"]
+    current = measured
+    baseline, scale = {}, 1.0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            saved = json.load(f)
+        baseline = saved["modules"]
+        if saved.get("calibration_ms"):
+            scale = calibration_ms / saved["calibration_ms"]
+
+    print(f"{'module':<30}{'ms':>10}{'baseline':>12}  heavy imports")
+    for module, stats in current.items():
+        ref = baseline.get(module, {}).get("ms")
+        ref = f"{ref * scale:.1f}" if ref is not None else "-"
+        print(f"{module:<30}{stats['ms']:>10.1f}{ref:>12}  {', '.join(stats['loaded']) or '-'}")
+    print(f"{CALIBRATION} (calibration): {calibration_ms:.1f} ms, baseline times scaled by {scale:.2f}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "machine": {"python": platform.python_version(), "platform": platform.platform()},
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "calibration_ms": calibration_ms,
+                "modules": current,
+            }, f, indent=1)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    problems = compare(current, baseline, args.tolerance, scale)
+    if problems:
+        print("\nRegressions:")
+        for line in problems:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions." if baseline else "\nNo heavy imports (no baseline to compare with).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Speed of the single-ticker Monte Carlo simulation.
+
+    python -m benchmarks.monte_carlo                  # 10M paths, PANW and THYAO.IS
+    python -m benchmarks.monte_carlo --paths 1000000
+    python -m benchmarks.monte_carlo --strict         # exit code 1 when over --target
+
+Fundamentals and scenarios are the template's for the recorded tickers
+(benchmarks/fixtures), so the run is offline. The target is one second for
+10M paths; the current implementation does not reach it on one core (see
+simulate_ticker), which is why the miss is reported rather than failing
+the run unless --strict is given.
+"""
+import argparse
+import sys
+import time
+from typing import List, Optional
+
+from benchmarks.replay import offline
+from src.fin_data_yf import YFinanceDataFetcher
+from src.monte_carlo import simulate_ticker
+from src.stock_valuation import valuation_inputs
+from src.template_cache import DEFAULT_TEMPLATE, get_template
+
+DEFAULT_TICKERS = ("PANW", "THYAO.IS")
+TARGET_SECONDS = 1.0
+
+
+def ticker_inputs(ticker: str, template_path: str = DEFAULT_TEMPLATE):
+    """(fundamentals, scenarios) of `ticker` from the fixtures and the template's scenario inputs."""
+    template = get_template(template_path)
+    data = YFinanceDataFetcher(ticker).fetch_all_data()
+    record = template.schema.record(template.calculate(valuation_inputs(ticker, data, template.schema)))
+    return record.fundamentals, record.scenarios
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.monte_carlo", description="Monte Carlo benchmark.")
+    parser.add_argument("--paths", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tickers", default=",".join(DEFAULT_TICKERS), help="recorded tickers, comma separated")
+    parser.add_argument("--target", type=float, default=TARGET_SECONDS, help="seconds per ticker")
+    parser.add_argument("--strict", action="store_true", help="fail when a ticker is over --target")
+    args = parser.parse_args(argv)
+
+    missed = []
+    with offline():
+        inputs = {t: ticker_inputs(t) for t in args.tickers.split(",") if t.strip()}
+    print(f"{'ticker':<12}{'paths':>12}{'best s':>10}{'Mpaths/s':>10}  target {args.target:.2f} s")
+    for ticker, (fundamentals, scenarios) in inputs.items():
+        runs = []
+        for i in range(args.repeat):
+            start = time.perf_counter()
+            simulate_ticker(fundamentals, scenarios, n_paths=args.paths, seed=i)
+            runs.append(time.perf_counter() - start)
+        best = min(runs)
+        if best > args.target:
+            missed.append(ticker)
+        print(f"{ticker:<12}{args.paths:>12,}{best:>10.3f}{args.paths / best / 1e6:>10.2f}"
+              f"  {'over target' if best > args.target else 'ok'}")
+
+    if missed:
+        print(f"\nOver the {args.target:.2f} s target: {', '.join(missed)}")
+        return 1 if args.strict else 0
+    print("\nWithin target.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
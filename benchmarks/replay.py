@@ -0,0 +1,140 @@
+"""
+Recorded provider data for offline benchmarks.
+
+    python -m benchmarks.replay PANW GOOG THYAO.IS     # re-record (needs network)
+
+fixtures/yfinance.json holds the .info dict and the quarterly statements
+of a few tickers as yfinance returned them; fixtures/llm_responses.json a
+canned LLM answer per ticker (report + SCENARIO_JSON_START block).
+Benchmark tickers are named "B00042-PANW": everything after the first "-"
+picks the recorded ticker, so any number of tickers replays a few fixtures.
+"""
+import json
+import re
+import sys
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+from unittest import mock
+
+import pandas as pd
+
+from src import fin_data_yf
+from src.llm_providers import PROVIDERS, LLMProvider, configure_client
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures"
+YF_FIXTURES = FIXTURE_DIR / "yfinance.json"
+LLM_FIXTURES = FIXTURE_DIR / "llm_responses.json"
+
+STATEMENTS = ("quarterly_income_stmt", "quarterly_balance_sheet")
+
+
+def base_ticker(ticker: str) -> str:
+    """Recorded ticker behind a benchmark ticker ("B00042-PANW" -> "PANW")."""
+    return ticker.split("-", 1)[1] if re.match(r"^B\d+-", ticker) else ticker
+
+
+def benchmark_tickers(n: int, bases: List[str]) -> List[str]:
+    return [f"B{i:05d}-{bases[i % len(bases)]}" for i in range(n)]
+
+
+def _frame(split: dict) -> pd.DataFrame:
+    return pd.DataFrame(split["data"], index=split["index"], columns=pd.to_datetime(split["columns"]))
+
+
+def _split(df: pd.DataFrame) -> dict:
+    return {
+        "index": [str(i) for i in df.index],
+        "columns": [pd.Timestamp(c).strftime("%Y-%m-%d") for c in df.columns],
+        "data": [[None if pd.isna(v) else float(v) for v in row] for row in df.to_numpy()],
+    }
+
+
+def load_fixtures(path=YF_FIXTURES) -> Dict[str, dict]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["tickers"]
+
+
+def load_responses(path=LLM_FIXTURES) -> Dict[str, str]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ReplayTicker:
+    """Stands in for yfinance.Ticker; the statements are rebuilt as DataFrames on every access, like a fetch."""
+
+    def __init__(self, ticker: str, fixtures: Dict[str, dict]):
+        self.ticker = ticker
+        try:
+            self._fixture = fixtures[base_ticker(ticker)]
+        except KeyError:
+            raise ValueError(f"No recorded yfinance data for '{ticker}'")
+
+    @property
+    def info(self) -> dict:
+        return dict(self._fixture["info"])
+
+    @property
+    def quarterly_income_stmt(self) -> pd.DataFrame:
+        return _frame(self._fixture["quarterly_income_stmt"])
+
+    @property
+    def quarterly_balance_sheet(self) -> pd.DataFrame:
+        return _frame(self._fixture["quarterly_balance_sheet"])
+
+
+class ReplayProvider(LLMProvider):
+    """LLM provider answering with the recorded response of the prompt's ticker."""
+
+    name = "replay"
+    default_model = "replay"
+
+    def __init__(self, responses: Dict[str, str]):
+        self.responses = responses
+
+    def generate(self, prompt: str, model: str) -> str:
+        m = re.search(r"^Ticker: (\S*)", prompt, re.MULTILINE)
+        ticker = base_ticker(m.group(1)) if m else ""
+        try:
+            return self.responses[ticker]
+        except KeyError:
+            raise ValueError(f"No recorded LLM response for '{ticker}'")
+
+
+@contextmanager
+def offline(fixtures: Dict[str, dict] = None, responses: Dict[str, str] = None) -> Iterator[None]:
+    """
+    Route yfinance.Ticker to the recorded statements and register the
+    "replay" LLM provider (no rate limit) for the duration of the block.
+    """
+    fixtures = load_fixtures() if fixtures is None else fixtures
+    responses = load_responses() if responses is None else responses
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(
+            fin_data_yf.yf, "Ticker", lambda ticker, *a, **k: ReplayTicker(ticker, fixtures),
+        ))
+        stack.enter_context(mock.patch.dict(PROVIDERS, {"replay": ReplayProvider}))
+        configure_client("replay", {"responses": responses}, requests_per_second=None, max_retries=0)
+        yield
+
+
+def record_fixtures(tickers: List[str], path=YF_FIXTURES):
+    """Fetch `tickers` from Yahoo Finance and store them as fixtures."""
+    import yfinance as yf
+
+    fixtures = {}
+    for ticker in tickers:
+        t = yf.Ticker(ticker)
+        info = t.info or {}
+        fixtures[ticker] = {
+            "info": {k: info.get(k) for k in ("currentPrice", "regularMarketPrice", "sharesOutstanding",
+                                              "mostRecentQuarter", "earningsTimestamp")},
+            **{name: _split(getattr(t, name)) for name in STATEMENTS},
+        }
+        print(f"Recorded {ticker}")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"recorded_at": pd.Timestamp.now().strftime("%Y-%m-%d"), "tickers": fixtures}, f, indent=1)
+
+
+if __name__ == "__main__":
+    record_fixtures(sys.argv[1:] or list(load_fixtures()))
@@ -0,0 +1,279 @@
+"""
+Offline benchmark of the valuation stages.
+
+    python -m benchmarks.run                      # 1, 100 and 5000 tickers, compared to baseline.json
+    python -m benchmarks.run --sizes 1,100
+    python -m benchmarks.run --save-baseline      # store this run as the new baseline
+
+Every ticker goes through value_stock -> load_valuation_excel ->
+generate_llm_investment_summary -> write_llm_result_to_excel on recorded
+yfinance data and canned LLM answers (benchmarks/replay.py), with the
+caches and the valuation history off. Each call and its inner stages
+(fetch, calculate, load, save, ...) are timed; sizes below 1000 tickers
+are run --repeat times and the median run is compared, since a single
+call can take several times its usual time. The run fails (exit code 1)
+when a stage is slower than the baseline by more than --tolerance and
+NOISE_FLOOR_MS, when the predictions of the recorded tickers differ from
+the baseline, or when projection.project disagrees with the template on
+their targets.
+"""
+import argparse
+import functools
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, redirect_stdout
+from pathlib import Path
+from typing import Dict, List, Optional
+from unittest import mock
+
+import numpy as np
+
+from benchmarks.replay import base_ticker, benchmark_tickers, load_fixtures, offline
+from src import llm_valuation_summary, stock_valuation
+from src.fin_data_yf import YFinanceDataFetcher
+from src.llm_valuation_summary import (
+    generate_llm_investment_summary,
+    load_valuation_excel,
+    write_llm_result_to_excel,
+)
+from src.projection import discount_rates, project
+from src.stock_valuation import valuation_inputs, value_stock
+from src.template_cache import DEFAULT_TEMPLATE, TemplateModel, get_template
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_SIZES = (1, 100, 5000)
+# Sizes from this one up are run once: their per-ticker time already
+# averages that many calls
+REPEAT_BELOW = 1000
+# Slowdowns below this (ms per ticker) are never flagged: the median of 5
+# runs of one ticker still moves by up to ~1 ms from one invocation to the next
+NOISE_FLOOR_MS = 1.0
+
+
+class StageTimer:
+    """
+    Per-call durations of named stages. Inner stages are recorded under
+    the outer one ("value_stock.save" vs "write_llm_result.save").
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self._outer: Optional[str] = None
+
+    def outer(self, name: str, fn, *args, **kwargs):
+        self._outer = name
+        try:
+            return self._timed(name, fn, *args, **kwargs)
+        finally:
+            self._outer = None
+
+    def _timed(self, name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - start)
+
+    def wrap(self, stage: str, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if self._outer is None:
+                return fn(*args, **kwargs)
+            return self._timed(f"{self._outer}.{stage}", fn, *args, **kwargs)
+        return wrapper
+
+    def summary(self, n: int) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for name, values in sorted(self.samples.items()):
+            ms = np.asarray(values) * 1000
+            out[name] = {
+                "total_s": round(float(ms.sum()) / 1000, 4),
+                "per_ticker_ms": round(float(ms.sum()) / n, 4),
+                "p50_ms": round(float(np.percentile(ms, 50)), 4),
+                "p95_ms": round(float(np.percentile(ms, 95)), 4),
+            }
+        return out
+
+
+def _instrument(timer: StageTimer) -> ExitStack:
+    # (owner, attribute, stage name): patched where the callers look them up
+    targets = [
+        (YFinanceDataFetcher, "fetch_all_data", "fetch"),
+        (TemplateModel, "calculate", "calculate"),
+        (stock_valuation, "build_valuation_workbook", "build"),
+        (stock_valuation, "save_workbook_with_values", "save"),
+        (llm_valuation_summary.openpyxl, "load_workbook", "load"),
+        (llm_valuation_summary, "context_from_values", "context"),
+        (llm_valuation_summary, "build_investment_prompt", "prompt"),
+        (llm_valuation_summary, "_call_llm", "llm"),
+        (llm_valuation_summary, "apply_llm_result", "apply"),
+        (llm_valuation_summary, "recalculate_worksheet", "recalc"),
+        (llm_valuation_summary, "save_workbook_with_values", "save"),
+    ]
+    stack = ExitStack()
+    for owner, attr, stage in targets:
+        stack.enter_context(mock.patch.object(owner, attr, timer.wrap(stage, getattr(owner, attr))))
+    return stack
+
+
+def run_size(n: int, bases: List[str], workdir: str) -> dict:
+    """Value `n` tickers one after the other; returns stage timings and the predictions per recorded ticker."""
+    timer = StageTimer()
+    results = {}
+    out_dir = os.path.join(workdir, f"n{n}")
+    # value_stock prints a line per saved file
+    with _instrument(timer), redirect_stdout(io.StringIO()):
+        for ticker in benchmark_tickers(n, bases):
+            path = os.path.join(out_dir, f"{ticker}.xlsx")
+            timer.outer("value_stock", value_stock, ticker, save_file=True, template_path=DEFAULT_TEMPLATE,
+                        output_path=path, use_cache=False, history=False)
+            context = timer.outer("load_valuation_excel", load_valuation_excel, path)
+            llm_text = timer.outer("generate_llm_summary", generate_llm_investment_summary,
+                                   context, "replay", "replay", False)
+            _, predictions, output = timer.outer(
+                "write_llm_result", write_llm_result_to_excel, path, ticker, llm_text,
+                output_path=os.path.join(out_dir, "ai", f"{ticker}.xlsx"), history=False, remove_input=True,
+            )
+            os.remove(output)
+            results.setdefault(base_ticker(ticker), {k: v for k, v in predictions.items() if k != "ticker"})
+    return {"stages": timer.summary(n), "results": results}
+
+
+def median_run(runs: List[dict]) -> dict:
+    """One run_size() result from repeats of it: the median of every stage statistic."""
+    stages = {}
+    for stage in runs[0]["stages"]:
+        samples = [run["stages"][stage] for run in runs if stage in run["stages"]]
+        stages[stage] = {stat: round(float(np.median([s[stat] for s in samples])), 4) for stat in samples[0]}
+    return {"stages": stages, "results": runs[0]["results"], "repeats": len(runs)}
+
+
+def check_projection(tickers: List[str], template_path: str = DEFAULT_TEMPLATE) -> List[str]:
+    """
+    Discounted targets of projection.project against the template engine
+    (B38 / C38) for each case of the recorded tickers, .IS ones included.
+    """
+    template = get_template(template_path)
+    problems = []
+    for ticker in tickers:
+        data = YFinanceDataFetcher(ticker).fetch_all_data()
+        record = template.schema.record(template.calculate(valuation_inputs(ticker, data, template.schema)))
+        for case, target in (("mid", record.mid_target), ("good", record.good_target)):
+            projected = float(project(
+                record.fundamentals["revenue_qtr"],
+                record.fundamentals["shares_outstanding"],
+                disc_rate=discount_rates([ticker], case)[0],
+                **{key: cases[case] or 0.0 for key, cases in record.scenarios.items()},
+            )["price_5y_disc"])
+            if target is None or not np.isclose(projected, target, rtol=1e-9):
+                problems.append(f"{ticker} {case}: project() gives {projected:.2f}, the template {target}")
+    return problems
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of `current` against `baseline`, as printable lines."""
+    problems = []
+    for size, run in current["runs"].items():
+        base = baseline.get("runs", {}).get(size)
+        if base is None:
+            continue
+        for ticker, predictions in run["results"].items():
+            expected = base["results"].get(ticker)
+            if expected is not None and expected != predictions:
+                problems.append(f"n={size} {ticker}: predictions {predictions} != baseline {expected}")
+        for stage, stats in run["stages"].items():
+            ref = base["stages"].get(stage)
+            if ref is None:
+                continue
+            now, before = stats["per_ticker_ms"], ref["per_ticker_ms"]
+            if now - before > NOISE_FLOOR_MS and now > before * (1 + tolerance):
+                problems.append(f"n={size} {stage}: {now:.3f} ms/ticker vs baseline {before:.3f} "
+                                f"(+{(now / before - 1) * 100:.0f}%)")
+    return problems
+
+
+def print_report(current: dict, baseline: Optional[dict]):
+    for size, run in current["runs"].items():
+        base = (baseline or {}).get("runs", {}).get(size, {}).get("stages", {})
+        print(f"\n== {size} ticker(s) ==")
+        print(f"{'stage':<36}{'total s':>10}{'ms/ticker':>12}{'p95 ms':>10}{'baseline':>12}")
+        for stage, stats in run["stages"].items():
+            ref = base.get(stage, {}).get("per_ticker_ms")
+            ref = f"{ref:.3f}" if ref is not None else "-"
+            print(f"{stage:<36}{stats['total_s']:>10.3f}{stats['per_ticker_ms']:>12.3f}"
+                  f"{stats['p95_ms']:>10.3f}{ref:>12}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Offline stage benchmarks.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="ticker counts, comma separated")
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown per stage (0.25 = 25%%)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help=f"runs per size below {REPEAT_BELOW} tickers, the median is compared")
+    parser.add_argument("--output", default=None, help="also write this run as JSON")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    bases = list(load_fixtures())
+    current = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": {},
+    }
+    workdir = tempfile.mkdtemp(prefix="valuation-bench-")
+    try:
+        with offline():
+            # Template parsing is a one-off per process, keep it out of the first size
+            value_stock(benchmark_tickers(1, bases)[0], save_file=False, template_path=DEFAULT_TEMPLATE,
+                        use_cache=False, history=False)
+            for n in sizes:
+                repeats = max(1, args.repeat) if n < REPEAT_BELOW else 1
+                print(f"Running {n} ticker(s) x{repeats}...", file=sys.stderr)
+                current["runs"][str(n)] = median_run([run_size(n, bases, workdir) for _ in range(repeats)])
+            mismatches = check_projection(bases)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(current, baseline)
+    if mismatches:
+        print("\nprojection.project does not match the template:")
+        for line in mismatches:
+            print(f"  {line}")
+        return 1
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=1)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    if baseline is None:
+        print("\nNo baseline to compare with (run with --save-baseline).")
+        return 0
+
+    problems = compare(current, baseline, args.tolerance)
+    if problems:
+        print("\nRegressions:")
+        for line in problems:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,8 +6,10 @@ import os
 try:
     # Use dict access to ensure it loads, use .get() to avoid key errors
     GEMINI_API_KEY = st.secrets.get("GEMINI_API_KEY") 
+    OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY")
 
 # Fallback: If running locally without Streamlit context (e.g., debugging logic)
 except (FileNotFoundError, AttributeError):
 
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
\ No newline at end of file
+    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
\ No newline at end of file
@@ -0,0 +1,37 @@
+import io
+import os
+import uuid
+
+
+def unique_path(directory: str, stem: str, suffix: str = ".xlsx") -> str:
+    """
+    `directory/{stem}-{random}{suffix}`: a path no other job writes to, so
+    concurrent analyses of the same ticker never share (or delete) a file.
+    """
+    return os.path.join(directory, f"{stem}-{uuid.uuid4().hex[:12]}{suffix}")
+
+
+def atomic_write(path: str, data: bytes):
+    """
+    Write `data` to a temporary file next to `path` and move it into place,
+    so readers see the old file or the complete new one, never a partial write.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def save_workbook(wb, path: str):
+    """wb.save(path), written atomically."""
+    buf = io.BytesIO()
+    wb.save(buf)
+    atomic_write(path, buf.getvalue())
@@ -0,0 +1,330 @@
+"""
+Headless batch valuation.
+
+    python -m src.batch tickers.txt
+    python -m src.batch tickers.txt --llm gemini --output data/batch/run.parquet
+    python -m src.batch tickers.txt --source LOCAL    # from the local snapshot, offline
+
+Tickers are read one per line (blank lines and # comments are skipped).
+Results go to a single Parquet file with one row per ticker. Progress is
+checkpointed next to the output, so an interrupted run started again with
+the same arguments only values the tickers that are not done yet.
+"""
+import argparse
+import functools
+import glob
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import pandas as pd
+
+from src.fetch_pipeline import FetchResult, iter_fetch_all
+from src.fin_data_yf import fundamentals_cache
+from src.formula_engine import LiveSheet
+from src.history_store import record_history
+from src.llm_output import parse_llm_output
+from src.local_data import get_snapshot, iter_snapshot
+from src.llm_valuation_summary import (
+    context_from_values,
+    generate_llm_investment_summary,
+)
+from src.stock_valuation import valuation_inputs
+from src.template_cache import DEFAULT_TEMPLATE, get_template
+
+DEFAULT_OUTPUT = os.path.join("data", "batch", "valuations.parquet")
+
+
+def read_tickers(path: str) -> List[str]:
+    tickers = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip().upper()
+            if line:
+                tickers.append(line)
+    return list(dict.fromkeys(tickers))
+
+
+# ---------- Valuation ----------
+
+def _base_row(result: FetchResult) -> Dict[str, Any]:
+    return {
+        "ticker": result.ticker,
+        "status": result.status,
+        "error": "; ".join(f"{k}: {v}" for k, v in result.errors.items()) or None,
+        "fetch_seconds": result.elapsed,
+        "valued_at": datetime.now(timezone.utc),
+    }
+
+
+def value_row(result: FetchResult, template, llm_text: Optional[str] = None,
+              values: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Output row of one fetched ticker. Without `llm_text` the template's own
+    scenario inputs are used; with it, the LLM's scenarios are patched in.
+    `values`, the ticker's sheet already calculated without the LLM, saves
+    a full calculation: only the cells downstream of the scenarios are redone.
+    """
+    row = _base_row(result)
+    if result.status != "ok":
+        return row
+
+    if values is None:
+        values = template.calculate(valuation_inputs(result.ticker, result.data, template.schema))
+    if llm_text is not None:
+        report_text, scenario_json = parse_llm_output(llm_text)
+        if scenario_json is None:
+            row["status"] = "failed"
+            row["error"] = "llm: no scenario JSON in response"
+            return row
+        live = LiveSheet(template.engine, values)
+        live.set(template.schema.scenario_inputs(scenario_json))
+        values = live.values
+        row["report_sha256"] = hashlib.sha256(llm_text.encode("utf-8")).hexdigest()
+        row["report_text"] = report_text.strip()
+
+    row.update(template.schema.record(values).as_row())
+    return row
+
+
+def _value_with_llm(result, template, provider, model, use_cache):
+    try:
+        values = template.calculate(valuation_inputs(result.ticker, result.data, template.schema))
+        context = context_from_values(values, template.schema)
+        llm_text = generate_llm_investment_summary(context, provider, model, use_cache)
+    except Exception as e:
+        row = _base_row(result)
+        row["status"] = "failed"
+        row["error"] = f"llm: {type(e).__name__}: {e}"
+        return row
+    return value_row(result, template, llm_text, values)
+
+
+# ---------- Checkpoints ----------
+
+class Checkpoint:
+    """
+    Append-only directory of Parquet parts. Rows are buffered and written
+    as a new part every `every` rows; each part is written to a temporary
+    name and renamed, so a crash never leaves a half-written part behind.
+    """
+
+    def __init__(self, directory: str, every: int = 100):
+        self.directory = directory
+        self.every = every
+        self._rows: List[Dict[str, Any]] = []
+        os.makedirs(directory, exist_ok=True)
+        self._next = len(self._parts())
+
+    def _parts(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "part-*.parquet")))
+
+    def load(self) -> pd.DataFrame:
+        parts = [pd.read_parquet(p) for p in self._parts()]
+        if not parts:
+            return pd.DataFrame(columns=["ticker", "status"])
+        return pd.concat(parts, ignore_index=True)
+
+    def done(self) -> Set[str]:
+        """Tickers valued successfully in earlier runs."""
+        frame = self.load()
+        return set(frame.loc[frame["status"] == "ok", "ticker"])
+
+    def add(self, row: Dict[str, Any]):
+        self._rows.append(row)
+        if len(self._rows) >= self.every:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        path = os.path.join(self.directory, f"part-{self._next:05d}.parquet")
+        pd.DataFrame(self._rows).to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        self._next += 1
+        self._rows = []
+
+
+# ---------- Progress ----------
+
+class Progress:
+    """Single status line on stderr: done/total, rate, ETA and outcome counts."""
+
+    def __init__(self, total: int, stream=sys.stderr, interval: float = 1.0):
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.done = 0
+        self.counts: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, status: str):
+        self.done += 1
+        self.counts[status] = self.counts.get(status, 0) + 1
+        now = time.perf_counter()
+        if now - self._last >= self.interval or self.done == self.total:
+            self._last = now
+            self.stream.write("\r" + self.line())
+            self.stream.flush()
+
+    def line(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        eta = _format_seconds(remaining / rate) if rate > 0 else "?"
+        counts = " ".join(f"{k}={v}" for k, v in sorted(self.counts.items()))
+        return f"[{self.done}/{self.total}] {rate:.1f}/s ETA {eta} {counts}   "
+
+    def close(self):
+        self.stream.write("\n")
+        self.stream.flush()
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+# ---------- Run ----------
+
+def run_batch(
+    tickers: Iterable[str],
+    output: str = DEFAULT_OUTPUT,
+    checkpoint_dir: Optional[str] = None,
+    checkpoint_every: int = 100,
+    max_workers: int = 16,
+    timeout: float = 30.0,
+    llm_provider: Optional[str] = None,
+    llm_model: Optional[str] = None,
+    llm_workers: int = 8,
+    use_cache: bool = True,
+    template_path: str = DEFAULT_TEMPLATE,
+    fetch=iter_fetch_all,
+    progress: bool = True,
+    history: bool = False,
+) -> pd.DataFrame:
+    """
+    Value `tickers` and write one row per ticker to `output` (Parquet).
+
+    - Fundamentals are fetched concurrently (fetch_pipeline) and valued on
+      the cached template engine; no workbook is built.
+    - With `llm_provider`, each ticker also gets an LLM report whose
+      scenario inputs replace the template's; those calls run on
+      `llm_workers` threads under the provider client's rate limit.
+    - Rows are checkpointed to `checkpoint_dir` (default: output + ".parts").
+      Tickers with status "ok" there are skipped, failed ones are retried.
+      The checkpoint is removed once the output file is written.
+    - With `history`, the successful rows are also appended to the
+      valuation history (data/history); the CLI turns it on.
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+    checkpoint = Checkpoint(checkpoint_dir or output + ".parts", every=checkpoint_every)
+    done = checkpoint.done()
+    todo = [t for t in tickers if t not in done]
+    if done and progress:
+        print(f"Resuming: {len(tickers) - len(todo)} of {len(tickers)} tickers already done", file=sys.stderr)
+
+    template = get_template(template_path)
+    bar = Progress(len(todo)) if progress else None
+
+    def emit(row):
+        checkpoint.add(row)
+        if bar is not None:
+            bar.update(row["status"])
+
+    cache = fundamentals_cache() if use_cache else None
+    try:
+        with ThreadPoolExecutor(max_workers=llm_workers) as llm_pool:
+            pending = set()
+            for result in fetch(todo, max_workers=max_workers, timeout=timeout, cache=cache):
+                if llm_provider and result.status == "ok":
+                    pending.add(llm_pool.submit(
+                        _value_with_llm, result, template, llm_provider, llm_model, use_cache,
+                    ))
+                else:
+                    emit(value_row(result, template))
+                for fut in [f for f in pending if f.done()]:
+                    pending.discard(fut)
+                    emit(fut.result())
+            for fut in pending:
+                emit(fut.result())
+    finally:
+        # Whatever finished is kept, also on Ctrl+C
+        checkpoint.flush()
+        if bar is not None:
+            bar.close()
+
+    frame = checkpoint.load()
+    frame = frame[frame["ticker"].isin(tickers)]
+    # Latest attempt per ticker, in input order
+    frame = frame.drop_duplicates("ticker", keep="last")
+    valued = set(frame["ticker"])
+    frame = frame.set_index("ticker").reindex([t for t in tickers if t in valued]).reset_index()
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    frame.to_parquet(output + ".tmp", index=False)
+    os.replace(output + ".tmp", output)
+    if history:
+        record_history(frame, "batch+llm" if llm_provider else "batch")
+    for part in checkpoint._parts():
+        os.remove(part)
+    try:
+        os.rmdir(checkpoint.directory)
+    except OSError:
+        pass
+    return frame
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m src.batch", description="Value a list of tickers.")
+    parser.add_argument("tickers", help="text file with one ticker per line")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"Parquet output (default {DEFAULT_OUTPUT})")
+    parser.add_argument("--checkpoint-dir", default=None, help="default: <output>.parts")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="rows per checkpoint part")
+    parser.add_argument("--workers", type=int, default=16, help="fetch threads")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds per ticker fetch")
+    parser.add_argument("--llm", default=None, help="LLM provider (gemini, openai, stub); off by default")
+    parser.add_argument("--model", default=None, help="LLM model (provider default)")
+    parser.add_argument("--llm-workers", type=int, default=8)
+    parser.add_argument("--no-cache", action="store_true", help="bypass data/cache")
+    parser.add_argument("--source", default="YF", choices=("YF", "LOCAL"),
+                        help="YF: fetch from Yahoo Finance, LOCAL: read the snapshot (python -m src.local_data)")
+    parser.add_argument("--snapshot", default=None, help="snapshot directory for --source LOCAL")
+    parser.add_argument("--template", default=DEFAULT_TEMPLATE)
+    parser.add_argument("--no-history", action="store_true", help="do not append to data/history")
+    args = parser.parse_args(argv)
+
+    if args.source == "LOCAL":
+        fetch = functools.partial(iter_snapshot, snapshot=get_snapshot(args.snapshot))
+    else:
+        fetch = iter_fetch_all
+    frame = run_batch(
+        read_tickers(args.tickers),
+        output=args.output,
+        checkpoint_dir=args.checkpoint_dir,
+        checkpoint_every=args.checkpoint_every,
+        max_workers=args.workers,
+        timeout=args.timeout,
+        llm_provider=args.llm,
+        llm_model=args.model,
+        llm_workers=args.llm_workers,
+        use_cache=not args.no_cache,
+        template_path=args.template,
+        history=not args.no_history,
+        fetch=fetch,
+    )
+    counts = frame["status"].value_counts().to_dict() if len(frame) else {}
+    print(f"Wrote {len(frame)} rows to {args.output} ({counts})")
+
+
+if __name__ == "__main__":
+    main()
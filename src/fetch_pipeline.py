@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from src.fin_data_yf import YFinanceDataFetcher, build_financial_data
+from src.lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+
+YAHOO_HOST = "query2.finance.yahoo.com"
+
+# Requests each stage makes, and the host they go to
+STAGES = {
+    "quote": YAHOO_HOST,    # .info: price and shares outstanding
+    "income": YAHOO_HOST,   # quarterly_income_stmt
+    "balance": YAHOO_HOST,  # quarterly_balance_sheet
+}
+
+DEFAULT_HOST_LIMITS = {YAHOO_HOST: 8}
+
+
+@dataclass
+class FetchResult:
+    """Outcome of fetching one ticker. `data` is set only when every stage succeeded."""
+    ticker: str
+    status: str                       # "ok", "failed" or "timeout"
+    data: Optional[Dict[str, Any]] = None
+    errors: Dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+
+def _run_stage(fetcher, stage):
+    if stage == "quote":
+        return fetcher.get_quote(), fetcher.get_shares_outstanding()
+    if stage == "income":
+        return fetcher.get_income_statement()
+    if stage == "balance":
+        return fetcher.get_balance_sheet()
+    raise ValueError(f"Unknown stage '{stage}'")
+
+
+def iter_fetch_all(
+    tickers: Iterable[str],
+    max_workers: int = 16,
+    host_limits: Optional[Dict[str, int]] = None,
+    timeout: float = 30.0,
+    cache=None,
+    fetcher_factory: Callable[..., Any] = YFinanceDataFetcher,
+) -> Iterator[FetchResult]:
+    """
+    Fetch fundamentals for many tickers concurrently and yield a FetchResult
+    per ticker as soon as it completes (in completion order).
+
+    - The quote, income and balance requests of a ticker run in parallel,
+      and many tickers run at once.
+    - `host_limits` caps concurrent requests per provider host: each host
+      gets its own pool of that many threads (at most `max_workers`), so
+      requests queued for a busy host never hold a thread another host
+      could use. Hosts without a limit share a pool of `max_workers`.
+    - A ticker that takes longer than `timeout` seconds after its first
+      request started is reported with status "timeout" and its queued
+      requests are cancelled. Requests already running are not
+      interrupted: they finish in the background and are ignored, and so
+      are those still running when the caller stops iterating.
+    - A failing stage never stops the run: the ticker is reported as
+      "failed" with the error per stage.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    limits = dict(DEFAULT_HOST_LIMITS if host_limits is None else host_limits)
+
+    started: Dict[str, float] = {}
+    started_lock = threading.Lock()
+
+    def task(ticker, fetcher, stage):
+        with started_lock:
+            started.setdefault(ticker, time.perf_counter())
+        return _run_stage(fetcher, stage)
+
+    # Threads are only started as work is queued, so unused pools cost nothing
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+    host_pools = {host: ThreadPoolExecutor(max_workers=min(n, max_workers), thread_name_prefix=f"fetch-{host}")
+                  for host, n in limits.items()}
+    owner = {}          # future -> (ticker, stage)
+    parts = {t: {} for t in tickers}
+    errors = {t: {} for t in tickers}
+    remaining = {t: len(STAGES) for t in tickers}
+    pending = set()
+
+    try:
+        for ticker in tickers:
+            try:
+                fetcher = fetcher_factory(ticker, cache=cache)
+            except Exception as e:
+                remaining[ticker] = 0
+                yield FetchResult(ticker, "failed", errors={"init": str(e)})
+                continue
+            for stage in STAGES:
+                fut = host_pools.get(STAGES[stage], pool).submit(task, ticker, fetcher, stage)
+                owner[fut] = (ticker, stage)
+                pending.add(fut)
+
+        while pending:
+            now = time.perf_counter()
+            with started_lock:
+                deadlines = {t: s + timeout for t, s in started.items() if remaining[t] > 0}
+            next_deadline = min(deadlines.values(), default=None)
+            wait_for = None if next_deadline is None else max(0.0, next_deadline - now)
+
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for fut in done:
+                pending.discard(fut)
+                ticker, stage = owner.pop(fut)
+                if remaining[ticker] <= 0:
+                    continue  # already reported as timed out
+                try:
+                    parts[ticker][stage] = fut.result()
+                except Exception as e:
+                    errors[ticker][stage] = f"{type(e).__name__}: {e}"
+                remaining[ticker] -= 1
+                if remaining[ticker] == 0:
+                    yield _finish(ticker, parts[ticker], errors[ticker], started)
+
+            # Tickers past their deadline
+            now = time.perf_counter()
+            for ticker, deadline in deadlines.items():
+                if remaining[ticker] > 0 and now >= deadline:
+                    remaining[ticker] = 0
+                    late = [f for f, (t, _) in owner.items() if t == ticker]
+                    for fut in late:
+                        fut.cancel()
+                        pending.discard(fut)
+                        _, stage = owner.pop(fut)
+                        errors[ticker][stage] = f"timed out after {timeout:.0f}s"
+                    yield FetchResult(ticker, "timeout", errors=errors[ticker],
+                                      elapsed=now - started[ticker])
+    finally:
+        for executor in (pool, *host_pools.values()):
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _finish(ticker, parts, errors, started):
+    elapsed = time.perf_counter() - started.get(ticker, time.perf_counter())
+    if errors:
+        return FetchResult(ticker, "failed", errors=dict(errors), elapsed=elapsed)
+    quote, shares = parts["quote"]
+    try:
+        data = build_financial_data(quote, parts["income"], parts["balance"], shares)
+    except Exception as e:
+        return FetchResult(ticker, "failed", errors={"build": f"{type(e).__name__}: {e}"}, elapsed=elapsed)
+    return FetchResult(ticker, "ok", data=data, elapsed=elapsed)
+
+
+def fetch_universe(tickers: Iterable[str], **kwargs) -> pd.DataFrame:
+    """
+    Run iter_fetch_all to completion and return one row per ticker:
+    ticker, status, error, elapsed and the fetch_all_data fields.
+    """
+    rows = []
+    for result in iter_fetch_all(tickers, **kwargs):
+        row = {
+            "ticker": result.ticker,
+            "status": result.status,
+            "error": "; ".join(f"{k}: {v}" for k, v in result.errors.items()) or None,
+            "elapsed": result.elapsed,
+        }
+        row.update(result.data or {})
+        rows.append(row)
+    return pd.DataFrame(rows)
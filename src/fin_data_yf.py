@@ -1,26 +1,108 @@
 import sys
-import yfinance as yf
-import pandas as pd
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.disk_cache import get_cache
+from src.lazy_imports import lazy_import
+from src.quarterly import INCOME_FLOWS, QuarterlyHistory
+from src.single_flight import SingleFlight
+from src.tracing import span
+
+yf = lazy_import("yfinance")
+pd = lazy_import("pandas")
+
+# Cache lifetimes (seconds). Quotes move all day, statements once a quarter.
+QUOTE_TTL = 15 * 60
+STATEMENT_TTL = 30 * 24 * 3600
+
+# In-flight fetch_all_data calls, shared by concurrent sessions
+_fetches = SingleFlight()
+
+
+def fundamentals_cache():
+    """Process-wide cache for yfinance data (data/cache/fundamentals.sqlite)."""
+    return get_cache("fundamentals")
+
 
 class YFinanceDataFetcher:
-    def __init__(self, ticker):
+    def __init__(self, ticker, cache=None):
+        """
+        cache: optional DiskCache (e.g. fundamentals_cache()). When given,
+        .info and the quarterly statements are served from it while fresh.
+        """
         self.ticker = ticker
+        self.cache = cache
         # Initialize the yfinance Ticker object
         self.ticker_obj = yf.Ticker(ticker)
-    
-    def _get_latest_financial_data(self, df_type):
-        """Helper to get the latest quarterly data from a financial DataFrame."""
-        if df_type.empty:
-            return {}
-        
-        # The first column of the yfinance DataFrame is the latest report.
-        latest_data = df_type.iloc[:, 0].to_dict()
-        return latest_data
+        self._info = None
+        self._info_lock = threading.Lock()
+
+    def _get_info(self):
+        """The Ticker's .info dict, fetched at most once per fetcher (and per QUOTE_TTL with a cache)."""
+        with self._info_lock:
+            if self._info is None:
+                with span("yf.info", ticker=self.ticker) as s:
+                    key = f"{self.ticker}:info"
+                    info = self.cache.get(key) if self.cache is not None else None
+                    s.set(cached=info is not None)
+                    if info is None:
+                        info = self.ticker_obj.info or {}
+                        if self.cache is not None:
+                            self.cache.set(key, info, ttl=QUOTE_TTL)
+                    self._info = info
+            return self._info
+
+    def _history_is_stale(self, history):
+        """
+        A stored history is stale once a newer fiscal quarter is reported
+        (info['mostRecentQuarter']), an earnings date passed since it was
+        last checked, or it was not checked for STATEMENT_TTL.
+        """
+        if time.time() - history.checked > STATEMENT_TTL:
+            return True
+        info = self._get_info()
+        latest_quarter = info.get("mostRecentQuarter")
+        if latest_quarter and history.latest is not None:
+            if pd.Timestamp(latest_quarter, unit="s").normalize() > history.latest:
+                return True
+        earnings_ts = info.get("earningsTimestamp")
+        if earnings_ts and history.checked < earnings_ts <= time.time():
+            return True
+        return False
+
+    def _get_history(self, dataset):
+        """
+        Every quarter of quarterly_income_stmt / quarterly_balance_sheet seen
+        so far. With a cache the history is kept without expiry and a
+        refresh only merges the quarters it does not have yet.
+        """
+        with span("yf.statement", ticker=self.ticker, dataset=dataset) as s:
+            flows = INCOME_FLOWS if dataset == "quarterly_income_stmt" else ()
+            if self.cache is None:
+                history = QuarterlyHistory(flows=flows)
+                history.merge(getattr(self.ticker_obj, dataset))
+                return history
+
+            key = f"{self.ticker}:{dataset}:quarters"
+            history = self.cache.get(key)
+            if history is not None and not self._history_is_stale(history):
+                s.set(cached=True)
+                return history
+
+            history = history or QuarterlyHistory(flows=flows)
+            s.set(cached=False, new_quarters=len(history.merge(getattr(self.ticker_obj, dataset))))
+            history.checked = time.time()
+            self.cache.set(key, history)
+            return history
+
+    def _get_statement(self, dataset):
+        """All stored quarters of a statement as a DataFrame, newest column first."""
+        return self._get_history(dataset).frame
 
     def get_quote(self):
         """Get current share price (uses the Ticker's info attribute)"""
         # .info fetches various general data, including price
-        info = self.ticker_obj.info
+        info = self._get_info()
         
         # Map yfinance key to the key expected by fetch_all_data
         price = info.get('currentPrice') or info.get('regularMarketPrice')
@@ -28,35 +110,27 @@ class YFinanceDataFetcher:
 
     def get_income_statement(self, period="quarter"):
         """
-        Get latest quarterly income statement.
+        Get latest quarterly income statement, plus trailing-twelve-month
+        sums (the *TTM keys) once four consecutive quarters are known.
         The 'period' argument is kept for signature consistency but forced to quarterly.
         """
-        df = self.ticker_obj.quarterly_income_stmt
-        latest_data = self._get_latest_financial_data(df)
+        history = self._get_history("quarterly_income_stmt")
+        latest_data = history.latest_values()
 
         if not latest_data:
             return {}
             
-        # yfinance often requires calculating Operating Expenses (OPEX)
-        # by summing components like R&D and SG&A, as a single OPEX field is rare.
-        rd = latest_data.get('Research And Development')
-        sga = latest_data.get('Selling General And Administrative')
-        
-        # Map yfinance fields (row index names) to the original FMP keys
-        return {
-            'revenue': latest_data.get('Total Revenue'),
-            'costOfRevenue': latest_data.get('Cost Of Revenue'),
-            # Calculated OPEX
-            'operatingExpenses': (rd if pd.notna(rd) else 0) + (sga if pd.notna(sga) else 0),
-            'operatingIncome': latest_data.get('Operating Income'),
-        }
+        income = _income_fields(latest_data)
+        ttm = history.ttm_values()
+        if ttm:
+            income.update({f"{k}TTM": v for k, v in _income_fields(ttm).items()})
+        return income
 
     def get_balance_sheet(self, period="quarter"):
         """
         Get latest quarterly balance sheet.
         """
-        df = self.ticker_obj.quarterly_balance_sheet
-        latest_data = self._get_latest_financial_data(df)
+        latest_data = self._get_history("quarterly_balance_sheet").latest_values()
         
         if not latest_data:
             return {}
@@ -71,34 +145,183 @@ class YFinanceDataFetcher:
 
     def get_shares_outstanding(self):
         """Get shares outstanding (uses the Ticker's info attribute)"""
-        info = self.ticker_obj.info
+        info = self._get_info()
         # Use 'sharesOutstanding' which is the closest match to the original FMP field
         return info.get('sharesOutstanding', 0)
 
     def fetch_all_data(self):
         """
         Fetch all financial data.
-        The structure of this method is identical to your original code.
+        Concurrent fetches of the same ticker (and cache) share one request.
         """
-        quote = self.get_quote()
-        income = self.get_income_statement()
-        balance = self.get_balance_sheet()
-        shares = self.get_shares_outstanding()
-        
-        # This dictionary creation is UNCHANGED from your original code
-        # It relies on the helper methods returning data with the expected keys.
-        financial_data = {
-            'Share Price': quote.get('price', 0),
-            'Shares Outstanding': shares / 1000,  # in thousands
-            'Revenue (Qtr)': income.get('revenue', 0) / 1000,  
-            'COGS': income.get('costOfRevenue', 0) / 1000,  
-            'OPEX': income.get('operatingExpenses', 0) / 1000,  
-            'Operating Profit': income.get('operatingIncome', 0) / 1000,  
-            'Cash': balance.get('cashAndCashEquivalents', 0) / 1000,  
-            'Debt': balance.get('totalDebt', 0) / 1000, 
-        }
-        
-        return financial_data
+        # The fetcher holds its cache, so id() is unique while the fetch is in flight
+        key = (self.ticker, id(self.cache))
+        return dict(_fetches.do(key, self._fetch_all_data))
+
+    def _fetch_all_data(self):
+        with span("yf.fetch_all", ticker=self.ticker):
+            quote = self.get_quote()
+            income = self.get_income_statement()
+            balance = self.get_balance_sheet()
+            shares = self.get_shares_outstanding()
+            
+            return build_financial_data(quote, income, balance, shares)
+
+
+def _income_fields(row):
+    """Map yfinance income rows (one quarter or TTM sums) to the original FMP keys."""
+    # yfinance often requires calculating Operating Expenses (OPEX)
+    # by summing components like R&D and SG&A, as a single OPEX field is rare.
+    rd = row.get('Research And Development')
+    sga = row.get('Selling General And Administrative')
+    return {
+        'revenue': row.get('Total Revenue'),
+        'costOfRevenue': row.get('Cost Of Revenue'),
+        # Calculated OPEX
+        'operatingExpenses': (rd if pd.notna(rd) else 0) + (sga if pd.notna(sga) else 0),
+        'operatingIncome': row.get('Operating Income'),
+    }
+
+
+def build_financial_data(quote, income, balance, shares):
+    """
+    Combine the outputs of get_quote, get_income_statement, get_balance_sheet
+    and get_shares_outstanding into the dict value_stock writes to Excel.
+
+    The income rows are a quarter of the trailing twelve months when
+    `income` has TTM sums, so the template's Revenue (Qtr) x 4 is the TTM
+    revenue rather than one (seasonal) quarter times four.
+    """
+    # Quarterly rows: a quarter of the TTM sums when known, else the latest quarter
+    if pd.notna(income.get('revenueTTM', float('nan'))):
+        quarter = {k: income.get(f"{k}TTM", 0) / 4 for k in ('revenue', 'costOfRevenue', 'operatingExpenses', 'operatingIncome')}
+    else:
+        quarter = income
+    financial_data = {
+        'Share Price': quote.get('price', 0),
+        'Shares Outstanding': shares / 1000,  # in thousands
+        'Revenue (Qtr)': quarter.get('revenue', 0) / 1000,  
+        'COGS': quarter.get('costOfRevenue', 0) / 1000,  
+        'OPEX': quarter.get('operatingExpenses', 0) / 1000,  
+        'Operating Profit': quarter.get('operatingIncome', 0) / 1000,  
+        'Cash': balance.get('cashAndCashEquivalents', 0) / 1000,  
+        'Debt': balance.get('totalDebt', 0) / 1000, 
+    }
+    
+    return financial_data
+
+
+def _download_last_close(tickers):
+    """Last close per ticker from one batched yf.download call ({ticker: price or None})."""
+    df = yf.download(
+        tickers, period="5d", interval="1d", group_by="column",
+        auto_adjust=False, threads=True, progress=False,
+    )
+    if df is None or df.empty or "Close" not in df:
+        return {t: None for t in tickers}
+
+    close = df["Close"]
+    if isinstance(close, pd.Series):
+        close = close.to_frame(tickers[0])
+    last = close.ffill().iloc[-1]
+    return {t: (float(last[t]) if t in last and pd.notna(last[t]) else None) for t in tickers}
+
+
+def _recorded_shares(tickers):
+    """
+    Shares outstanding (units) of `tickers` already on disk: the local
+    snapshot (api_source="LOCAL"), then the valuation history of the last
+    STATEMENT_TTL. Both store thousands, like fetch_all_data.
+    """
+    from src.history_store import history_store
+    from src.local_data import get_snapshot
+
+    shares = {}
+    try:
+        snapshot = get_snapshot()
+    except ValueError:
+        snapshot = None   # none recorded
+    if snapshot is not None and "Shares Outstanding" in snapshot.fields:
+        for t in tickers:
+            if t in snapshot:
+                value = snapshot.get(t).get("Shares Outstanding")
+                if pd.notna(value) and value > 0:
+                    shares[t] = value * 1000
+
+    wanted = {t for t in tickers if t not in shares}
+    if wanted:
+        try:
+            frame = history_store().as_of(pd.Timestamp.now(tz="UTC"), ["shares_outstanding"],
+                                          lookback_days=STATEMENT_TTL // (24 * 3600))
+        except Exception as e:
+            print(f"Warning: could not read the valuation history: {e}")
+            return shares
+        for t, value in zip(frame["ticker"], frame["shares_outstanding"]):
+            if t in wanted and pd.notna(value) and value > 0:
+                shares[t] = float(value) * 1000
+    return shares
+
+
+def fetch_bulk_quotes(tickers, cache=None, batch_size=500, max_workers=8):
+    """
+    Share price and shares outstanding for a whole watchlist.
+
+    Prices come from batched yf.download calls (`batch_size` tickers each).
+    Shares change only with filings, so they are taken, in order, from
+    `cache`, the local snapshot or the valuation history (_recorded_shares),
+    and only the tickers found in none of them get a .info lookup, which
+    also fills in prices the download missed. yfinance has no batched
+    shares endpoint: on a cold cache with nothing recorded that is one
+    request per ticker (O(N), ~2000 for a 2000-ticker watchlist), only the
+    prices are O(N / batch_size).
+
+    Returns a DataFrame with columns ticker, share_price and
+    shares_outstanding (in thousands, like fetch_all_data).
+    Failed lookups are NaN.
+    """
+    tickers = list(dict.fromkeys(tickers))
+
+    prices = {}
+    for start in range(0, len(tickers), batch_size):
+        batch = tickers[start:start + batch_size]
+        try:
+            prices.update(_download_last_close(batch))
+        except Exception as e:
+            print(f"Warning: price download failed for {len(batch)} tickers: {e}")
+
+    shares = {}
+    for t in tickers:
+        shares[t] = cache.get(f"{t}:shares") if cache is not None else None
+    missing = [t for t in tickers if shares[t] is None]
+    if missing:
+        for ticker, value in _recorded_shares(missing).items():
+            shares[ticker] = value
+            if cache is not None:
+                cache.set(f"{ticker}:shares", value, ttl=STATEMENT_TTL)
+        missing = [t for t in tickers if shares[t] is None]
+
+    def lookup(ticker):
+        try:
+            return YFinanceDataFetcher(ticker, cache=cache)._get_info()
+        except Exception as e:
+            print(f"Warning: info lookup failed for {ticker}: {e}")
+            return {}
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for ticker, info in zip(missing, pool.map(lookup, missing)):
+                shares[ticker] = info.get("sharesOutstanding")
+                if shares[ticker] is not None and cache is not None:
+                    cache.set(f"{ticker}:shares", shares[ticker], ttl=STATEMENT_TTL)
+                if prices.get(ticker) is None:
+                    prices[ticker] = info.get("currentPrice") or info.get("regularMarketPrice")
+
+    return pd.DataFrame({
+        "ticker": tickers,
+        "share_price": pd.to_numeric(pd.Series([prices.get(t) for t in tickers], dtype=object), errors="coerce"),
+        "shares_outstanding": pd.to_numeric(pd.Series([shares[t] for t in tickers], dtype=object), errors="coerce") / 1000,
+    })
+
 
 # --- Example Usage ---
 if __name__ == "__main__":
@@ -0,0 +1,640 @@
+import io
+import re
+import math
+import zipfile
+import operator
+from functools import lru_cache
+from graphlib import TopologicalSorter, CycleError
+from typing import Any, Callable, Dict, List, Optional, Set
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from src.artifacts import atomic_write
+from src.lazy_imports import lazy_import
+
+openpyxl = lazy_import("openpyxl")
+
+
+# Excel error values (#DIV/0!, #VALUE!, ...) travel through the graph as
+# instances of this class, the same way Excel propagates them cell to cell.
+class ExcelError(Exception):
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.code = code
+
+    def __repr__(self):
+        return f"ExcelError({self.code!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, ExcelError) and other.code == self.code
+
+    def __hash__(self):
+        return hash(self.code)
+
+
+class FormulaError(ValueError):
+    """Raised when a formula cannot be parsed or the sheet has a circular reference."""
+
+
+# ---------- Tokenizer ----------
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>\s+)
+  | (?P<string>"(?:[^"]|"")*")
+  | (?P<range>\$?[A-Za-z]{1,3}\$?\d+:\$?[A-Za-z]{1,3}\$?\d+)
+  | (?P<func>[A-Za-z_][A-Za-z0-9_.]*(?=\())
+  | (?P<bool>(?:TRUE|FALSE)\b)
+  | (?P<cell>\$?[A-Za-z]{1,3}\$?\d+\b)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<op><=|>=|<>|[-+*/^&=<>%(),])
+    """,
+    re.VERBOSE,
+)
+
+
+def _tokenize(formula: str) -> List[tuple]:
+    tokens = []
+    pos = 0
+    while pos < len(formula):
+        m = _TOKEN_RE.match(formula, pos)
+        if m is None:
+            raise FormulaError(f"Unexpected character {formula[pos]!r} in formula '={formula}'")
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "ws":
+            continue
+        tokens.append((kind, m.group()))
+    return tokens
+
+
+def _normalize_ref(ref: str) -> str:
+    return ref.replace("$", "").upper()
+
+
+def _expand_range(ref: str) -> List[str]:
+    start, end = _normalize_ref(ref).split(":")
+    c1, r1 = re.match(r"([A-Z]+)(\d+)", start).groups()
+    c2, r2 = re.match(r"([A-Z]+)(\d+)", end).groups()
+    cols = range(openpyxl.utils.column_index_from_string(c1), openpyxl.utils.column_index_from_string(c2) + 1)
+    rows = range(int(r1), int(r2) + 1)
+    return [f"{openpyxl.utils.get_column_letter(c)}{r}" for r in rows for c in cols]
+
+
+# ---------- Value coercion ----------
+
+def _check(value):
+    if isinstance(value, ExcelError):
+        raise value
+    return value
+
+
+def _to_number(value):
+    value = _check(value)
+    if isinstance(value, np.ndarray):
+        return value
+    if value is None or value == "":
+        return 0
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            raise ExcelError("#VALUE!")
+    return value
+
+
+def _to_text(value) -> str:
+    value = _check(value)
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _to_bool(value):
+    value = _check(value)
+    if isinstance(value, np.ndarray):
+        return value.astype(bool)
+    if isinstance(value, str):
+        upper = value.upper()
+        if upper in ("TRUE", "FALSE"):
+            return upper == "TRUE"
+        raise ExcelError("#VALUE!")
+    return bool(_to_number(value))
+
+
+def _flatten(values) -> list:
+    out = []
+    for v in values:
+        if isinstance(v, list):
+            out.extend(_flatten(v))
+        else:
+            out.append(v)
+    return out
+
+
+# ---------- Operators ----------
+
+def _divide(a, b):
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.divide(a, b)
+    if b == 0:
+        raise ExcelError("#DIV/0!")
+    return a / b
+
+
+def _power(a, b):
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        with np.errstate(invalid="ignore"):
+            return np.power(a, b)
+    try:
+        result = a ** b
+    except ZeroDivisionError:
+        raise ExcelError("#DIV/0!")
+    if isinstance(result, complex):
+        raise ExcelError("#NUM!")
+    return result
+
+
+def _compare(fn):
+    def op(a, b):
+        a, b = _check(a), _check(b)
+        if isinstance(a, str) and isinstance(b, str):
+            return fn(a.upper(), b.upper())
+        if a is None:
+            a = "" if isinstance(b, str) else 0
+        if b is None:
+            b = "" if isinstance(a, str) else 0
+        if isinstance(a, str) != isinstance(b, str):
+            # Excel orders every number before every string
+            return fn(0 if not isinstance(a, str) else 1, 0 if not isinstance(b, str) else 1)
+        return fn(a, b)
+    return op
+
+
+_ARITHMETIC = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": _divide,
+    "^": _power,
+}
+
+_COMPARISON = {
+    "=": _compare(operator.eq),
+    "<>": _compare(operator.ne),
+    "<": _compare(operator.lt),
+    ">": _compare(operator.gt),
+    "<=": _compare(operator.le),
+    ">=": _compare(operator.ge),
+}
+
+
+# ---------- Functions ----------
+# Each entry receives the *unevaluated* argument thunks so that IF/IFERROR
+# can short-circuit like Excel does.
+
+def _fn_if(env, args):
+    cond = _to_bool(args[0](env))
+    when_true = args[1] if len(args) > 1 else (lambda _: True)
+    when_false = args[2] if len(args) > 2 else (lambda _: False)
+    if isinstance(cond, np.ndarray):
+        return np.where(cond, when_true(env), when_false(env))
+    return when_true(env) if cond else when_false(env)
+
+
+def _fn_iferror(env, args):
+    try:
+        value = args[0](env)
+        if isinstance(value, ExcelError):
+            raise value
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ExcelError("#NUM!")
+        return value
+    except ExcelError:
+        return args[1](env)
+
+
+def _fn_right(env, args):
+    text = _to_text(args[0](env))
+    n = int(_to_number(args[1](env))) if len(args) > 1 else 1
+    return text[-n:] if n > 0 else ""
+
+
+def _fn_left(env, args):
+    text = _to_text(args[0](env))
+    n = int(_to_number(args[1](env))) if len(args) > 1 else 1
+    return text[:n]
+
+
+def _numbers(env, args):
+    values = _flatten([a(env) for a in args])
+    return [_to_number(v) for v in values if v is not None and not isinstance(v, str)]
+
+
+def _fn_sum(env, args):
+    return sum(_numbers(env, args))
+
+
+def _fn_min(env, args):
+    nums = _numbers(env, args)
+    return min(nums) if nums else 0
+
+
+def _fn_max(env, args):
+    nums = _numbers(env, args)
+    return max(nums) if nums else 0
+
+
+def _fn_average(env, args):
+    nums = _numbers(env, args)
+    if not nums:
+        raise ExcelError("#DIV/0!")
+    return sum(nums) / len(nums)
+
+
+def _fn_round(env, args):
+    digits = int(_to_number(args[1](env))) if len(args) > 1 else 0
+    return round(_to_number(args[0](env)), digits)
+
+
+def _fn_unavailable(env, args):
+    # Google Sheets exports functions Excel does not know (GOOGLEFINANCE, ...)
+    # as __xludf.DUMMYFUNCTION; Excel evaluates them to #N/A as well.
+    raise ExcelError("#N/A")
+
+
+_FUNCTIONS: Dict[str, Callable] = {
+    "IF": _fn_if,
+    "IFERROR": _fn_iferror,
+    "RIGHT": _fn_right,
+    "LEFT": _fn_left,
+    "LEN": lambda env, args: len(_to_text(args[0](env))),
+    "ABS": lambda env, args: abs(_to_number(args[0](env))),
+    "ROUND": _fn_round,
+    "SUM": _fn_sum,
+    "MIN": _fn_min,
+    "MAX": _fn_max,
+    "AVERAGE": _fn_average,
+    "AND": lambda env, args: all(_to_bool(v) for v in _flatten([a(env) for a in args])),
+    "OR": lambda env, args: any(_to_bool(v) for v in _flatten([a(env) for a in args])),
+    "NOT": lambda env, args: not _to_bool(args[0](env)),
+    "__XLUDF.DUMMYFUNCTION": _fn_unavailable,
+}
+
+
+# ---------- Parser / compiler ----------
+
+class _Parser:
+    """
+    Recursive-descent parser that turns a formula into a closure fn(env).
+    Precedence follows Excel: comparison < & < +- < */ < ^ < unary minus < %.
+    """
+
+    def __init__(self, formula: str):
+        self.formula = formula
+        self.tokens = _tokenize(formula)
+        self.pos = 0
+        self.refs = set()
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _take(self, value=None):
+        kind, text = self._peek()
+        if kind is None or (value is not None and text != value):
+            raise FormulaError(f"Expected {value or 'token'} in formula '={self.formula}'")
+        self.pos += 1
+        return kind, text
+
+    def parse(self):
+        fn = self._comparison()
+        if self.pos != len(self.tokens):
+            raise FormulaError(f"Unexpected token {self._peek()[1]!r} in formula '={self.formula}'")
+        return fn
+
+    def _binary(self, ops, operand, apply):
+        left = operand()
+        while self._peek()[0] == "op" and self._peek()[1] in ops:
+            _, op = self._take()
+            right = operand()
+            left = apply(op, left, right)
+        return left
+
+    def _comparison(self):
+        def apply(op, l, r):
+            fn = _COMPARISON[op]
+            return lambda env: fn(l(env), r(env))
+        return self._binary(_COMPARISON, self._concat, apply)
+
+    def _concat(self):
+        def apply(op, l, r):
+            return lambda env: _to_text(l(env)) + _to_text(r(env))
+        return self._binary({"&"}, self._additive, apply)
+
+    def _arith(self, op, l, r):
+        fn = _ARITHMETIC[op]
+        return lambda env: fn(_to_number(l(env)), _to_number(r(env)))
+
+    def _additive(self):
+        return self._binary({"+", "-"}, self._multiplicative, self._arith)
+
+    def _multiplicative(self):
+        return self._binary({"*", "/"}, self._power, self._arith)
+
+    def _power(self):
+        return self._binary({"^"}, self._unary, self._arith)
+
+    def _unary(self):
+        kind, text = self._peek()
+        if kind == "op" and text in ("-", "+"):
+            self._take()
+            inner = self._unary()
+            if text == "-":
+                return lambda env: -_to_number(inner(env))
+            return inner
+        return self._percent()
+
+    def _percent(self):
+        inner = self._primary()
+        while self._peek() == ("op", "%"):
+            self._take()
+            prev = inner
+            inner = lambda env, prev=prev: _to_number(prev(env)) / 100
+        return inner
+
+    def _primary(self):
+        kind, text = self._take()
+
+        if kind == "number":
+            value = float(text) if any(c in text for c in ".eE") else int(text)
+            return lambda env: value
+
+        if kind == "string":
+            value = text[1:-1].replace('""', '"')
+            return lambda env: value
+
+        if kind == "bool":
+            value = text.upper() == "TRUE"
+            return lambda env: value
+
+        if kind == "cell":
+            ref = _normalize_ref(text)
+            self.refs.add(ref)
+            return lambda env: _check(env.get(ref))
+
+        if kind == "range":
+            refs = _expand_range(text)
+            self.refs.update(refs)
+            return lambda env: [_check(env.get(r)) for r in refs]
+
+        if kind == "func":
+            name = text.upper()
+            self._take("(")
+            args = []
+            if self._peek() != ("op", ")"):
+                args.append(self._comparison())
+                while self._peek() == ("op", ","):
+                    self._take()
+                    args.append(self._comparison())
+            self._take(")")
+            impl = _FUNCTIONS.get(name)
+            if impl is None:
+                return lambda env: _raise(ExcelError("#NAME?"))
+            return lambda env: impl(env, args)
+
+        if (kind, text) == ("op", "("):
+            inner = self._comparison()
+            self._take(")")
+            return inner
+
+        raise FormulaError(f"Unexpected token {text!r} in formula '={self.formula}'")
+
+
+def _raise(exc):
+    raise exc
+
+
+@lru_cache(maxsize=4096)
+def compile_formula(formula: str):
+    """
+    Compile an Excel formula (with or without the leading '=') into
+    (fn, refs) where fn(env) evaluates it against a {coordinate: value} dict.
+    """
+    if formula.startswith("="):
+        formula = formula[1:]
+    parser = _Parser(formula)
+    fn = parser.parse()
+    return fn, frozenset(parser.refs)
+
+
+def _evaluate(fn, env):
+    try:
+        value = fn(env)
+    except ExcelError as e:
+        return e
+    except ZeroDivisionError:
+        return ExcelError("#DIV/0!")
+    except (TypeError, ValueError):
+        return ExcelError("#VALUE!")
+    if isinstance(value, list):
+        # A bare range in a single cell resolves to its first value
+        value = value[0] if value else None
+    if isinstance(value, np.ndarray) and value.ndim == 0:
+        value = value.item()
+    return value
+
+
+# ---------- Engine ----------
+
+class FormulaEngine:
+    """
+    In-process replacement for the Excel recalculation of a worksheet.
+
+    Formulas are compiled once into closures and ordered by their
+    dependency graph; calculate() then only walks that order.
+    """
+
+    def __init__(self, formulas: Dict[str, str], constants: Optional[Dict[str, Any]] = None):
+        self.formulas = dict(formulas)
+        self.constants = dict(constants or {})
+        self._compiled = {}
+        self._refs = {}
+        # cell -> formula cells that read it directly (constants included)
+        self._dependents: Dict[str, Set[str]] = {}
+        graph = {}
+        for coord, formula in self.formulas.items():
+            fn, refs = compile_formula(formula)
+            self._compiled[coord] = fn
+            self._refs[coord] = refs
+            graph[coord] = {r for r in refs if r in self.formulas}
+            for ref in refs:
+                self._dependents.setdefault(ref, set()).add(coord)
+        try:
+            self.order = list(TopologicalSorter(graph).static_order())
+        except CycleError as e:
+            raise FormulaError(f"Circular reference between cells: {e.args[1]}")
+        self._position = {coord: i for i, coord in enumerate(self.order)}
+
+    @classmethod
+    def from_worksheet(cls, ws) -> "FormulaEngine":
+        formulas, constants = _split_cells(ws)
+        return cls(formulas, constants)
+
+    def calculate(self, inputs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Evaluate every formula cell. `inputs` overrides constant cells; passing
+        a value for a formula cell replaces that formula, as writing a number
+        over it in Excel would. Inputs may be NumPy arrays to evaluate many
+        scenarios in one pass.
+        """
+        env = dict(self.constants)
+        if inputs:
+            env.update(inputs)
+        for coord in self.order:
+            if inputs and coord in inputs:
+                continue
+            env[coord] = _evaluate(self._compiled[coord], env)
+        return env
+
+    def downstream(self, coords) -> List[str]:
+        """Formula cells that depend on `coords`, directly or not, in calculation order."""
+        seen = set()
+        stack = list(coords)
+        while stack:
+            for dep in self._dependents.get(stack.pop(), ()):
+                if dep not in seen:
+                    seen.add(dep)
+                    stack.append(dep)
+        return sorted(seen, key=self._position.__getitem__)
+
+
+class LiveSheet:
+    """
+    Calculated sheet for interactive edits. set() recalculates only the
+    formula cells downstream of the changed cells (a scenario input touches
+    a handful of Scenarios rows, a fundamental its derived metrics and the
+    projections), instead of the whole sheet.
+    """
+
+    def __init__(self, engine: FormulaEngine, values: Optional[Dict[str, Any]] = None,
+                 pinned: Optional[Set[str]] = None):
+        self.engine = engine
+        self.values = dict(values) if values is not None else engine.calculate()
+        # Formula cells replaced by a value; edits never recalculate them
+        self.pinned = set(pinned or ())
+
+    def set(self, changes: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply {coordinate: value} and return every cell whose value changed."""
+        changed = {}
+        for coord, value in changes.items():
+            if coord in self.engine.formulas:
+                self.pinned.add(coord)
+            if self.values.get(coord) != value:
+                self.values[coord] = changed[coord] = value
+        if not changed:
+            return changed
+        for coord in self.engine.downstream(changed):
+            # Unchanged precedents (e.g. a margin that came out the same): skip
+            if coord in self.pinned or not self.engine._refs[coord] & changed.keys():
+                continue
+            value = _evaluate(self.engine._compiled[coord], self.values)
+            if self.values.get(coord) != value:
+                self.values[coord] = changed[coord] = value
+        return changed
+
+
+def _split_cells(ws):
+    formulas, constants = {}, {}
+    for row in ws.iter_rows():
+        for cell in row:
+            value = cell.value
+            if value is None:
+                continue
+            if cell.data_type == "f" or (isinstance(value, str) and value.startswith("=")):
+                formulas[cell.coordinate] = str(value)
+            else:
+                constants[cell.coordinate] = value
+    return formulas, constants
+
+
+def recalculate_worksheet(ws) -> Dict[str, Any]:
+    """Calculate all formula cells of an openpyxl worksheet in its current state."""
+    formulas, constants = _split_cells(ws)
+    return FormulaEngine(formulas, constants).calculate()
+
+
+# ---------- Writing cached values ----------
+
+_FORMULA_CELL_RE = re.compile(
+    r'<c r="(?P<ref>[A-Z]+\d+)"(?P<attrs>[^>]*)>(?P<f><f>.*?</f>|<f[^>]*/>)(?:<v\s*/>|<v></v>|<v>[^<]*</v>)?</c>'
+)
+
+
+def _cached_value_xml(value):
+    """Return (type attribute, <v> text) for a calculated value, or None to leave it empty."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, np.ndarray):
+        return None
+    if isinstance(value, ExcelError):
+        return "e", escape(value.code)
+    if isinstance(value, bool):
+        return "b", "1" if value else "0"
+    if isinstance(value, (int, float)):
+        if isinstance(value, float) and not math.isfinite(value):
+            return "e", "#NUM!"
+        return "n", repr(value)
+    return "str", escape(str(value))
+
+
+def _patch_sheet_xml(xml: str, values: Dict[str, Any]) -> str:
+    def repl(m):
+        cached = _cached_value_xml(values.get(m.group("ref")))
+        attrs = re.sub(r'\st="[^"]*"', "", m.group("attrs"))
+        if cached is None:
+            return f'<c r="{m.group("ref")}"{attrs}>{m.group("f")}<v /></c>'
+        t, text = cached
+        t_attr = "" if t == "n" else f' t="{t}"'
+        return f'<c r="{m.group("ref")}"{attrs}{t_attr}>{m.group("f")}<v>{text}</v></c>'
+
+    return _FORMULA_CELL_RE.sub(repl, xml)
+
+
+def save_workbook_with_values(wb, output, values: Dict[str, Any], sheet_name: Optional[str] = None):
+    """
+    Save an openpyxl workbook and store `values` as the cached results of the
+    formula cells of `sheet_name`, so that readers using data_only=True
+    (pd.read_excel, load_valuation_excel) see calculated numbers without Excel.
+
+    `output` is a path (written atomically) or a writable binary file object.
+    """
+    ws = wb[sheet_name] if sheet_name else wb.active
+    sheet_part = f"xl/worksheets/sheet{wb.worksheets.index(ws) + 1}.xml"
+
+    # Excel/LibreOffice still recalculate on open, the cache is for headless readers
+    wb.calculation.fullCalcOnLoad = True
+
+    raw = io.BytesIO()
+    wb.save(raw)
+    raw.seek(0)
+
+    patched = io.BytesIO()
+    with zipfile.ZipFile(raw) as src, zipfile.ZipFile(patched, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            data = src.read(item.filename)
+            if item.filename == sheet_part:
+                data = _patch_sheet_xml(data.decode("utf-8"), values).encode("utf-8")
+            dst.writestr(item, data)
+
+    if hasattr(output, "write"):
+        output.write(patched.getvalue())
+    else:
+        atomic_write(output, patched.getvalue())
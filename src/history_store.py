@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Sequence, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from src.lazy_imports import lazy_import
+from src.projection import PROJECTION_ROWS, SCENARIO_KEYS
+from src.schema import FUNDAMENTAL_LABELS
+
+pd = lazy_import("pandas")
+# pyarrow.dataset imports pandas
+ds = lazy_import("pyarrow.dataset")
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+HISTORY_DIR = BASE_DIR / "data" / "history"
+
+DateLike = Union[str, date, datetime]
+
+
+def _history_schema() -> pa.Schema:
+    numbers = ["share_price", "mid_target", "good_target", "disc_rate_mid", "disc_rate_good",
+               "upside_mid", "upside_good"]
+    numbers += [k for k in FUNDAMENTAL_LABELS if k not in ("ticker", "share_price")]
+    numbers += [f"{k}_{case}" for k in SCENARIO_KEYS for case in ("mid", "good")]
+    numbers += [f"{k}_{case}" for k in PROJECTION_ROWS.values() for case in ("mid", "good")]
+    return pa.schema(
+        [
+            ("ticker", pa.string()),
+            ("run_date", pa.date32()),
+            ("run_at", pa.timestamp("us", tz="UTC")),
+            ("source", pa.string()),         # value_stock, llm, batch, ...
+            ("report_sha256", pa.string()),
+        ]
+        + [(name, pa.float64()) for name in numbers]
+    )
+
+
+# Every part file has exactly these columns
+HISTORY_SCHEMA = _history_schema()
+# Directories hold one month of run dates (run_month=YYYY-MM): daily
+# directories would mean one file per night, and opening ~250 files per
+# year dominates every query
+PARTITION_SCHEMA = pa.schema([("run_month", pa.string())])
+DATASET_SCHEMA = HISTORY_SCHEMA.append(pa.field("run_month", pa.string()))
+# Rows per row group of compacted files; ticker min/max statistics per
+# group let a single-ticker query skip most of a month
+ROW_GROUP_SIZE = 8192
+
+
+def _utc(value) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def _day(value: DateLike) -> date:
+    if isinstance(value, datetime):
+        return _utc(value).date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def _month(day: date) -> str:
+    return day.strftime("%Y-%m")
+
+
+class HistoryStore:
+    """
+    Append-only Parquet store of valuation results, partitioned by run date
+    (run_month=YYYY-MM directories, run_date column). Rows are never
+    modified: every append adds a new part file, compact() merges the parts
+    of a month into one file sorted by ticker.
+
+    Queries go through pyarrow.dataset: date filters prune whole months,
+    other filters are pushed down to the Parquet row-group statistics, only
+    the requested columns are read, and local files are memory-mapped.
+    """
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = str(root)
+        self._fs = pafs.LocalFileSystem(use_mmap=True)
+        self._lock = threading.Lock()
+
+    # ---------- Writing ----------
+
+    def append(self, rows: Union[pd.DataFrame, Iterable[Dict[str, Any]]], source: str,
+               run_at: Optional[datetime] = None) -> int:
+        """
+        Store result rows (ValuationRecord.as_row() / batch output columns;
+        unknown columns are dropped, missing ones stored as null).
+        Returns the number of rows written.
+        """
+        frame = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+        if frame.empty:
+            return 0
+        frame = frame.copy()
+        if "status" in frame:
+            frame = frame[frame["status"] == "ok"]
+            if frame.empty:
+                return 0
+
+        run_at = _utc(run_at or datetime.now(timezone.utc))
+        frame["run_at"] = run_at
+        frame["run_date"] = run_at.date()
+        frame["source"] = source
+        for case in ("mid", "good"):
+            target = frame.get(f"{case}_target")
+            if target is not None and "share_price" in frame:
+                frame[f"upside_{case}"] = pd.to_numeric(target, errors="coerce") / \
+                    pd.to_numeric(frame["share_price"], errors="coerce")
+
+        columns = {}
+        for field in HISTORY_SCHEMA:
+            if field.name in frame:
+                values = frame[field.name]
+                if pa.types.is_floating(field.type):
+                    values = pd.to_numeric(values, errors="coerce")
+                columns[field.name] = pa.array(values, type=field.type, from_pandas=True)
+            else:
+                columns[field.name] = pa.nulls(len(frame), type=field.type)
+        table = pa.table(columns, schema=HISTORY_SCHEMA)
+
+        directory = os.path.join(self.root, f"run_month={_month(run_at.date())}")
+        os.makedirs(directory, exist_ok=True)
+        _write(table, os.path.join(directory, f"part-{run_at.date().isoformat()}-{uuid.uuid4().hex}.parquet"))
+        return table.num_rows
+
+    def compact(self, month: Optional[DateLike] = None):
+        """
+        Merge the part files of a month (any day in it; default: every month
+        with more than one part) into one file sorted by ticker and run time.
+        Rows are unchanged; run it after nightly loads.
+        """
+        if month is not None:
+            months = [_month(_day(month))]
+        else:
+            months = [p.name.split("=", 1)[1] for p in Path(self.root).glob("run_month=*")]
+        with self._lock:
+            for m in months:
+                directory = Path(self.root) / f"run_month={m}"
+                parts = sorted(directory.glob("part-*.parquet"))
+                if len(parts) < 2:
+                    continue
+                table = pa.concat_tables([pq.read_table(p, schema=HISTORY_SCHEMA) for p in parts])
+                table = table.sort_by([("ticker", "ascending"), ("run_at", "ascending")])
+                _write(table, str(directory / f"part-{m}-compact-{uuid.uuid4().hex}.parquet"))
+                for p in parts:
+                    os.remove(p)
+
+    # ---------- Reading ----------
+
+    def dataset(self) -> ds.Dataset:
+        return ds.dataset(
+            self.root, schema=DATASET_SCHEMA,
+            format="parquet", partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"), filesystem=self._fs,
+        )
+
+    def scan(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        filter: Optional[ds.Expression] = None,
+        start: Optional[DateLike] = None,
+        end: Optional[DateLike] = None,
+    ) -> pa.Table:
+        """
+        Rows between run dates `start` and `end` (inclusive) matching
+        `filter`, e.g. pc.field("ticker") == "AAPL". Empty table when the
+        store does not exist yet.
+        """
+        expr = filter
+        # run_month prunes directories, run_date the rows inside them
+        if start is not None:
+            start = _day(start)
+            expr = _and(expr, (pc.field("run_month") >= _month(start)) & (pc.field("run_date") >= start))
+        if end is not None:
+            end = _day(end)
+            expr = _and(expr, (pc.field("run_month") <= _month(end)) & (pc.field("run_date") <= end))
+        if not os.path.isdir(self.root):
+            empty = DATASET_SCHEMA.empty_table()
+            return empty.select(list(columns)) if columns else empty
+        return self.dataset().to_table(columns=list(columns) if columns else None, filter=expr)
+
+    def ticker_history(self, ticker: str, columns: Sequence[str] = ("share_price", "mid_target", "good_target",
+                                                                     "upside_mid", "upside_good"),
+                       start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> pd.DataFrame:
+        """All stored runs of one ticker, oldest first."""
+        cols = ["ticker", "run_at", "source", *[c for c in columns if c not in ("ticker", "run_at", "source")]]
+        table = self.scan(cols, pc.field("ticker") == ticker, start, end)
+        return table.sort_by("run_at").to_pandas()
+
+    def screen(self, run_date: DateLike, min_upside: float = 1.3, case: str = "mid",
+               columns: Sequence[str] = ("share_price", "mid_target", "good_target")) -> pd.DataFrame:
+        """
+        Tickers whose discounted target / price was above `min_upside` in the
+        runs of `run_date` (latest run per ticker that day), best first.
+        """
+        upside = f"upside_{case}"
+        cols = ["ticker", "run_at", upside, *[c for c in columns if c not in ("ticker", "run_at", upside)]]
+        table = self.scan(cols, pc.field(upside) > min_upside, run_date, run_date)
+        frame = _latest(table.to_pandas())
+        return frame.sort_values(upside, ascending=False, ignore_index=True)
+
+    def as_of(self, when: DateLike, columns: Optional[Sequence[str]] = None,
+              lookback_days: int = 31) -> pd.DataFrame:
+        """
+        Time travel: the latest stored row per ticker at or before `when`
+        (looking back at most `lookback_days` run dates).
+        """
+        end = _day(when)
+        start = end - timedelta(days=lookback_days)
+        cols = None if columns is None else ["ticker", "run_at", *[c for c in columns if c not in ("ticker", "run_at")]]
+        expr = None
+        if isinstance(when, datetime):
+            expr = pc.field("run_at") <= pa.scalar(_utc(when), pa.timestamp("us", tz="UTC"))
+        return _latest(self.scan(cols, expr, start, end).to_pandas())
+
+
+def _write(table: pa.Table, path: str):
+    # Written under a temporary name, readers never see half a file
+    pq.write_table(table, path + ".tmp", row_group_size=ROW_GROUP_SIZE)
+    os.replace(path + ".tmp", path)
+
+
+def _and(expr, other):
+    return other if expr is None else expr & other
+
+
+def _latest(frame: pd.DataFrame) -> pd.DataFrame:
+    if frame.empty:
+        return frame.reset_index(drop=True)
+    return frame.sort_values("run_at").drop_duplicates("ticker", keep="last").reset_index(drop=True)
+
+
+_default_store: Optional[HistoryStore] = None
+_default_lock = threading.Lock()
+
+
+def history_store() -> HistoryStore:
+    """Process-wide store at data/history."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = HistoryStore()
+        return _default_store
+
+
+def record_history(rows, source: str, report_text: Optional[str] = None):
+    """
+    Append results to the default store without ever failing the caller.
+    `report_text` is stored as its SHA-256 (the text itself stays in the workbook).
+    """
+    try:
+        frame = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+        if report_text is not None:
+            frame = frame.assign(report_sha256=hashlib.sha256(report_text.encode("utf-8")).hexdigest())
+        history_store().append(frame, source)
+    except Exception as e:
+        print(f"Warning: could not record valuation history: {e}")
@@ -0,0 +1,188 @@
+"""
+Reverse DCF: the value of one scenario input at which the discounted
+5-year price of the model equals the market price.
+
+    base = sensitivity.base_inputs(fundamentals, scenarios)
+    implied_value("expected_rev_cagr_5y", share_price, base)["value"]   # growth the price implies
+
+    implied_frame(batch_frame, ["expected_rev_cagr_5y", "lt_earning_multiple"])
+
+The solver runs on projection.project itself, so it follows the template
+arithmetic, and every ticker is solved in the same NumPy pass: Newton steps
+(numerical derivative) inside a bracket that shrinks every iteration, with
+a bisection step whenever Newton would leave it. Each ticker reports how
+it ended: converged, max_iter, no_root (the price is out of reach within
+the bracket, e.g. negative earnings) or invalid (missing inputs or price).
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.lazy_imports import lazy_import
+from src.projection import SCENARIO_KEYS, _OPTIONAL_DEFAULTS, _as_float, discount_rates, project
+
+pd = lazy_import("pandas")
+
+# Search interval per input; an implied value outside it is reported as no_root
+BRACKETS = {
+    "expected_rev_cagr_5y": (-0.99, 5.0),
+    "expected_op_margin": (-1.0, 1.0),
+    "expected_dilution": (-0.99, 10.0),
+    "lt_net_debt": None,          # +/- 100 x annual revenue, set per ticker
+    "interest_rate_debt": (0.0, 1.0),
+    "tax_rate": (0.0, 1.0),
+    "lt_earning_multiple": (0.0, 1000.0),
+}
+STATUSES = ("converged", "max_iter", "no_root", "invalid")
+MAX_ITER = 50
+
+
+def _bracket(key: str, inputs: Mapping[str, np.ndarray], n: int,
+             bounds: Optional[Tuple[float, float]]) -> Tuple[np.ndarray, np.ndarray]:
+    if bounds is None and BRACKETS[key] is None:
+        width = 100 * np.abs(inputs["revenue_qtr"] * 4)
+        return -width, width
+    low, high = bounds or BRACKETS[key]
+    return np.full(n, low, dtype=np.float64), np.full(n, high, dtype=np.float64)
+
+
+def implied_value(
+    key: str,
+    share_price,
+    base: Mapping[str, Any],
+    bounds: Optional[Tuple[float, float]] = None,
+    rtol: float = 1e-9,
+    max_iter: int = MAX_ITER,
+) -> Dict[str, np.ndarray]:
+    """
+    Solve projection.project(**base, key=x)["price_5y_disc"] == share_price
+    for x. `base` holds project() keyword arguments (scalars or arrays that
+    broadcast with `share_price`); its value for `key`, when given, is the
+    starting point. A ticker converges when the price is matched within
+    `rtol` (relative) or the bracket has shrunk to `rtol` of x.
+
+    Returns arrays shaped like the broadcast inputs: value, residual (model
+    price - share price), iterations, bisections, converged and status.
+    """
+    if key not in SCENARIO_KEYS:
+        raise ValueError(f"key must be one of {SCENARIO_KEYS}")
+    if max_iter < 1:
+        raise ValueError("max_iter must be at least 1")
+
+    arrays = {k: np.asarray(v, dtype=np.float64) for k, v in base.items()}
+    target = np.asarray(share_price, dtype=np.float64)
+    shape = np.broadcast_shapes(target.shape, *(v.shape for v in arrays.values()))
+    n = int(np.prod(shape))
+    target = np.broadcast_to(target, shape).ravel()
+    start = np.broadcast_to(arrays.pop(key, np.nan), shape).ravel()
+    inputs = {k: np.broadcast_to(v, shape).ravel() for k, v in arrays.items()}
+
+    def gap(rows, x):
+        return project(**{k: v[rows] for k, v in inputs.items()}, **{key: x})["price_5y_disc"] - target[rows]
+
+    lo, hi = _bracket(key, inputs, n, bounds)
+    everything = np.arange(n)
+    f_lo, f_hi = gap(everything, lo), gap(everything, hi)
+
+    valid = np.isfinite(target) & (target > 0) & np.isfinite(f_lo) & np.isfinite(f_hi)
+    reachable = valid & (np.sign(f_lo) * np.sign(f_hi) <= 0)
+
+    value = np.full(n, np.nan)
+    residual = np.full(n, np.nan)
+    iterations = np.zeros(n, dtype=np.int64)
+    bisections = np.zeros(n, dtype=np.int64)
+    converged = np.zeros(n, dtype=bool)
+
+    # Only the tickers still being solved are carried through the loop
+    rows = np.flatnonzero(reachable)
+    a, b, f_a = lo[rows], hi[rows], f_lo[rows]
+    x = np.where(np.isfinite(start[rows]) & (start[rows] > a) & (start[rows] < b), start[rows], 0.5 * (a + b))
+    for i in range(1, max_iter + 1):
+        if not rows.size:
+            break
+        f = gap(rows, x)
+        h = 1e-6 * np.maximum(1.0, np.abs(x))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = (gap(rows, x + h) - f) / h
+            newton = x - f / slope
+
+        # x replaces the end of the bracket that has the same sign
+        same = np.sign(f) == np.sign(f_a)
+        a, f_a, b = np.where(same, x, a), np.where(same, f, f_a), np.where(same, b, x)
+        bisect = ~np.isfinite(newton) | (newton <= a) | (newton >= b)
+        x_next = np.where(bisect, 0.5 * (a + b), newton)
+
+        iterations[rows] = i
+        bisections[rows] += bisect
+        value[rows], residual[rows] = x, f
+        done = (np.abs(f) <= rtol * target[rows]) | (b - a <= rtol * np.maximum(1.0, np.abs(x)))
+        converged[rows[done]] = True
+        keep = ~done
+        rows, x, a, b, f_a = rows[keep], x_next[keep], a[keep], b[keep], f_a[keep]
+
+    status = np.full(n, "converged", dtype=object)
+    status[reachable & ~converged] = "max_iter"
+    status[valid & ~reachable] = "no_root"
+    status[~valid] = "invalid"
+
+    result = {
+        "value": value,
+        "residual": residual,
+        "iterations": iterations,
+        "bisections": bisections,
+        "converged": converged,
+        "status": status,
+    }
+    return {name: values.reshape(shape) for name, values in result.items()}
+
+
+def implied_frame(
+    data: Union[pd.DataFrame, Mapping[str, Any]],
+    keys: Union[str, Sequence[str]] = ("expected_rev_cagr_5y", "lt_earning_multiple"),
+    scenario: str = "mid",
+    **solver_options,
+) -> pd.DataFrame:
+    """
+    Implied value of each input in `keys` for every ticker, the others
+    staying at the `scenario` case. `data` has the columns of
+    projection.project_scenarios plus share_price, so the output of
+    src.batch can be passed as is; without disc_rate_{scenario} the rate is
+    projection.discount_rates(ticker, scenario).
+
+    Returns ticker, share_price and, per key, implied_{key}, {key}_status,
+    {key}_iterations and {key}_residual.
+    """
+    frame = data if isinstance(data, pd.DataFrame) else pd.DataFrame(dict(data))
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    n = len(frame)
+
+    def column(name, default=None):
+        if name in frame:
+            return _as_float(frame[name].to_numpy())
+        if default is None:
+            raise KeyError(f"Missing input column '{name}'")
+        return np.full(n, default, dtype=np.float64)
+
+    if f"disc_rate_{scenario}" in frame:
+        disc_rate = column(f"disc_rate_{scenario}")
+    else:
+        disc_rate = discount_rates(frame["ticker"].to_numpy(), scenario)
+    share_price = column("share_price")
+    base = {
+        "revenue_qtr": column("revenue_qtr"),
+        "shares_outstanding": column("shares_outstanding"),
+        "disc_rate": disc_rate,
+    }
+    for key in SCENARIO_KEYS:
+        base[key] = column(f"{key}_{scenario}", _OPTIONAL_DEFAULTS.get(key))
+
+    out = {"ticker": frame["ticker"].to_numpy(), "share_price": share_price}
+    for key in keys:
+        solved = implied_value(key, share_price, base, **solver_options)
+        out[f"implied_{key}"] = solved["value"]
+        out[f"{key}_status"] = solved["status"]
+        out[f"{key}_iterations"] = solved["iterations"]
+        out[f"{key}_residual"] = solved["residual"]
+    return pd.DataFrame(out, index=frame.index)
@@ -0,0 +1,188 @@
+"""
+Background analysis jobs.
+
+    queue = get_job_queue()
+    job_id = queue.submit("PANW")        # returns at once
+    job = queue.get(job_id)              # poll: job.status, job.llm_text, job.result
+
+A job runs fetch -> valuation -> streamed LLM report -> scenario write on a
+worker thread of the process-wide queue, so it keeps going when the
+Streamlit script that submitted it reruns or the page is reloaded, and any
+session can read it by ID. Workbook processing (building, recalculating
+and serializing the workbook) is capped to one job per core.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from src.llm_output import ScenarioStreamParser
+from src.llm_valuation_summary import stream_llm_investment_summary
+from src.stock_valuation import data_fetcher
+from src.tracing import profile, span
+from src.valuation_pipeline import ValuationResult, apply_llm_text, run_valuation
+
+# Job states, in order; a job ends as "done" or "failed"
+STATUSES = ("queued", "fetching", "llm", "applying", "done", "failed")
+ACTIVE = ("queued", "fetching", "llm", "applying")
+
+DEFAULT_PROVIDER = "gemini"
+DEFAULT_MODEL = "gemini-2.5-flash"
+# Finished jobs stay readable this long (seconds)
+JOB_TTL = 60 * 60
+
+
+@dataclass
+class Job:
+    """One analysis. Updated by its worker; sessions only read it."""
+    id: str
+    ticker: str
+    provider: str = DEFAULT_PROVIDER
+    model: str = DEFAULT_MODEL
+    status: str = "queued"
+    message: str = "Waiting for a worker..."
+    steps: List[str] = field(default_factory=list)   # messages of the stages reached so far
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    fundamentals: Optional[Dict[str, Any]] = None
+    llm_text: str = ""                          # grows while the answer streams
+    report_text: str = ""                       # report part of it, without the JSON
+    scenarios: Dict[str, Any] = field(default_factory=dict)   # scenario keys complete so far
+    scenario_json: Optional[Dict[str, Any]] = None            # set when the JSON has closed
+    result: Optional[ValuationResult] = None    # set when done
+    error: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.time()) - self.created
+
+    def _step(self, status: str, message: str):
+        self.status, self.message = status, message
+        self.steps = self.steps + [message]
+
+
+class JobQueue:
+    """
+    Worker pool and result store shared by all sessions. `max_workers`
+    jobs run at once (mostly waiting on yfinance and the LLM); at most
+    `cpu_workers` of them process a workbook at the same time. Submitting
+    a ticker that already has an active job with the same provider and
+    model returns that job's ID instead of starting another one.
+    """
+
+    def __init__(self, max_workers: int = 16, cpu_workers: Optional[int] = None,
+                 use_cache: bool = True, ttl: float = JOB_TTL, api_source: str = "YF",
+                 history: bool = False):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._cpu = threading.BoundedSemaphore(cpu_workers or os.cpu_count() or 1)
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[tuple, str] = {}
+        self.use_cache = use_cache
+        self.api_source = api_source
+        self.history = history
+        self.ttl = ttl
+
+    def submit(self, ticker: str, provider: str = DEFAULT_PROVIDER, model: str = DEFAULT_MODEL) -> str:
+        ticker = ticker.strip().upper()
+        if not ticker:
+            raise ValueError("ticker must not be empty")
+        key = (ticker, provider, model)
+        with self._lock:
+            self._prune()
+            job_id = self._active.get(key)
+            if job_id is not None:
+                return job_id
+            job = Job(id=uuid.uuid4().hex[:12], ticker=ticker, provider=provider, model=model)
+            self._jobs[job.id] = job
+            self._active[key] = job.id
+        self._pool.submit(self._run, job, key)
+        return job.id
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created)
+
+    def stats(self) -> Dict[str, int]:
+        counts = {status: 0 for status in STATUSES}
+        for job in self.jobs():
+            counts[job.status] += 1
+        return counts
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [i for i, j in self._jobs.items() if j.finished is not None and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Job, key: tuple):
+        try:
+            with profile("job.run", ticker=job.ticker), \
+                    span("job.run", ticker=job.ticker, provider=job.provider):
+                self._analyse(job)
+            job.status, job.message = "done", "Analysis Complete!"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status, job.message = "failed", "Error Occurred"
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._active.pop(key, None)
+
+    def _analyse(self, job: Job):
+        job._step("fetching", f"📊 Fetching latest quarter financial data for {job.ticker}...")
+        data = data_fetcher(job.ticker, self.api_source, self.use_cache).fetch_all_data()
+        with self._cpu:
+            valuation = run_valuation(job.ticker, data=data)
+        job.fundamentals = valuation.context["fundamentals"]
+
+        job._step("llm", "🧠 Generating AI Investment Summary...")
+        parser = ScenarioStreamParser()
+        for chunk in stream_llm_investment_summary(valuation.context, job.provider, job.model, self.use_cache):
+            job.llm_text += chunk
+            parser.feed(chunk)
+            job.report_text, job.scenarios = parser.report_text, dict(parser.scenarios)
+            if parser.complete:
+                # Whatever the model writes after the JSON is not needed; the
+                # shared stream still runs to the end and caches the answer
+                break
+        job.report_text, job.scenario_json = parser.close()
+        job.scenarios = dict(parser.scenarios)
+
+        job._step("applying", "💾 Saving results and calculating scenarios...")
+        with self._cpu:
+            apply_llm_text(valuation, job.llm_text, history=self.history)
+            valuation.to_bytes()    # the download button would serialize it on the script thread
+        job.result = valuation
+
+
+_default_queue: Optional[JobQueue] = None
+_default_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Process-wide queue of the Streamlit app (survives reruns, shared by all
+    sessions); finished analyses go to the valuation history.
+    VALUATION_API_SOURCE=LOCAL makes it read the local snapshot instead of Yahoo Finance.
+    """
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue(api_source=os.environ.get("VALUATION_API_SOURCE", "YF"), history=True)
+        return _default_queue
@@ -0,0 +1,74 @@
+"""
+Heavy dependencies imported on first use.
+
+    yf = lazy_import("yfinance")     # nothing imported yet
+    yf.Ticker("AAPL")                # yfinance is imported here, once
+
+Importing the src modules (and the first paint of the Streamlit app) then
+only pays for what the chosen code path runs: xlwings only for
+recalc="excel", openai only for the openai provider, and so on.
+"""
+import importlib
+import sys
+import threading
+import types
+from typing import Dict, Tuple
+
+# module -> (pip requirement, what needs it), for the error when it is missing
+HEAVY_MODULES: Dict[str, Tuple[str, str]] = {
+    "yfinance": ("yfinance", "fetching fundamentals from Yahoo Finance"),
+    "pandas": ("pandas", "statements and tabular results"),
+    "openpyxl": ("openpyxl", "reading and writing workbooks"),
+    "xlwings": ("xlwings", 'recalc="excel" (needs a local Excel install)'),
+    "openai": ("openai", "the openai LLM provider"),
+    "google.generativeai": ("google-generativeai", "the gemini LLM provider"),
+    "pyarrow": ("pyarrow", "the valuation history"),
+    "altair": ("altair", "the sensitivity charts"),
+    "streamlit": ("streamlit", "the web app and st.secrets"),
+}
+
+
+def require(name: str) -> types.ModuleType:
+    """Import `name` now, with an install hint when it is missing."""
+    try:
+        return importlib.import_module(name)
+    except ImportError as e:
+        if e.name is not None and not name.startswith(e.name.split(".")[0]):
+            raise  # the package is there, one of its own imports failed
+        package, purpose = HEAVY_MODULES.get(name, (name, name))
+        raise ImportError(f"'{package}' is needed for {purpose}: pip install {package}") from e
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that imports it on the first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_lock"] = threading.Lock()
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = self.__dict__["_lazy_module"] = require(self.__name__)
+        return module
+
+    def __getattr__(self, attr):
+        # Only called for names not set on the stand-in itself
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Module `name`, imported on first use (right away when already imported elsewhere)."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
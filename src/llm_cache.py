@@ -0,0 +1,28 @@
+import hashlib
+from typing import Dict
+
+from src.disk_cache import DiskCache, get_cache
+
+LLM_TTL = 7 * 24 * 3600          # a week; a new quarter changes the prompt anyway
+LLM_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def llm_cache() -> DiskCache:
+    """Process-wide store for LLM responses (data/cache/llm.sqlite)."""
+    return get_cache("llm", max_bytes=LLM_CACHE_BYTES)
+
+
+def prompt_key(provider: str, model: str, prompt: str) -> str:
+    """
+    Content address of a request. The prompt embeds the fundamentals JSON,
+    so new quarterly numbers give a new key.
+    """
+    h = hashlib.sha256()
+    for part in (provider.lower(), model or "", prompt):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return f"llm:{h.hexdigest()}"
+
+
+def llm_cache_stats() -> Dict[str, int]:
+    return llm_cache().stats()
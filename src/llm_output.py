@@ -0,0 +1,268 @@
+"""
+Parser for LLM answers: a Markdown report, SCENARIO_JSON_START, then the
+scenario JSON.
+
+    parser = ScenarioStreamParser()
+    for chunk in stream:
+        for event in parser.feed(chunk):
+            ...   # ("text", delta) | ("scenario", key, {"mid":..,"good":..}) | ("json", scenarios)
+    report_text, scenario_json = parser.close()
+
+Chunks are scanned once, as they arrive: each scenario key is emitted when
+its value is complete and the whole object when its closing brace comes
+in, so the valuation can start while the model is still writing. Common
+deviations are tolerated: markdown fences or prose around the JSON, text
+after it, a decorated marker (**SCENARIO_JSON_START**), trailing commas,
+comments, single quotes, unquoted keys, "35%" strings, and a JSON block
+without the marker at all.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.projection import SCENARIO_KEYS
+
+SCENARIO_MARKER = "SCENARIO_JSON_START"
+
+# Report text held back while streaming: the marker may be split across
+# chunks, and markdown around it (**, `, #) is not part of the report
+_HOLDBACK = len(SCENARIO_MARKER) + 8
+_DECORATION = " \t\r\n*_`#>"
+_OPEN_FENCE = re.compile(r"[ \t]*```[A-Za-z]*[ \t]*")
+# Start of a JSON object on its own line, optionally fenced
+_BLOCK_START = re.compile(r"^[ \t]*(?:```[A-Za-z]*[ \t]*\n[ \t]*)?\{", re.MULTILINE)
+
+
+def _number(value):
+    """35, 0.35, "0.35" and "35%" -> number; anything else unchanged."""
+    if isinstance(value, str):
+        text = value.strip().replace(",", "")
+        try:
+            return float(text[:-1]) / 100 if text.endswith("%") else float(text)
+        except ValueError:
+            return value
+    return value
+
+
+def _scalar(value) -> Optional[float]:
+    """_number(), with null, "N/A", lists and the like -> None."""
+    value = _number(value)
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _normalize(key: str, value):
+    """A scenario key's value -> {"mid": .., "good": ..}, None where it is not a number."""
+    if key not in SCENARIO_KEYS:
+        return value
+    if isinstance(value, dict):
+        cases = {case: _scalar(v) for case, v in value.items()}
+        return {"mid": cases.pop("mid", None), "good": cases.pop("good", None), **cases}
+    # A single value applies to both cases
+    value = _scalar(value)
+    return {"mid": value, "good": value}
+
+
+def _report_length(text: str) -> int:
+    """
+    Length of the report in `text`, the answer up to the marker or JSON
+    block: drops the markup that opens the marker (a line of only **, #, >
+    or `, or those characters right before it) and a code fence opened for
+    the JSON, but not the report's own closing ** or fences.
+    """
+    line_start = text.rfind("\n") + 1
+    if not text[line_start:].strip(_DECORATION):
+        text = text[:line_start]
+    else:
+        text = text.rstrip("*_`")
+    text = text.rstrip()
+    line_start = text.rfind("\n") + 1
+    if _OPEN_FENCE.fullmatch(text, line_start) and text.count("```") % 2:
+        text = text[:line_start].rstrip()
+    return len(text)
+
+
+def loads_lenient(text: str):
+    """json.loads, retried once with the usual LLM deviations repaired."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    fixed = re.sub(r"(?m)^\s*//.*$|\s//[^\n\"]*$", "", text)           # // comments
+    if '"' not in fixed:
+        fixed = fixed.replace("'", '"')                                  # single quotes
+    fixed = re.sub(r"(-?\d+(?:\.\d+)?)\s*%", lambda m: repr(float(m.group(1)) / 100), fixed)
+    fixed = re.sub(r"([{,]\s*)([A-Za-z_]\w*)\s*:", r'\1"\2":', fixed)   # unquoted keys
+    fixed = re.sub(r",\s*([}\]])", r"\1", fixed)                         # trailing commas
+    return json.loads(fixed)
+
+
+class ScenarioStreamParser:
+    """Incremental parser of one LLM answer; feed() the chunks, then close()."""
+
+    def __init__(self, marker: str = SCENARIO_MARKER, keys: Sequence[str] = SCENARIO_KEYS):
+        self.marker = marker
+        self.keys = tuple(keys)
+        self.scenarios: Dict[str, Any] = {}        # complete keys so far
+        self.scenario_json: Optional[Dict[str, Any]] = None
+        self._buf = ""
+        self._report_end: Optional[int] = None     # index of the marker
+        self._emitted = 0                          # report characters emitted as "text"
+        self._pos = 0                              # scan position after the marker
+        self._json_start: Optional[int] = None
+        self._member_start = 0
+        self._member_done = False
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+        self._closed: Optional[Tuple[str, Optional[Dict[str, Any]]]] = None
+
+    @property
+    def complete(self) -> bool:
+        """True once the scenario JSON has closed."""
+        return self.scenario_json is not None
+
+    @property
+    def report_text(self) -> str:
+        """Report received so far (all of it once the marker has arrived)."""
+        end = self._report_end if self._report_end is not None else max(0, len(self._buf) - _HOLDBACK)
+        return self._buf[:end]
+
+    def feed(self, chunk: str) -> List[tuple]:
+        if self._closed is not None:
+            raise ValueError("feed() after close()")
+        if not chunk or self.complete:
+            # Anything after the JSON (closing fence, sign-off) is ignored
+            self._buf += chunk or ""
+            return []
+        events = []
+        self._buf += chunk
+        if self._report_end is None:
+            found = self._buf.find(self.marker, max(0, self._emitted - len(self.marker)))
+            if found >= 0:
+                self._start_json(found, found + len(self.marker))
+        events += self._text_event()
+        if self._report_end is not None:
+            events += self._scan()
+        return events
+
+    def close(self) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """(report_text, scenario_json); scenario_json is None when no usable JSON was found."""
+        if self._closed is None:
+            if self._report_end is None:
+                self._fallback()
+            elif not self.complete and all(k in self.scenarios for k in self.keys):
+                # Cut off before the closing brace, but every key's value had closed
+                self.scenario_json = dict(self.scenarios)
+            if self._report_end is None:
+                self._report_end = len(self._buf.rstrip())   # no JSON anywhere: it is all report
+            self._closed = (self.report_text, self.scenario_json)
+        return self._closed
+
+    # ---------- internals ----------
+
+    def _start_json(self, report_end: int, json_from: int):
+        self._report_end = _report_length(self._buf[:report_end])
+        self._pos = json_from
+
+    def _text_event(self) -> List[tuple]:
+        text = self.report_text
+        if len(text) <= self._emitted:
+            return []
+        delta, self._emitted = text[self._emitted:], len(text)
+        return [("text", delta)]
+
+    def _scan(self) -> List[tuple]:
+        events = []
+        buf = self._buf
+        i = self._pos
+        if self._json_start is None:
+            # Skip fences and prose between the marker and the object
+            i = buf.find("{", i)
+            if i < 0:
+                self._pos = len(buf)
+                return events
+            self._json_start = i
+        while i < len(buf):
+            c = buf[i]
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_str = False
+            elif c == '"':
+                self._in_str = True
+            elif c in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member_start, self._member_done = i + 1, False
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    # A nested value closed: that key is complete
+                    events += self._member(i + 1)
+                elif self._depth == 0:
+                    events += self._member(i)
+                    events += self._finish(i + 1)
+                    i += 1
+                    break
+            elif c == "," and self._depth == 1:
+                events += self._member(i)
+                self._member_start, self._member_done = i + 1, False
+            i += 1
+        self._pos = i
+        return events
+
+    def _member(self, end: int) -> List[tuple]:
+        if self._member_done:
+            return []
+        text = self._buf[self._member_start:end].strip().rstrip(",")
+        if not text:
+            return []
+        try:
+            member = loads_lenient("{" + text + "}")
+        except (json.JSONDecodeError, ValueError):
+            return []   # the final parse of the whole object gets another chance
+        self._member_done = True
+        events = []
+        for key, value in member.items():
+            self.scenarios[key] = _normalize(key, value)
+            if key in self.keys:
+                events.append(("scenario", key, self.scenarios[key]))
+        return events
+
+    def _finish(self, end: int) -> List[tuple]:
+        try:
+            obj = loads_lenient(self._buf[self._json_start:end])
+        except (json.JSONDecodeError, ValueError):
+            obj = None
+        if isinstance(obj, dict):
+            obj = {k: _normalize(k, v) for k, v in obj.items()}
+        elif self.scenarios:
+            obj = dict(self.scenarios)
+        else:
+            return []
+        self.scenario_json = obj
+        return [("json", obj)]
+
+    def _fallback(self):
+        # No marker: use the last JSON block (fenced or on its own line) that has scenario keys
+        for match in reversed(list(_BLOCK_START.finditer(self._buf))):
+            parser = ScenarioStreamParser(self.marker, self.keys)
+            parser._buf = self._buf
+            brace = match.end() - 1
+            parser._start_json(brace, brace)
+            parser._scan()
+            if parser.complete and any(k in parser.scenario_json for k in self.keys):
+                self._buf = parser._buf
+                self._report_end = parser._report_end
+                self.scenarios, self.scenario_json = parser.scenarios, parser.scenario_json
+                return
+
+
+def parse_llm_output(llm_text: str, marker: str = SCENARIO_MARKER) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """(report_text, scenario_json) of a complete answer; scenario_json is None when it has none."""
+    parser = ScenarioStreamParser(marker)
+    parser.feed(llm_text)
+    return parser.close()
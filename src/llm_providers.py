@@ -0,0 +1,311 @@
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+from src.lazy_imports import require
+from src.tracing import span
+
+
+SYSTEM_PROMPT = "You are an equity analyst."
+
+
+class ProviderError(RuntimeError):
+    """Error raised by a provider call, with the HTTP status when known."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# ---------- Providers ----------
+
+class LLMProvider:
+    """One LLM backend. Subclasses keep their SDK clients for reuse across calls."""
+
+    name = ""
+    default_model = ""
+
+    def generate(self, prompt: str, model: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, model: str) -> Iterator[str]:
+        # Providers without streaming return everything as one chunk
+        yield self.generate(prompt, model)
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    default_model = "gemini-2.5-flash"
+
+    def __init__(self, api_key: Optional[str] = None):
+        if api_key is None:
+            # config reads st.secrets, so streamlit is only imported here
+            from config import GEMINI_API_KEY as api_key
+
+        genai = self._genai = require("google.generativeai")
+        genai.configure(api_key=api_key)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model: str):
+        with self._lock:
+            if model not in self._models:
+                self._models[model] = self._genai.GenerativeModel(model)
+            return self._models[model]
+
+    def generate(self, prompt: str, model: str) -> str:
+        return self._model(model).generate_content(prompt).text
+
+    def stream(self, prompt: str, model: str) -> Iterator[str]:
+        for chunk in self._model(model).generate_content(prompt, stream=True):
+            # Chunks without candidates (e.g. safety metadata) have no text
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+    default_model = "gpt-4.1-mini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        if api_key is None:
+            from config import OPENAI_API_KEY as api_key
+
+        # One client = one HTTP connection pool, shared by all threads
+        self._client = require("openai").OpenAI(api_key=api_key)
+
+    def _messages(self, prompt):
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]
+
+    def generate(self, prompt: str, model: str) -> str:
+        resp = self._client.chat.completions.create(model=model, messages=self._messages(prompt))
+        return resp.choices[0].message.content
+
+    def stream(self, prompt: str, model: str) -> Iterator[str]:
+        stream = self._client.chat.completions.create(
+            model=model, messages=self._messages(prompt), stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+STUB_SCENARIOS = """{
+  "expected_rev_cagr_5y": { "mid": 0.10, "good": 0.15 },
+  "expected_op_margin": { "mid": 0.25, "good": 0.30 },
+  "expected_dilution": { "mid": 0.02, "good": 0.01 },
+  "lt_net_debt": { "mid": 0, "good": 0 },
+  "interest_rate_debt": { "mid": 0.05, "good": 0.05 },
+  "tax_rate": { "mid": 0.20, "good": 0.20 },
+  "lt_earning_multiple": { "mid": 20, "good": 25 }
+}"""
+
+
+class StubProvider(LLMProvider):
+    """
+    Offline provider for benchmarks and tests. Answers after `latency`
+    seconds (+/- `jitter`) with a canned report in the format the prompt
+    asks for; `error_rate` of the calls fail with HTTP 429.
+    """
+
+    name = "stub"
+    default_model = "stub"
+
+    def __init__(self, latency: float = 1.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, chunks: int = 20, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunks = chunks
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _delay(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter, self.jitter)
+            failed = self._random.random() < self.error_rate
+        return max(0.0, self.latency + jitter), failed
+
+    def _text(self, prompt):
+        m = re.search(r"^Ticker: (\S*)", prompt, re.MULTILINE)
+        ticker = m.group(1) if m else ""
+        return (
+            f"### 1. Company snapshot\n{ticker} (stub response).\n"
+            "### 2. Pros\n- Offline benchmark.\n"
+            "### 3. Cons\n- Not a real analysis.\n"
+            "### 4. Scenario Suggestions\n- Fixed values.\n"
+            f"SCENARIO_JSON_START\n{STUB_SCENARIOS}"
+        )
+
+    def generate(self, prompt: str, model: str) -> str:
+        delay, failed = self._delay()
+        time.sleep(delay)
+        if failed:
+            raise ProviderError("stub rate limit", status_code=429)
+        return self._text(prompt)
+
+    def stream(self, prompt: str, model: str) -> Iterator[str]:
+        delay, failed = self._delay()
+        if failed:
+            time.sleep(delay)
+            raise ProviderError("stub rate limit", status_code=429)
+        text = self._text(prompt)
+        size = max(1, len(text) // self.chunks)
+        for i in range(0, len(text), size):
+            time.sleep(delay / self.chunks)
+            yield text[i:i + size]
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "openai": OpenAIProvider,
+    "stub": StubProvider,
+}
+
+
+# ---------- Throughput controls ----------
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _status_code(exc) -> Optional[int]:
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Rate limits, server errors, timeouts and dropped connections are worth retrying."""
+    status = _status_code(exc)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+class LLMClient:
+    """
+    Provider wrapper for batch use: token-bucket rate limit, at most
+    `max_concurrency` requests in flight, and up to `max_retries` retries
+    with full-jitter exponential backoff on retryable errors. One client is
+    shared by the worker threads; `retries` counts the retries of all of them.
+    """
+
+    def __init__(self, provider: LLMProvider, requests_per_second: float = 2.0,
+                 burst: Optional[float] = None, max_concurrency: int = 8,
+                 max_retries: int = 4, backoff: float = 1.0, max_backoff: float = 30.0):
+        self.provider = provider
+        self.bucket = TokenBucket(requests_per_second, burst) if requests_per_second else None
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def _sleep_before_retry(self, attempt):
+        with self._lock:
+            self.retries += 1
+        time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    def generate(self, prompt: str, model: Optional[str] = None) -> str:
+        model = model or self.provider.default_model
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                with self.slots, span("llm.request", provider=self.provider.name, model=model, attempt=attempt):
+                    return self.provider.generate(prompt, model)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+            self._sleep_before_retry(attempt)
+
+    def stream(self, prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        """
+        Streamed answer. Only a failure before the first chunk is retried.
+        The request keeps its concurrency slot until the provider has sent
+        the last chunk (the chunk is read ahead, so the slot is free before
+        it is yielded), so callers should drain the stream promptly or
+        close() it to give the slot back.
+        """
+        model = model or self.provider.default_model
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            started = False
+            try:
+                last = None
+                with self.slots, span("llm.request", provider=self.provider.name, model=model, attempt=attempt):
+                    for chunk in self.provider.stream(prompt, model):
+                        if started:
+                            yield last
+                        started, last = True, chunk
+                if started:
+                    yield last
+                return
+            except Exception as e:
+                if started or attempt == self.max_retries or not is_retryable(e):
+                    raise
+            self._sleep_before_retry(attempt)
+
+
+_clients: Dict[str, LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def configure_client(provider: str, provider_options: Optional[dict] = None, **client_options) -> LLMClient:
+    """
+    (Re)create the shared client for `provider`, e.g.
+    configure_client("stub", {"latency": 0.5}, requests_per_second=50, max_concurrency=64).
+    """
+    name = provider.lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"provider must be one of {sorted(PROVIDERS)}")
+    client = LLMClient(PROVIDERS[name](**(provider_options or {})), **client_options)
+    with _clients_lock:
+        _clients[name] = client
+    return client
+
+
+def get_client(provider: str) -> LLMClient:
+    """Shared client for `provider`, created with default limits on first use."""
+    name = provider.lower()
+    with _clients_lock:
+        client = _clients.get(name)
+    return client or configure_client(name)
@@ -1,15 +1,21 @@
 import json
-from typing import Dict, Any
-from openpyxl import load_workbook
-from openpyxl.styles import Alignment
-import pandas as pd
-import xlwings as xw    
-
-from config import GEMINI_API_KEY
-
-from openai import OpenAI
-import google.generativeai as genai
-
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional
+
+from src.artifacts import save_workbook, unique_path
+from src.formula_engine import recalculate_worksheet, save_workbook_with_values
+from src.lazy_imports import lazy_import
+from src.llm_cache import LLM_TTL, llm_cache, prompt_key
+from src.llm_output import SCENARIO_MARKER, parse_llm_output
+from src.llm_providers import get_client
+from src.schema import FUNDAMENTAL_LABELS, SCENARIO_LABELS, SheetSchema
+from src.single_flight import SingleFlight
+from src.stock_valuation import predictions_from_values, recalculate_with_excel
+from src.template_cache import get_schema
+from src.tracing import current_span, span, traced
+
+openpyxl = lazy_import("openpyxl")
 
 from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -17,63 +23,33 @@ DATA_DIR = BASE_DIR / "data" / "valuations"
 
 
 
+@traced("excel.load")
 def load_valuation_excel(
     excel_path: str,
     sheet_name: str = "stock_val",
+    schema: Optional[SheetSchema] = None,
 ) -> Dict[str, Any]:
 
-    wb = load_workbook(excel_path, data_only=True)
+    wb = openpyxl.load_workbook(excel_path, data_only=True)
     ws = wb[sheet_name]
 
-    tmp = {}
-
-    # Only fundamentals are read from Excel (max 35 rows)
-    for row in ws.iter_rows(
-        min_row=1,
-        max_row=35,
-        min_col=1,
-        max_col=3,
-        values_only=True,
-    ):
-        label, mid, good = row
-        if label is None:
-            continue
-        label = str(label).strip()
-        if good is None or good == "":
-            good = mid
-        tmp[label] = {"mid": mid, "good": good}
-
-    def mid(label: str):
-        return tmp.get(label, {}).get("mid")
-
-    fundamentals = {
-        "ticker": mid("Ticker"),
-        "share_price": mid("Share Price"),
-        "shares_outstanding": mid("Shares Outstanding"),
-        "market_cap": mid("Market Cap (auto)"),
-        "revenue_qtr": mid("Revenue (Qtr)"),
-        "cogs": mid("COGS"),
-        "gross_profit": mid("Gross Profit"),
-        "gross_margin": mid("Gross Margin"),
-        "opex": mid("OPEX"),
-        "operating_profit": mid("Operating Profit"),
-        "operating_margin": mid("Operating Margin"),
-        "ebitda_ps": mid("EBITDA PS"),
-        "cash": mid("Cash"),
-        "debt": mid("Debt"),
-        "net_cash": mid("Net Cash (auto)"),
-    }
+    # Only the labelled cells are read, looked up through the template schema
+    schema = schema or get_schema()
+    return context_from_values({coord: ws[coord].value for coord in schema.coordinates()}, schema)
 
-    scenarios = {
-        "expected_rev_cagr_5y": {"label": "Expected Revenue CAGR (5y)", "mid": None, "good": None},
-        "expected_op_margin": {"label": "E Operated Margin", "mid": None, "good": None},
-        "expected_dilution": {"label": "E Dilution (5yr)", "mid": None, "good": None},
 
-        "lt_net_debt": {"label": "LT Net Debt", "mid": None, "good": None},
-        "interest_rate_debt": {"label": "Interest Rate on Debt", "mid": None, "good": None},
-        "tax_rate": {"label": "Tax Rate", "mid": None, "good": None},
+def context_from_values(values: Dict[str, Any], schema: Optional[SheetSchema] = None) -> Dict[str, Any]:
+    """
+    Prompt context from calculated cell values ({coordinate: value}), either
+    read from a saved file or kept in memory.
+    """
+    schema = schema or get_schema()
+    fundamentals = {key: schema.get(values, label) for key, label in FUNDAMENTAL_LABELS.items()}
 
-        "lt_earning_multiple": {"label": "LT Earning Multiple", "mid": None, "good": None},
+    # Left empty on purpose: the LLM suggests them
+    scenarios = {
+        key: {"label": label, "mid": None, "good": None}
+        for key, label in SCENARIO_LABELS.items()
     }
 
     return {
@@ -82,11 +58,8 @@ def load_valuation_excel(
     }
 
 
-def generate_llm_investment_summary(
-    context: Dict[str, Any],
-    provider: str = "gemini",
-    model: str = "gemini-2.5-pro",
-) -> str:
+def build_investment_prompt(context: Dict[str, Any]) -> str:
+    """Render the analyst prompt for a load_valuation_excel context."""
 
     fundamentals = context["fundamentals"]
     scenarios = context["scenarios"]
@@ -154,142 +127,220 @@ Do NOT wrap this JSON in markdown code fences and do NOT add any text after the
 
 
 """
-    # print(user_prompt)
-    
-    if provider.lower() == "gemini":
+    return user_prompt
 
-        genai.configure(api_key=GEMINI_API_KEY)
 
-        # Default Gemini model
-        if model is None:
-            model = "gemini-2.5-flash"
+DEFAULT_MODELS = {"gemini": "gemini-2.5-flash", "openai": "gpt-4.1-mini", "stub": "stub"}
 
-        gm = genai.GenerativeModel(model)
+# Identical prompts in flight at the same time (e.g. several sessions on
+# one ticker) share one provider request, keyed like the LLM cache
+_llm_calls = SingleFlight()
 
-        resp = gm.generate_content(user_prompt)
-        return resp.text
 
-    # OPENAI MODE
-    if provider.lower() == "openai":
-        
-        client = OpenAI(api_key=OPENAI_API_KEY)
+@traced("llm.generate", "provider", "model")
+def generate_llm_investment_summary(
+    context: Dict[str, Any],
+    provider: str = "gemini",
+    model: str = "gemini-2.5-pro",
+    use_cache: bool = True,
+) -> str:
+    """
+    LLM report for a load_valuation_excel context. With use_cache, identical
+    requests (same provider, model and prompt) are answered from data/cache;
+    identical requests in flight at the same time share one provider call.
+    """
 
-        # Default OpenAI model
-        if model is None:
-            model = "gpt-4.1-mini"
+    user_prompt = build_investment_prompt(context)
+    # print(user_prompt)
+    model = model or DEFAULT_MODELS.get(provider.lower())
 
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are an equity analyst."},
-                {"role": "user", "content": user_prompt},
-            ],
-            #temperature=0.3,
-        )
+    cache = llm_cache() if use_cache else None
+    key = prompt_key(provider, model, user_prompt)
+    if cache is not None:
+        cached = cache.get(key)
+        current_span().set(cached=cached is not None)
+        if cached is not None:
+            return cached
 
+    text = _llm_calls.do(key, _call_llm, user_prompt, provider, model)
 
-    return resp.choices[0].message.content
+    # Only answers with usable scenarios are worth replaying
+    if cache is not None and text and parse_scenario_json(text) is not None:
+        cache.set(key, text, ttl=LLM_TTL)
+    return text
 
 
+def _call_llm(user_prompt: str, provider: str, model: str) -> str:
+    # Shared, rate limited client with retries (src/llm_providers.py)
+    return get_client(provider).generate(user_prompt, model)
 
 
+def generate_llm_investment_summaries(
+    contexts: List[Dict[str, Any]],
+    provider: str = "gemini",
+    model: Optional[str] = None,
+    use_cache: bool = True,
+    max_workers: int = 8,
+) -> List[Dict[str, Any]]:
+    """
+    Batch version of generate_llm_investment_summary. Requests run on
+    `max_workers` threads; the provider client's rate limit and concurrency
+    cap still apply. Returns one {"ticker", "text", "error"} per context, in
+    input order; a failed request does not stop the batch.
+    """
+
+    def one(context):
+        ticker = (context.get("fundamentals") or {}).get("ticker")
+        try:
+            text = generate_llm_investment_summary(context, provider, model, use_cache)
+            return {"ticker": ticker, "text": text, "error": None}
+        except Exception as e:
+            return {"ticker": ticker, "text": None, "error": f"{type(e).__name__}: {e}"}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(one, contexts))
+
+
+def stream_llm_investment_summary(
+    context: Dict[str, Any],
+    provider: str = "gemini",
+    model: str = "gemini-2.5-pro",
+    use_cache: bool = True,
+) -> Iterator[str]:
+    """
+    Same as generate_llm_investment_summary, but yields the response text
+    chunk by chunk as the provider streams it. A cache hit is yielded as a
+    single chunk; a streamed answer is stored once it completes. Sessions
+    asking for the same answer while it streams read the one provider
+    stream, each from its first chunk.
+    """
+
+    user_prompt = build_investment_prompt(context)
+    model = model or DEFAULT_MODELS.get(provider.lower())
+
+    with span("llm.stream", provider=provider, model=model) as s:
+        cache = llm_cache() if use_cache else None
+        key = prompt_key(provider, model, user_prompt)
+        if cache is not None:
+            cached = cache.get(key)
+            s.set(cached=cached is not None)
+            if cached is not None:
+                yield cached
+                return
+
+        yield from _llm_calls.stream(key, _stream_and_cache, user_prompt, provider, model, cache, key)
+
+
+def _stream_and_cache(user_prompt: str, provider: str, model: str, cache, key: str) -> Iterator[str]:
+    # Runs once per shared stream, so the answer is also stored once
+    parts = []
+    for chunk in _stream_llm(user_prompt, provider, model):
+        parts.append(chunk)
+        yield chunk
+
+    text = "".join(parts)
+    if cache is not None and parse_scenario_json(text) is not None:
+        cache.set(key, text, ttl=LLM_TTL)
+
+
+def _stream_llm(user_prompt: str, provider: str, model: str) -> Iterator[str]:
+    return get_client(provider).stream(user_prompt, model)
+
+
+def parse_scenario_json(llm_text: str, marker: str = SCENARIO_MARKER) -> Optional[Dict[str, Any]]:
+    """
+    Scenario dict from a (possibly still growing) LLM response, or None while
+    the JSON object after the marker is incomplete. Fences, text after the
+    JSON and other common deviations are tolerated (src/llm_output.py).
+    """
+    return parse_llm_output(llm_text, marker)[1]
+
+
+def apply_llm_result(ws, llm_text: str, schema: Optional[SheetSchema] = None):
+    """
+    Write the report text (F3:K40) and the suggested scenario inputs
+    (B = Mid, C = Good) of an LLM answer into a valuation worksheet.
+    Returns (text_part, scenario_json).
+    """
+
+    schema = schema or get_schema()
+    # Rapor ve senaryo JSON'u; çit (```), JSON sonrası metin vb. tolere edilir
+    text_part, scenario_json = parse_llm_output(llm_text)
+    if scenario_json is None:
+        if SCENARIO_MARKER not in llm_text:
+            raise ValueError("SCENARIO_JSON_START marker not found in LLM output.")
+        raise ValueError("No complete scenario JSON after SCENARIO_JSON_START in LLM output.")
+
+    if "F3:K40" not in {str(r) for r in ws.merged_cells.ranges}:
+        ws.merge_cells("F3:K40")
+    cell = ws["F3"]
+    cell.value = text_part
+    cell.alignment = openpyxl.styles.Alignment(wrap_text=True, vertical="top")
+
+    # B=Mid, C=Good on the row of each label
+    for coord, value in schema.scenario_inputs(scenario_json).items():
+        ws[coord] = value
+
+    return text_part, scenario_json
+
+
+@traced("llm.write_result", "ticker", "recalc")
 def write_llm_result_to_excel(
     excel_path: str,
     ticker: str,
     llm_text: str,
     output_path: str = None,
     sheet_name: str = "stock_val",
+    recalc: str = "python",
+    history: bool = False,
+    schema: Optional[SheetSchema] = None,
+    remove_input: bool = False,
 ):
-
-    marker = "SCENARIO_JSON_START"
-    if marker not in llm_text:
-        raise ValueError("SCENARIO_JSON_START marker not found in LLM output.")
-
-    # Marker'dan sonrasını al
-    text_part, json_part = llm_text.split(marker, 1)
-    json_str = json_part.strip()
-
-    scenario_json = json.loads(json_str)
+    """
+    Write an LLM answer into a copy of the valuation workbook `excel_path`
+    and recalculate it. `schema` is the label index of that sheet (read
+    from it when not given). With remove_input=True the caller hands
+    `excel_path` over (e.g. a file value_stock wrote for this run) and it
+    is deleted once the copy is saved; otherwise it is left alone.
+    Returns (text_part, predictions, output_path).
+    """
 
     # Write text_part to Excel
-    wb = load_workbook(excel_path)
+    wb = openpyxl.load_workbook(excel_path)
     if sheet_name not in wb.sheetnames:
         raise ValueError(f"Sheet '{sheet_name}' not found in {excel_path}")
 
     ws = wb[sheet_name]
+    schema = schema or SheetSchema.from_worksheet(ws)
+    text_part, _ = apply_llm_result(ws, llm_text, schema)
 
-    ws.merge_cells("F3:K40")
-    cell = ws["F3"]
-    cell.value = text_part
-    cell.alignment = Alignment(wrap_text=True, vertical="top")
-
-    scenario_labels = {
-    "expected_rev_cagr_5y": "Expected Revenue CAGR (5y)",
-    "expected_op_margin": "E Operated Margin",
-    "expected_dilution": "E Dilution (5yr)",
-    "lt_net_debt": "LT Net Debt",
-    "interest_rate_debt": "Interest Rate on Debt",
-    "tax_rate": "Tax Rate",
-    "lt_earning_multiple": "LT Earning Multiple",
-}
-    
-    # A sütununda etiketleri bul, B=Mid, C=Good
-    max_row = ws.max_row or 100
-    for key, label in scenario_labels.items():
-        if key not in scenario_json:
-            continue
-
-        mid_val = scenario_json[key].get("mid")
-        good_val = scenario_json[key].get("good", mid_val)
-
-        # İlgili label satırını bul
-        for row in ws.iter_rows(min_row=1, max_row=max_row, min_col=1, max_col=3):
-            label_cell = row[0]  # A sütunu
-            if label_cell.value is None:
-                continue
-            if str(label_cell.value).strip() == label:
-                mid_cell = row[1]   # B sütunu
-                good_cell = row[2]  # C sütunu
-                mid_cell.value = mid_val
-                good_cell.value = good_val
-                break
-
-    # Determine output filename
+    # Determine output filename: a new file per call, concurrent runs never share one
     if output_path is None:
-        import os
         folder = os.path.dirname(excel_path)
-        output_path = os.path.join(folder, f"ai-summaries", f"{ticker}_ai.xlsx")
-
-    wb.save(output_path)
-
-    # Remove original excel
-    try:
-        os.remove(excel_path)
-    except OSError:
-        pass
-
-    # Read with pandas to read formula values
-    try:
-        app = xw.App(visible=False)
-        book = app.books.open(os.path.abspath(output_path))
-        book.save()
-        app.quit()
-    
-    except Exception as e:
-        print(f"Warning: xlwings failed: {e}") 
-
-    df_pred = pd.read_excel(output_path, header=None)
-    
-
-    predictions = {
-        "ticker": ticker,
-        "current_price": f"{df_pred.iloc[3, 1]:.2f}",      # Row 4, Column B (index 3, 1)
-        "lower_prediction": f"{df_pred.iloc[37, 1]:.2f}",  # Row 38, Column B (index 37, 1)
-        "upper_prediction": f"{df_pred.iloc[37, 2]:.2f}"   # Row 38, Column C (index 37, 2)
-    }
+        output_path = unique_path(os.path.join(folder, "ai-summaries"), f"{ticker}_ai")
 
-    return text_part, predictions, output_path
+    with span("workbook.save", ticker=ticker):
+        if recalc == "python":
+            values = recalculate_worksheet(ws)
+            save_workbook_with_values(wb, output_path, values, sheet_name)
+        else:
+            save_workbook(wb, output_path)
 
+    if remove_input and os.path.abspath(excel_path) != os.path.abspath(output_path):
+        try:
+            os.remove(excel_path)
+        except OSError:
+            pass
+
+    if recalc != "python":
+        values = recalculate_with_excel(output_path, schema)
+
+    predictions = predictions_from_values(ticker, values, schema)
+    if history:
+        from src.history_store import record_history
+        record_history([schema.record(values).as_row()], "llm", report_text=llm_text)
+
+    return text_part, predictions, output_path
 
 
 
@@ -0,0 +1,209 @@
+"""
+Local fundamentals snapshot, the data behind api_source="LOCAL".
+
+    python -m src.local_data tickers.txt                        # record from Yahoo Finance
+    python -m src.local_data tickers.txt --output data/snapshots/2025-06
+
+A snapshot is a directory holding what YFinanceDataFetcher.fetch_all_data
+returned for each ticker:
+
+    values.npy    float64 matrix, one row per ticker, one column per field
+    tickers.txt   row order, one ticker per line
+    meta.json     fields, creation time, source
+
+values.npy is memory-mapped, so opening a snapshot only reads the ticker
+index, and a lookup is a dict lookup plus a view of one row: no parsing,
+no copy, O(1) per ticker whatever the snapshot size. Valuations on a
+snapshot need no network and give the same result on every run.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional
+
+import numpy as np
+
+from src.fetch_pipeline import FetchResult, iter_fetch_all
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_SNAPSHOT = BASE_DIR / "data" / "snapshots" / "fundamentals"
+
+# Fields of build_financial_data, in column order
+FIELDS = (
+    "Share Price",
+    "Shares Outstanding",
+    "Revenue (Qtr)",
+    "COGS",
+    "OPEX",
+    "Operating Profit",
+    "Cash",
+    "Debt",
+)
+
+
+def _float(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+class Snapshot:
+    """Read-only, memory-mapped snapshot; safe to share between threads."""
+
+    def __init__(self, path=DEFAULT_SNAPSHOT):
+        self.path = Path(path)
+        try:
+            with open(self.path / "meta.json", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            with open(self.path / "tickers.txt", encoding="utf-8") as f:
+                self.tickers = f.read().split("\n") if self.meta["count"] else []
+        except FileNotFoundError:
+            raise ValueError(f"No snapshot at '{self.path}' (record one with: python -m src.local_data tickers.txt)")
+        self.fields = tuple(self.meta["fields"])
+        self.values = np.load(self.path / "values.npy", mmap_mode="r")
+        if self.values.shape != (len(self.tickers), len(self.fields)):
+            raise ValueError(f"Snapshot '{self.path}' is inconsistent: {self.values.shape} values "
+                             f"for {len(self.tickers)} tickers x {len(self.fields)} fields")
+        self.index = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self.index
+
+    def row(self, ticker: str) -> np.ndarray:
+        """Values of `ticker` in `fields` order, as a view into the mapped file."""
+        try:
+            return self.values[self.index[ticker]]
+        except KeyError:
+            raise ValueError(f"'{ticker}' is not in snapshot '{self.path}'")
+
+    def get(self, ticker: str) -> Dict[str, float]:
+        """
+        fetch_all_data-shaped dict of `ticker`. Fields the snapshot has no
+        value for (NaN) are left out, so the template keeps its own cell.
+        """
+        return {field: value for field, value in zip(self.fields, self.row(ticker).tolist()) if value == value}
+
+    @staticmethod
+    def write(path, records: Mapping[str, Mapping[str, Any]], source: str = "yfinance",
+              fields=FIELDS) -> "Snapshot":
+        """
+        Write `records` ({ticker: fetch_all_data dict}) as a snapshot at
+        `path`. The directory is replaced as a whole, so readers never see
+        a half-written snapshot.
+        """
+        path = Path(path)
+        tickers = sorted(records)
+        values = np.array([[_float(records[t].get(f)) for f in fields] for t in tickers],
+                          dtype=np.float64).reshape(len(tickers), len(fields))
+        meta = {
+            "fields": list(fields),
+            "count": len(tickers),
+            "source": source,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+        tmp = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        np.save(tmp / "values.npy", values)
+        (tmp / "tickers.txt").write_text("\n".join(tickers), encoding="utf-8")
+        (tmp / "meta.json").write_text(json.dumps(meta, indent=1), encoding="utf-8")
+
+        old = path.with_name(f"{path.name}.old-{os.getpid()}")
+        if path.exists():
+            os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+        return Snapshot(path)
+
+
+_snapshots: Dict[str, tuple] = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot(path=None) -> Snapshot:
+    """Process-wide Snapshot of `path` (default data/snapshots/fundamentals), reopened when re-recorded."""
+    path = Path(path or os.environ.get("VALUATION_SNAPSHOT") or DEFAULT_SNAPSHOT)
+    try:
+        stamp = os.stat(path / "meta.json").st_mtime_ns
+    except FileNotFoundError:
+        stamp = None
+    key = str(path.resolve())
+    with _snapshots_lock:
+        cached = _snapshots.get(key)
+        if cached is None or cached[0] != stamp:
+            cached = _snapshots[key] = (stamp, Snapshot(path))
+        return cached[1]
+
+
+class LocalDataFetcher:
+    """Stand-in for YFinanceDataFetcher that reads a snapshot instead of the network."""
+
+    def __init__(self, ticker, snapshot: Optional[Snapshot] = None):
+        self.ticker = ticker
+        self.snapshot = snapshot or get_snapshot()
+
+    def fetch_all_data(self) -> Dict[str, float]:
+        return self.snapshot.get(self.ticker)
+
+
+def iter_snapshot(tickers: Iterable[str], snapshot: Optional[Snapshot] = None, **_) -> Iterator[FetchResult]:
+    """
+    iter_fetch_all counterpart for run_batch(fetch=...): one FetchResult per
+    ticker from the snapshot; tickers missing from it are "failed".
+    """
+    snapshot = snapshot or get_snapshot()
+    for ticker in tickers:
+        start = time.perf_counter()
+        if ticker in snapshot:
+            yield FetchResult(ticker, "ok", data=snapshot.get(ticker), elapsed=time.perf_counter() - start)
+        else:
+            yield FetchResult(ticker, "failed", errors={"snapshot": f"not in snapshot '{snapshot.path}'"})
+
+
+def record_snapshot(tickers: Iterable[str], output=DEFAULT_SNAPSHOT, fetch=iter_fetch_all,
+                    **fetch_options) -> Dict[str, int]:
+    """
+    Fetch `tickers` with YFinanceDataFetcher (through fetch_pipeline) and
+    write the ones that succeeded as a snapshot. Returns counts per status.
+    """
+    records, counts = {}, {}
+    for result in fetch(list(dict.fromkeys(tickers)), **fetch_options):
+        counts[result.status] = counts.get(result.status, 0) + 1
+        if result.status == "ok":
+            records[result.ticker] = result.data
+    Snapshot.write(output, records)
+    return counts
+
+
+def main(argv: Optional[List[str]] = None):
+    from src.batch import read_tickers
+    from src.fin_data_yf import fundamentals_cache
+
+    parser = argparse.ArgumentParser(prog="python -m src.local_data",
+                                     description="Record a fundamentals snapshot for api_source='LOCAL'.")
+    parser.add_argument("tickers", help="text file with one ticker per line")
+    parser.add_argument("--output", default=str(DEFAULT_SNAPSHOT), help=f"snapshot directory (default {DEFAULT_SNAPSHOT})")
+    parser.add_argument("--workers", type=int, default=16, help="fetch threads")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds per ticker fetch")
+    parser.add_argument("--no-cache", action="store_true", help="bypass data/cache")
+    args = parser.parse_args(argv)
+
+    counts = record_snapshot(
+        read_tickers(args.tickers),
+        output=args.output,
+        max_workers=args.workers,
+        timeout=args.timeout,
+        cache=None if args.no_cache else fundamentals_cache(),
+    )
+    print(f"Wrote {counts.get('ok', 0)} tickers to {args.output} ({counts})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Mapping, Sequence, Union
+
+import numpy as np
+
+from src.lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+
+# Scenario inputs, keyed the same way as load_valuation_excel / SCENARIO_JSON
+SCENARIO_KEYS = (
+    "expected_rev_cagr_5y",
+    "expected_op_margin",
+    "expected_dilution",
+    "lt_net_debt",
+    "interest_rate_debt",
+    "tax_rate",
+    "lt_earning_multiple",
+)
+
+# Projected rows of the Scenarios table -> output column prefix
+PROJECTION_ROWS = {
+    "E Revenue": "e_revenue",
+    "E EBITDA": "e_ebitda",
+    "Earning": "earning",
+    "E Shares Outstanding": "e_shares",
+    "Expected EPS": "eps",
+    "Predicted Share Price 5 yr": "price_5y",
+    "Predicted Share Price Disc": "price_5y_disc",
+}
+
+# Inputs that do not change the result when absent
+_OPTIONAL_DEFAULTS = {"lt_net_debt": 0.0, "interest_rate_debt": 0.0}
+
+DEFAULT_DISC_RATE = 0.05
+# Borsa Istanbul (.IS) tickers get a higher discount rate, per case as in
+# the "Discounted rate" row of format.xlsx (B37 / C37)
+IS_DISC_RATES = {"mid": 0.30, "good": 0.25}
+YEARS = 5
+
+ArrayLike = Union[float, np.ndarray, Sequence[float]]
+
+
+def _as_float(values) -> np.ndarray:
+    # None -> NaN so that missing inputs flow through the arithmetic
+    return np.asarray(pd.to_numeric(pd.Series(values), errors="coerce"), dtype=np.float64)
+
+
+def discount_rates(tickers, case: str = "mid") -> np.ndarray:
+    """Discount rate per ticker for `case`: 30% (mid) / 25% (good) for .IS tickers, 5% otherwise."""
+    if case not in IS_DISC_RATES:
+        raise ValueError(f"case must be one of {tuple(IS_DISC_RATES)}")
+    tickers = np.asarray(tickers, dtype=str)
+    return np.where(np.char.endswith(tickers, ".IS"), IS_DISC_RATES[case], DEFAULT_DISC_RATE)
+
+
+def project(
+    revenue_qtr: ArrayLike,
+    shares_outstanding: ArrayLike,
+    expected_rev_cagr_5y: ArrayLike,
+    expected_op_margin: ArrayLike,
+    tax_rate: ArrayLike,
+    expected_dilution: ArrayLike,
+    lt_earning_multiple: ArrayLike,
+    disc_rate: ArrayLike = DEFAULT_DISC_RATE,
+    lt_net_debt: ArrayLike = 0.0,
+    interest_rate_debt: ArrayLike = 0.0,
+) -> Dict[str, np.ndarray]:
+    """
+    5-year projection of the valuation model for NumPy-broadcastable inputs.
+
+    Same arithmetic as the Scenarios block of format.xlsx: annualized revenue
+    compounded for 5 years, operating margin, interest on LT net debt, tax,
+    dilution, earning multiple, then discounting back 5 years.
+    NaN inputs give NaN outputs; a zero share count gives NaN instead of inf.
+    """
+    e_revenue = revenue_qtr * 4 * (1 + expected_rev_cagr_5y) ** YEARS
+    e_ebitda = e_revenue * expected_op_margin
+    earning = (e_ebitda - lt_net_debt * interest_rate_debt) * (1 - tax_rate)
+    e_shares = shares_outstanding * (1 + expected_dilution)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eps = np.where(e_shares != 0, earning / np.where(e_shares != 0, e_shares, 1), np.nan)
+
+    price_5y = eps * lt_earning_multiple
+    price_5y_disc = price_5y / (1 + disc_rate) ** YEARS
+
+    return {
+        "e_revenue": e_revenue,
+        "e_ebitda": e_ebitda,
+        "earning": earning,
+        "e_shares": e_shares,
+        "eps": eps,
+        "price_5y": price_5y,
+        "price_5y_disc": price_5y_disc,
+    }
+
+
+def project_scenarios(
+    data: Union[pd.DataFrame, Mapping[str, Any]],
+    scenarios: Sequence[str] = ("mid", "good"),
+) -> pd.DataFrame:
+    """
+    Project every ticker and scenario in one vectorized pass.
+
+    `data` is a DataFrame (or dict of equal-length columns) with:
+      - ticker, revenue_qtr, shares_outstanding
+      - one column per scenario input and scenario, e.g.
+        expected_rev_cagr_5y_mid, expected_rev_cagr_5y_good, ...
+        (lt_net_debt_* and interest_rate_debt_* default to 0)
+      - optional disc_rate_mid, disc_rate_good, otherwise derived from the
+        ticker and the scenario (discount_rates)
+
+    Returns a DataFrame with ticker and one column per projected row and
+    scenario (disc_rate_mid, e_revenue_mid, ..., price_5y_disc_good).
+    """
+    frame = data if isinstance(data, pd.DataFrame) else pd.DataFrame(dict(data))
+    n = len(frame)
+
+    def column(name, default=None):
+        if name in frame:
+            return _as_float(frame[name].to_numpy())
+        if default is None:
+            raise KeyError(f"Missing input column '{name}'")
+        return np.full(n, default, dtype=np.float64)
+
+    revenue_qtr = column("revenue_qtr")
+    shares_outstanding = column("shares_outstanding")
+
+    out = {"ticker": frame["ticker"].to_numpy()}
+    for scenario in scenarios:
+        if f"disc_rate_{scenario}" in frame:
+            disc_rate = column(f"disc_rate_{scenario}")
+        else:
+            disc_rate = discount_rates(frame["ticker"].to_numpy(), scenario)
+        out[f"disc_rate_{scenario}"] = disc_rate
+        inputs = {
+            key: column(f"{key}_{scenario}", _OPTIONAL_DEFAULTS.get(key))
+            for key in SCENARIO_KEYS
+        }
+        rows = project(revenue_qtr, shares_outstanding, disc_rate=disc_rate, **inputs)
+        for name, values in rows.items():
+            out[f"{name}_{scenario}"] = values
+
+    return pd.DataFrame(out, index=frame.index)
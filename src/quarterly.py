@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from src.lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+# Income statement rows summed over the trailing twelve months
+INCOME_FLOWS = (
+    "Total Revenue",
+    "Cost Of Revenue",
+    "Research And Development",
+    "Selling General And Administrative",
+    "Operating Income",
+)
+
+TTM_QUARTERS = 4
+# First and last period end of four consecutive quarters are ~9 months apart
+_TTM_SPAN_DAYS = (240, 300)
+
+
+def _periods(columns) -> List[pd.Timestamp]:
+    return [pd.Timestamp(c).normalize() for c in columns]
+
+
+@dataclass
+class QuarterlyHistory:
+    """
+    Every quarter of one statement seen so far, in the yfinance layout
+    (rows: line items, columns: period end dates, newest first).
+
+    yfinance only returns the last ~5 quarters, so merging each fetch into
+    the stored history keeps the older ones. Trailing-twelve-month sums of
+    `flows` are kept up to date as quarters are merged: quarters entering
+    the 4-quarter window are added, quarters leaving it subtracted.
+    """
+    flows: Sequence[str] = ()
+    frame: pd.DataFrame = field(default_factory=lambda: pd.DataFrame())
+    ttm: Dict[str, float] = field(default_factory=dict)
+    checked: float = 0.0   # time.time() of the last fetch merged in
+
+    @property
+    def periods(self) -> List[pd.Timestamp]:
+        return list(self.frame.columns)
+
+    @property
+    def latest(self) -> Optional[pd.Timestamp]:
+        return self.frame.columns[0] if len(self.frame.columns) else None
+
+    def latest_values(self) -> dict:
+        """Line items of the newest quarter ({} when empty)."""
+        if self.frame.empty:
+            return {}
+        return self.frame.iloc[:, 0].to_dict()
+
+    def window(self) -> List[pd.Timestamp]:
+        """The newest 4 quarters when they are consecutive, else []."""
+        periods = self.periods[:TTM_QUARTERS]
+        if len(periods) < TTM_QUARTERS:
+            return []
+        span = (periods[0] - periods[-1]).days
+        return periods if _TTM_SPAN_DAYS[0] <= span <= _TTM_SPAN_DAYS[1] else []
+
+    def merge(self, df: pd.DataFrame) -> List[pd.Timestamp]:
+        """
+        Add the quarters of `df` that are not stored yet and update the TTM
+        sums. Quarters already stored are left as they are. Returns the
+        periods that were added, newest first.
+        """
+        if df is None or df.empty:
+            return []
+        df = df.copy()
+        df.columns = _periods(df.columns)
+        df = df.loc[:, ~df.columns.duplicated()]
+        new = [p for p in df.columns if p not in set(self.frame.columns)]
+        if not new:
+            return []
+
+        before = self.window()
+        frame = pd.concat([self.frame, df[new]], axis=1) if not self.frame.empty else df[new]
+        self.frame = frame[sorted(frame.columns, reverse=True)]
+        self._update_ttm(before, self.window())
+        return sorted(new, reverse=True)
+
+    def _value(self, item: str, period) -> float:
+        if item not in self.frame.index:
+            return math.nan
+        value = pd.to_numeric(self.frame.at[item, period], errors="coerce")
+        return float(value) if pd.notna(value) else math.nan
+
+    def _update_ttm(self, before: List[pd.Timestamp], after: List[pd.Timestamp]):
+        if not after:
+            self.ttm = {}
+            return
+        entering = [p for p in after if p not in before]
+        leaving = [p for p in before if p not in after]
+        for item in self.flows:
+            current = self.ttm.get(item, math.nan)
+            removed = [self._value(item, p) for p in leaving]
+            if before and not math.isnan(current) and not any(math.isnan(v) for v in removed):
+                self.ttm[item] = current + sum(self._value(item, p) for p in entering) - sum(removed)
+            else:
+                # First window, or a missing value leaves it: sum it once
+                self.ttm[item] = sum(self._value(item, p) for p in after)
+
+    def ttm_values(self) -> Dict[str, float]:
+        """TTM sum per flow item (NaN when a quarter lacks it); {} without 4 consecutive quarters."""
+        return dict(self.ttm) if self.window() else {}
@@ -0,0 +1,192 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from src.projection import PROJECTION_ROWS, SCENARIO_KEYS
+
+
+# Column of each scenario case; fundamentals only use "mid" (column B)
+CASE_COLUMNS = {"mid": "B", "good": "C"}
+
+# Keys used in code -> labels in column A of format.xlsx
+FUNDAMENTAL_LABELS = {
+    "ticker": "Ticker",
+    "share_price": "Share Price",
+    "shares_outstanding": "Shares Outstanding",
+    "market_cap": "Market Cap (auto)",
+    "revenue_qtr": "Revenue (Qtr)",
+    "cogs": "COGS",
+    "gross_profit": "Gross Profit",
+    "gross_margin": "Gross Margin",
+    "opex": "OPEX",
+    "operating_profit": "Operating Profit",
+    "operating_margin": "Operating Margin",
+    "ebitda_ps": "EBITDA PS",
+    "cash": "Cash",
+    "debt": "Debt",
+    "net_cash": "Net Cash (auto)",
+}
+
+SCENARIO_LABELS = {
+    "expected_rev_cagr_5y": "Expected Revenue CAGR (5y)",
+    "expected_op_margin": "E Operated Margin",
+    "expected_dilution": "E Dilution (5yr)",
+    "lt_net_debt": "LT Net Debt",
+    "interest_rate_debt": "Interest Rate on Debt",
+    "tax_rate": "Tax Rate",
+    "lt_earning_multiple": "LT Earning Multiple",
+}
+
+# fetch_all_data keys, written to column B of the row with the same label
+INPUT_LABELS = (
+    "Share Price",
+    "Shares Outstanding",
+    "Revenue (Qtr)",
+    "COGS",
+    "OPEX",
+    "Operating Profit",
+    "Cash",
+    "Debt",
+)
+
+DISC_RATE_LABEL = "Discounted rate"
+TARGET_LABEL = "Predicted Share Price Disc"
+
+
+def _number(value) -> Optional[float]:
+    # Excel errors, text and empty cells -> None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+@dataclass
+class ValuationRecord:
+    """Calculated valuation of one ticker, read from the sheet through its schema."""
+    ticker: str
+    share_price: Optional[float]
+    mid_target: Optional[float]
+    good_target: Optional[float]
+    mid_disc_rate: Optional[float]
+    good_disc_rate: Optional[float]
+    fundamentals: Dict[str, Any] = field(default_factory=dict)
+    scenarios: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    projections: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # (label, mid, good) for every row of the Scenarios section, in sheet order
+    scenario_table: List[Tuple[str, Any, Any]] = field(default_factory=list)
+
+    def predictions(self) -> Dict[str, str]:
+        """The {"ticker", "current_price", "lower_prediction", "upper_prediction"} dict."""
+        def fmt(x):
+            return "N/A" if x is None else f"{x:.2f}"
+
+        return {
+            "ticker": self.ticker,
+            "current_price": fmt(self.share_price),
+            "lower_prediction": fmt(self.mid_target),
+            "upper_prediction": fmt(self.good_target),
+        }
+
+    def as_row(self) -> Dict[str, Any]:
+        """Flat {column: value} for tabular output; non-numeric cells become None."""
+        row = {
+            "ticker": self.ticker,
+            "share_price": self.share_price,
+            "mid_target": self.mid_target,
+            "good_target": self.good_target,
+            "disc_rate_mid": self.mid_disc_rate,
+            "disc_rate_good": self.good_disc_rate,
+        }
+        for key, value in self.fundamentals.items():
+            if key not in row:
+                row[key] = _number(value)
+        for group in (self.scenarios, self.projections):
+            for key, cases in group.items():
+                for case, value in cases.items():
+                    row[f"{key}_{case}"] = _number(value)
+        return row
+
+
+@dataclass(frozen=True)
+class SheetSchema:
+    """
+    Label -> row index of a valuation sheet, built once from column A of the
+    template. Every read and write of a labelled cell goes through cell(),
+    so no module depends on row numbers or scans the sheet.
+    """
+    rows: Dict[str, int]
+
+    @classmethod
+    def from_worksheet(cls, ws) -> "SheetSchema":
+        rows = {}
+        for r, (label,) in enumerate(ws.iter_rows(min_col=1, max_col=1, values_only=True), start=1):
+            if label is None or str(label).strip() == "":
+                continue
+            rows.setdefault(str(label).strip(), r)
+
+        required = ["Ticker", TARGET_LABEL, DISC_RATE_LABEL, *FUNDAMENTAL_LABELS.values(),
+                    *SCENARIO_LABELS.values(), *PROJECTION_ROWS]
+        missing = [label for label in required if label not in rows]
+        if missing:
+            raise ValueError(f"Template is missing rows: {', '.join(missing)}")
+        return cls(rows)
+
+    def cell(self, label: str, case: str = "mid") -> str:
+        try:
+            row = self.rows[label]
+        except KeyError:
+            raise ValueError(f"Label '{label}' not found in the template")
+        return f"{CASE_COLUMNS[case]}{row}"
+
+    def get(self, values: Mapping[str, Any], label: str, case: str = "mid") -> Any:
+        return values.get(self.cell(label, case))
+
+    def scenario_inputs(self, scenario_json: Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        Cells for the scenario inputs of an LLM answer: {coordinate: value},
+        good defaults to mid. Keys that are not {mid, good} mappings and
+        None values are skipped, so those cells keep the template's value.
+        """
+        inputs = {}
+        for key, label in SCENARIO_LABELS.items():
+            cases = scenario_json.get(key)
+            if not isinstance(cases, Mapping):
+                continue
+            mid = cases.get("mid")
+            good = cases.get("good")
+            if mid is not None:
+                inputs[self.cell(label, "mid")] = mid
+            if good is not None or mid is not None:
+                inputs[self.cell(label, "good")] = mid if good is None else good
+        return inputs
+
+    def scenario_labels(self) -> List[str]:
+        """Labels of the Scenarios section (first scenario input to the target row)."""
+        first = min(self.rows[label] for label in SCENARIO_LABELS.values())
+        last = self.rows[TARGET_LABEL]
+        return [label for label, row in sorted(self.rows.items(), key=lambda kv: kv[1])
+                if first <= row <= last]
+
+    def coordinates(self) -> List[str]:
+        """Every cell the schema can read: column B of each label, column C of the Scenarios section."""
+        return ([self.cell(label) for label in self.rows]
+                + [self.cell(label, "good") for label in self.scenario_labels()])
+
+    def record(self, values: Mapping[str, Any]) -> ValuationRecord:
+        def both(label):
+            return {"mid": self.get(values, label), "good": self.get(values, label, "good")}
+
+        return ValuationRecord(
+            ticker=self.get(values, "Ticker"),
+            share_price=_number(self.get(values, "Share Price")),
+            mid_target=_number(self.get(values, TARGET_LABEL)),
+            good_target=_number(self.get(values, TARGET_LABEL, "good")),
+            mid_disc_rate=_number(self.get(values, DISC_RATE_LABEL)),
+            good_disc_rate=_number(self.get(values, DISC_RATE_LABEL, "good")),
+            fundamentals={key: self.get(values, label) for key, label in FUNDAMENTAL_LABELS.items()},
+            scenarios={key: both(SCENARIO_LABELS[key]) for key in SCENARIO_KEYS},
+            projections={key: both(label) for label, key in PROJECTION_ROWS.items()},
+            scenario_table=[
+                (label, self.get(values, label), self.get(values, label, "good"))
+                for label in self.scenario_labels()
+            ],
+        )
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.lazy_imports import lazy_import
+from src.projection import SCENARIO_KEYS, _OPTIONAL_DEFAULTS, discount_rates, project
+from src.schema import SCENARIO_LABELS  # readable names for charts and tables
+
+pd = lazy_import("pandas")
+
+
+def _as_number(value) -> float:
+    # None, text and Excel errors -> NaN
+    if isinstance(value, bool) or not isinstance(value, (int, float, np.number)):
+        return np.nan
+    return float(value)
+
+
+def _input_value(key: str, value) -> float:
+    """A scenario value as a float; missing -> NaN, or 0 for the debt inputs that can be left out."""
+    value = _as_number(value)
+    return _OPTIONAL_DEFAULTS.get(key, np.nan) if np.isnan(value) else value
+
+
+def base_inputs(
+    fundamentals: Mapping[str, Any],
+    scenarios: Mapping[str, Any],
+    case: str = "mid",
+) -> Dict[str, float]:
+    """
+    Keyword arguments for projection.project() for one ticker and case.
+    `fundamentals` as in load_valuation_excel, `scenarios` as SCENARIO_JSON.
+    The discount rate is the template's for `case`, so the projected price
+    is that case's target.
+    """
+    inputs = {
+        "revenue_qtr": float(fundamentals["revenue_qtr"]),
+        "shares_outstanding": float(fundamentals["shares_outstanding"]),
+        "disc_rate": float(discount_rates([fundamentals.get("ticker") or ""], case)[0]),
+    }
+    for key in SCENARIO_KEYS:
+        entry = scenarios.get(key) or {}
+        value = entry.get(case)
+        inputs[key] = _input_value(key, entry.get("mid") if value is None else value)
+    return inputs
+
+
+def default_range(key: str, mid: float, good: Optional[float] = None,
+                  spread: float = 1.5, n: int = 50) -> np.ndarray:
+    """
+    `n` evenly spaced values around the mid case: mid +/- spread * |good - mid|,
+    or +/- 20% of mid when the two cases agree or good is missing. Missing
+    values are read as in base_inputs; a mid that is still not a number
+    raises ValueError.
+    """
+    mid, good = _input_value(key, mid), _as_number(good)
+    if not np.isfinite(mid):
+        raise ValueError(f"No mid value for {key}")
+    good = good if np.isfinite(good) else mid
+    width = spread * abs(good - mid) or 0.2 * abs(mid) or 0.1
+    low, high = mid - width, mid + width
+    if key in ("tax_rate", "expected_op_margin"):
+        low, high = max(low, 0.0), min(high, 1.0)
+    if key == "lt_earning_multiple":
+        low = max(low, 0.0)
+    return np.linspace(low, high, n)
+
+
+def sensitivity_grid(
+    base: Mapping[str, float],
+    axes: Mapping[str, Sequence[float]],
+    output: str = "price_5y_disc",
+) -> np.ndarray:
+    """
+    Evaluate the projection on the full cartesian grid of `axes`
+    ({input: values}) with one NumPy broadcast. Every axis gets its own
+    dimension in the order given, other inputs stay at `base`.
+
+    Returns an array of shape (len(axis_1), len(axis_2), ...).
+    """
+    inputs = dict(base)
+    ndim = len(axes)
+    for dim, (key, values) in enumerate(axes.items()):
+        shape = [1] * ndim
+        shape[dim] = -1
+        inputs[key] = np.asarray(values, dtype=np.float64).reshape(shape)
+
+    result = project(**inputs)[output]
+    shape = tuple(len(v) for v in axes.values())
+    return np.broadcast_to(result, shape)
+
+
+def grid_frame(
+    base: Mapping[str, float],
+    row_key: str,
+    row_values: Sequence[float],
+    col_key: str,
+    col_values: Sequence[float],
+    output: str = "price_5y_disc",
+) -> pd.DataFrame:
+    """2-D sensitivity grid as a DataFrame (rows = row_key values, columns = col_key values)."""
+    grid = sensitivity_grid(base, {row_key: row_values, col_key: col_values}, output)
+    return pd.DataFrame(
+        grid,
+        index=pd.Index(row_values, name=row_key),
+        columns=pd.Index(col_values, name=col_key),
+    )
+
+
+def tornado(
+    base: Mapping[str, float],
+    ranges: Mapping[str, Tuple[float, float]],
+    output: str = "price_5y_disc",
+) -> pd.DataFrame:
+    """
+    One-at-a-time sensitivity: move each input to its (low, high) value while
+    the others stay at `base`. All 2k + 1 cases are stacked into one
+    vectorized projection call.
+
+    Returns one row per input, sorted by swing (largest first).
+    """
+    keys = list(ranges)
+    n = 2 * len(keys) + 1
+    inputs = {k: np.full(n, v, dtype=np.float64) for k, v in base.items()}
+    for i, key in enumerate(keys):
+        low, high = ranges[key]
+        inputs[key][2 * i + 1] = low
+        inputs[key][2 * i + 2] = high
+
+    values = project(**inputs)[output]
+    base_value = values[0]
+    frame = pd.DataFrame({
+        "input": keys,
+        "label": [SCENARIO_LABELS.get(k, k) for k in keys],
+        "low": [ranges[k][0] for k in keys],
+        "high": [ranges[k][1] for k in keys],
+        "base_value": base_value,
+        "value_low": values[1::2],
+        "value_high": values[2::2],
+    })
+    frame["delta_low"] = frame["value_low"] - base_value
+    frame["delta_high"] = frame["value_high"] - base_value
+    frame["swing"] = (frame["delta_high"] - frame["delta_low"]).abs()
+    return frame.sort_values("swing", ascending=False, ignore_index=True)
+
+
+def default_tornado_ranges(
+    scenarios: Mapping[str, Any],
+    base: Mapping[str, float],
+) -> Dict[str, Tuple[float, float]]:
+    """
+    (low, high) per scenario input present in `scenarios` with a base
+    value: the base value +/- the mid/good gap, or +/- 10% of it when both
+    cases are equal or good is missing.
+    """
+    ranges = {}
+    for key in SCENARIO_KEYS:
+        mid = base[key]
+        if key not in scenarios or not np.isfinite(mid):
+            continue
+        entry = scenarios[key] or {}
+        good = _as_number(entry.get("good"))
+        gap = abs(good - mid) if np.isfinite(good) else 0.0
+        gap = gap or 0.1 * abs(mid)
+        ranges[key] = (mid - gap, mid + gap)
+    return ranges
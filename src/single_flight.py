@@ -0,0 +1,121 @@
+import contextvars
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _StreamCall:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+
+    def reader(self) -> Iterator[Any]:
+        i = 0
+        while True:
+            with self.cond:
+                while i >= len(self.chunks) and not self.finished:
+                    self.cond.wait()
+                new, finished = self.chunks[i:], self.finished
+            i += len(new)
+            yield from new
+            if finished and i >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution: the first
+    caller runs `fn`, the others wait for it and get the same result (or
+    exception). Once the call returns, the next one with that key runs
+    again, so this only merges work that is in flight, it does not cache.
+
+        fetches = SingleFlight()
+        data = fetches.do(("PANW", "YF"), fetch, "PANW")
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, _StreamCall] = {}
+        self._executed = 0
+        self._shared = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._executed += 1
+            else:
+                self._shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stream(self, key: Hashable, fn: Callable[..., Iterator[Any]], *args, **kwargs) -> Iterator[Any]:
+        """
+        Streaming counterpart of do(): `fn(*args, **kwargs)` is iterated once
+        on a background thread and every caller with the same key reads the
+        same chunks from the start, as they arrive. The producer runs to the
+        end even when all readers stop early.
+        """
+        with self._lock:
+            call = self._streams.get(key)
+            if call is None:
+                call = self._streams[key] = _StreamCall()
+                self._executed += 1
+                ctx = contextvars.copy_context()   # keeps the caller's trace span as parent
+                threading.Thread(target=ctx.run, args=(self._produce, key, call, fn, args, kwargs),
+                                 name=f"single-flight-{key}", daemon=True).start()
+            else:
+                self._shared += 1
+        return call.reader()
+
+    def _produce(self, key, call: _StreamCall, fn, args, kwargs):
+        try:
+            for chunk in fn(*args, **kwargs):
+                with call.cond:
+                    call.chunks.append(chunk)
+                    call.cond.notify_all()
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._streams[key]
+            with call.cond:
+                call.finished = True
+                call.cond.notify_all()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._streams)
+
+    def stats(self) -> Dict[str, int]:
+        """executed: calls that did the work, shared: calls that joined one in flight."""
+        with self._lock:
+            return {"executed": self._executed, "shared": self._shared}
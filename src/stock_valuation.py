@@ -1,80 +1,154 @@
-from openpyxl import load_workbook
-from src.fin_data_yf import YFinanceDataFetcher
+from src.artifacts import save_workbook, unique_path
+from src.fin_data_yf import YFinanceDataFetcher, fundamentals_cache
+from src.formula_engine import save_workbook_with_values
+from src.lazy_imports import lazy_import, require
+from src.local_data import LocalDataFetcher
+from src.schema import INPUT_LABELS, SheetSchema
+from src.template_cache import get_schema, get_template
+from src.tracing import span, traced
 import os
-import pandas as pd
-import numpy as np
-import xlwings as xw
 
+openpyxl = lazy_import("openpyxl")
 
-def value_stock(ticker: str, save_file:bool = True, 
-                   template_path: str ="./data/format.xlsx", 
-                   output_dir: str = "./data/valuations",
-                   api_source: str ="YF"):
-    
 
-    if api_source == "YF":
-        fetcher = YFinanceDataFetcher(ticker)
-    else:
-        raise ValueError("api_source must be 'YF")
-    
-    data = fetcher.fetch_all_data()
-    
-    wb = load_workbook(template_path)
-    ws = wb.active
-    ws['B3'] = ticker
-    # Map data to Excel rows (Column C = values)
-    row_mapping = {
-        4: 'Share Price',
-        5: 'Shares Outstanding',
-        7: 'Revenue (Qtr)',
-        8: 'COGS',
-        12: 'OPEX',
-        13: 'Operating Profit',
-        17: 'Cash',
-        18: 'Debt',
-    }
-    
-    for row, key in row_mapping.items():
-        if key in data:
-            ws[f'B{row}'] = data[key]
-    
-        
-    # Save as {ticker}.xlsx in data/valuation
-    if save_file:
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, f"{ticker}.xlsx")
-        wb.save(output_path)
-        print(f"Saved to {output_path}")
+def predictions_from_values(ticker: str, values: dict, schema: SheetSchema = None) -> dict:
+    """Build the predictions dict from calculated cell values ({coordinate: value})."""
+    schema = schema or get_schema()
+    predictions = schema.record(values).predictions()
+    predictions["ticker"] = ticker
+    return predictions
 
-    else:
-        # Save to temp location to calculate formulas
-        output_path = "./data/valuations/temp_calc.xlsx"
-        os.makedirs("./data/valuations", exist_ok=True)
-        wb.save(output_path)
-      
+
+@traced("excel.recalc")
+def recalculate_with_excel(output_path: str, schema: SheetSchema = None) -> dict:
+    """
+    Open the saved workbook in a hidden Excel instance so it stores
+    calculated values, then read the labelled cells back. Needs a local
+    Excel install.
+    """
+    xw = require("xlwings")
     try:
         app = xw.App(visible=False)
         book = app.books.open(os.path.abspath(output_path))
         book.save()
         app.quit()
-    
+
     except Exception as e:
-        print(f"Warning: xlwings failed: {e}")    
-    
-    # Read with pandas to read formula values
-    df_pred = pd.read_excel(output_path, header=None)
+        print(f"Warning: xlwings failed: {e}")
+
+    # data_only=True reads the values Excel stored for the formulas
+    schema = schema or get_schema()
+    ws = openpyxl.load_workbook(output_path, data_only=True).active
+    return {coord: ws[coord].value for coord in schema.coordinates()}
+
+
+def valuation_inputs(ticker: str, data: dict, schema: SheetSchema = None) -> dict:
+    """Cells to patch into the template: {coordinate: value}."""
+    schema = schema or get_schema()
+    inputs = {schema.cell('Ticker'): ticker}
+    for label in INPUT_LABELS:
+        if label in data:
+            inputs[schema.cell(label)] = data[label]
+    return inputs
+
+
+@traced("workbook.build", "ticker")
+def build_valuation_workbook(ticker: str, data: dict, template_path: str = "./data/format.xlsx"):
+    """Template workbook with the ticker and fetched fundamentals filled in (not recalculated)."""
+    # Cloned from the template parsed once per process, see template_cache
+    template = get_template(template_path)
+    wb = template.clone()
+    ws = wb.active
+    for coord, value in valuation_inputs(ticker, data, template.schema).items():
+        ws[coord] = value
+    return wb
+
+
+API_SOURCES = ("YF", "LOCAL")
+
+
+def data_fetcher(ticker: str, api_source: str = "YF", use_cache: bool = True):
+    """
+    Fetcher of `api_source`: "YF" fetches from Yahoo Finance, "LOCAL" reads
+    the fundamentals snapshot (src/local_data.py, no network).
+    """
+    if api_source == "YF":
+        return YFinanceDataFetcher(ticker, cache=fundamentals_cache() if use_cache else None)
+    if api_source == "LOCAL":
+        return LocalDataFetcher(ticker)
+    raise ValueError(f"api_source must be one of {API_SOURCES}")
+
+
+@traced("value_stock", "ticker", "recalc")
+def value_stock(ticker: str, save_file:bool = True, 
+                   template_path: str ="./data/format.xlsx", 
+                   output_dir: str = "./data/valuations",
+                   api_source: str ="YF",
+                   recalc: str = "python",
+                   use_cache: bool = True,
+                   history: bool = False,
+                   output_path: str = None):
+    """
+    recalc="python" evaluates the template formulas in-process (no Excel needed),
+    recalc="excel" recalculates through xlwings.
+    use_cache=True serves statements and recent quotes from data/cache.
+    history=True appends the result to the valuation history (data/history); off by default.
+    With save_file, the workbook is written to `output_path`, or to a new
+    {ticker}-{random}.xlsx in `output_dir` so concurrent runs never share a file.
+    """
+
+    fetcher = data_fetcher(ticker, api_source, use_cache)
+
+    if recalc not in ("python", "excel"):
+        raise ValueError("recalc must be 'python' or 'excel'")
     
+    data = fetcher.fetch_all_data()
 
-    predictions = {
-        "ticker": ticker,
-        "current_price": f"{df_pred.iloc[3, 1]:.2f}",      # Row 4, Column B (index 3, 1)
-        "lower_prediction": f"{df_pred.iloc[37, 1]:.2f}",  # Row 38, Column B (index 37, 1)
-        "upper_prediction": f"{df_pred.iloc[37, 2]:.2f}"   # Row 38, Column C (index 37, 2)
-    }
+    if recalc == "python":
+        # Only the input cells differ from the template: reuse its compiled formulas
+        template = get_template(template_path)
+        values = template.calculate(valuation_inputs(ticker, data, template.schema))
 
+        # Save as {ticker}-{random}.xlsx in data/valuation
+        if save_file:
+            wb = build_valuation_workbook(ticker, data, template_path)
+            output_path = output_path or unique_path(output_dir, ticker)
+            with span("workbook.save", ticker=ticker):
+                save_workbook_with_values(wb, output_path, values)
+            print(f"Saved to {output_path}")
 
-    return predictions
+        if history:
+            from src.history_store import record_history
+            record_history([template.schema.record(values).as_row()], "value_stock")
+        return predictions_from_values(ticker, values, template.schema)
+
+    wb = build_valuation_workbook(ticker, data, template_path)
+
+    # Save as {ticker}-{random}.xlsx in data/valuation
+    if save_file:
+        output_path = output_path or unique_path(output_dir, ticker)
+        save_workbook(wb, output_path)
+        print(f"Saved to {output_path}")
+
+    else:
+        # Excel only calculates saved files: use a temp file of this run only
+        output_path = unique_path(output_dir, f"{ticker}-calc")
+        save_workbook(wb, output_path)
+
+    schema = get_schema(template_path)
+    try:
+        values = recalculate_with_excel(output_path, schema)
+    finally:
+        if not save_file:
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+    if history:
+        from src.history_store import record_history
+        record_history([schema.record(values).as_row()], "value_stock")
+    return predictions_from_values(ticker, values, schema)
 
 
 if __name__ == "__main__":
-    value_stock("GOOGL", "data/format.xlsx")
\ No newline at end of file
+    value_stock("GOOGL", "data/format.xlsx")
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import pickle
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.formula_engine import FormulaEngine
+from src.lazy_imports import lazy_import
+from src.schema import SheetSchema
+from src.tracing import span
+
+openpyxl = lazy_import("openpyxl")
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_TEMPLATE = str(BASE_DIR / "data" / "format.xlsx")
+
+
+@dataclass
+class TemplateModel:
+    """
+    A template workbook parsed once: the pickled openpyxl workbook to clone
+    from, the compiled formula engine of its active sheet and its label index.
+    """
+    path: str
+    mtime_ns: int
+    size: int
+    digest: str
+    engine: FormulaEngine
+    schema: SheetSchema
+    _blob: bytes = field(repr=False)
+
+    def clone(self):
+        """
+        Independent copy of the parsed workbook. Unpickling skips the XML
+        parsing and style resolution of load_workbook (about 5x faster).
+        """
+        return pickle.loads(self._blob)
+
+    def calculate(self, inputs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Cell values of the template with `inputs` ({coordinate: value}) patched in."""
+        with span("template.calculate"):
+            return self.engine.calculate(inputs)
+
+
+_templates: Dict[str, TemplateModel] = {}
+_lock = threading.Lock()
+
+
+def _digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _parse(path: str, stat, digest: str) -> TemplateModel:
+    wb = openpyxl.load_workbook(path)
+    return TemplateModel(
+        path=path,
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        digest=digest,
+        engine=FormulaEngine.from_worksheet(wb.active),
+        schema=SheetSchema.from_worksheet(wb.active),
+        _blob=pickle.dumps(wb, protocol=pickle.HIGHEST_PROTOCOL),
+    )
+
+
+def get_template(template_path: str = DEFAULT_TEMPLATE) -> TemplateModel:
+    """
+    Parsed template for `template_path`, cached per process.
+
+    The file is only re-read when its mtime or size changed, and only
+    re-parsed when its SHA-256 changed too (a touched but identical file
+    keeps the cached model).
+    """
+    path = os.path.abspath(template_path)
+    stat = os.stat(path)
+    with _lock:
+        model = _templates.get(path)
+        if model is not None and (model.mtime_ns, model.size) == (stat.st_mtime_ns, stat.st_size):
+            return model
+
+        digest = _digest(path)
+        if model is not None and model.digest == digest:
+            model.mtime_ns, model.size = stat.st_mtime_ns, stat.st_size
+            return model
+
+        with span("template.parse"):
+            model = _parse(path, stat, digest)
+        _templates[path] = model
+        return model
+
+
+def get_schema(template_path: str = DEFAULT_TEMPLATE) -> SheetSchema:
+    """Label index of a template, refreshed together with its parsed model."""
+    return get_template(template_path).schema
+
+
+def clear_templates():
+    with _lock:
+        _templates.clear()
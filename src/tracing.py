@@ -0,0 +1,407 @@
+"""
+Lightweight tracing of the valuation stages.
+
+    from src.tracing import span
+    with span("yf.info", ticker=ticker):
+        ...
+
+Tracing is off by default, and span() then returns a shared no-op object.
+It is turned on with enable() or the VALUATION_TRACE environment variable
+("1", or a .jsonl path to append spans to); VALUATION_METRICS_PORT also
+serves the metrics over HTTP. Finished spans are:
+
+- kept in a ring buffer (recent_spans(), export_jsonl()),
+- appended as JSON lines to the configured file,
+- aggregated per stage into Prometheus histograms (prometheus_text(),
+  serve_metrics() for a /metrics endpoint).
+
+profile() adds an opt-in cProfile + tracemalloc capture of a whole run;
+only runs slower than a threshold are written to data/traces/profiles/.
+"""
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+TRACE_DIR = BASE_DIR / "data" / "traces"
+
+# Histogram buckets (seconds): cache hits to slow LLM answers
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Span attributes that become metric labels (ticker would be unbounded)
+METRIC_LABELS = ("provider",)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("valuation_span", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """One timed stage; nested spans share the trace id of the outermost one."""
+
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "start", "duration", "error",
+                 "_t0", "_token")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.error = None
+        self.duration = 0.0
+
+    def __enter__(self):
+        parent = _current.get()
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.span_id = uuid.uuid4().hex[:8]
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._t0
+        # A generator closed by its consumer (GeneratorExit) stopped early, it did not fail
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.error = f"{exc_type.__name__}: {exc}"
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Exited in another context (a generator closed elsewhere)
+            pass
+        _tracer.finish(self)
+        return False
+
+    def set(self, **attrs):
+        """Add attributes known only inside the stage (cache hit, row count, ...)."""
+        self.attrs.update(attrs)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            "attrs": self.attrs,
+        }
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count", "errors")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, seconds: float, failed: bool):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+        self.sum += seconds
+        self.count += 1
+        self.errors += failed
+
+
+class _Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.jsonl_path: Optional[str] = None
+        self.spans: deque = deque(maxlen=10000)
+        self.metrics: Dict[tuple, _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def finish(self, s: Span):
+        record = s.as_dict()
+        labels = (s.name,) + tuple(str(s.attrs.get(k, "")) for k in METRIC_LABELS)
+        with self._lock:
+            self.spans.append(record)
+            hist = self.metrics.get(labels)
+            if hist is None:
+                hist = self.metrics[labels] = _Histogram()
+            hist.observe(s.duration, s.error is not None)
+            if self.jsonl_path:
+                try:
+                    with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record, default=str) + "\n")
+                except OSError as e:
+                    print(f"Warning: could not write trace to {self.jsonl_path}: {e}")
+                    self.jsonl_path = None
+
+
+_tracer = _Tracer()
+
+
+def span(name: str, **attrs):
+    """Context manager timing one stage; a no-op unless tracing is enabled."""
+    if not _tracer.enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def traced(name: str, *arg_names: str):
+    """
+    Decorator form of span(); the listed arguments of the call (e.g.
+    "ticker") become span attributes. Not for generators.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return fn(*args, **kwargs)
+            bound = signature.bind_partial(*args, **kwargs)
+            bound.apply_defaults()
+            with Span(name, {a: bound.arguments.get(a) for a in arg_names}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    """Innermost open span, for adding attributes (no-op object when there is none)."""
+    return _current.get() or _NOOP
+
+
+def enable(jsonl_path: Optional[str] = None, buffer: int = 10000):
+    """Start recording spans; with `jsonl_path` every finished span is appended there."""
+    with _tracer._lock:
+        _tracer.enabled = True
+        if _tracer.spans.maxlen != buffer:
+            _tracer.spans = deque(_tracer.spans, maxlen=buffer)
+        if jsonl_path:
+            os.makedirs(os.path.dirname(os.path.abspath(jsonl_path)), exist_ok=True)
+        _tracer.jsonl_path = jsonl_path
+
+
+def disable():
+    _tracer.enabled = False
+
+
+def is_enabled() -> bool:
+    return _tracer.enabled
+
+
+def reset():
+    """Drop the buffered spans and metrics."""
+    with _tracer._lock:
+        _tracer.spans.clear()
+        _tracer.metrics.clear()
+
+
+def recent_spans(trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    with _tracer._lock:
+        spans = list(_tracer.spans)
+    return [s for s in spans if trace_id is None or s["trace_id"] == trace_id]
+
+
+def export_jsonl(path: str, trace_id: Optional[str] = None) -> int:
+    """Write the buffered spans (optionally of one trace) as JSON lines. Returns the count."""
+    spans = recent_spans(trace_id)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for s in spans:
+            f.write(json.dumps(s, default=str) + "\n")
+    return len(spans)
+
+
+def _label_text(labels: tuple) -> str:
+    names = ("stage",) + METRIC_LABELS
+    return ",".join(f'{k}="{v}"' for k, v in zip(names, labels) if v != "")
+
+
+def prometheus_text() -> str:
+    """Stage histograms and error counters in the Prometheus text format."""
+    with _tracer._lock:
+        metrics = sorted(_tracer.metrics.items())
+        snapshot = [(labels, list(h.counts), h.sum, h.count, h.errors) for labels, h in metrics]
+
+    lines = [
+        "# HELP valuation_stage_seconds Duration of valuation pipeline stages.",
+        "# TYPE valuation_stage_seconds histogram",
+    ]
+    for labels, counts, total, count, _ in snapshot:
+        base = _label_text(labels)
+        for bound, n in zip(BUCKETS, counts):
+            lines.append(f'valuation_stage_seconds_bucket{{{base},le="{bound}"}} {n}')
+        lines.append(f'valuation_stage_seconds_bucket{{{base},le="+Inf"}} {count}')
+        lines.append(f"valuation_stage_seconds_sum{{{base}}} {total:.6f}")
+        lines.append(f"valuation_stage_seconds_count{{{base}}} {count}")
+    lines += [
+        "# HELP valuation_stage_errors_total Stages that raised an exception.",
+        "# TYPE valuation_stage_errors_total counter",
+    ]
+    for labels, _, _, _, errors in snapshot:
+        lines.append(f"valuation_stage_errors_total{{{_label_text(labels)}}} {errors}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics"):
+            body, ctype = prometheus_text(), "text/plain; version=0.0.4"
+        elif self.path.startswith("/spans"):
+            body = "".join(json.dumps(s, default=str) + "\n" for s in recent_spans())
+            ctype = "application/x-ndjson"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus) and /spans (JSON lines) from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="valuation-metrics").start()
+    return server
+
+
+# ---------- Profiling ----------
+
+class _Profiler:
+    def __init__(self):
+        self.slow_s: Optional[float] = None   # None = off
+        self.directory = str(TRACE_DIR / "profiles")
+        self.top = 30
+        self._busy = threading.Lock()
+
+
+_profiler = _Profiler()
+
+
+def enable_profiling(slow_s: float = 5.0, directory: Optional[str] = None, top: int = 30):
+    """Capture cProfile + tracemalloc for profile() blocks; keep the runs slower than `slow_s` seconds."""
+    _profiler.slow_s = slow_s
+    _profiler.top = top
+    if directory:
+        _profiler.directory = directory
+
+
+def disable_profiling():
+    _profiler.slow_s = None
+
+
+class _Profile:
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.path: Optional[str] = None
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._profile = cProfile.Profile()
+        try:
+            self._profile.enable()
+        except ValueError:
+            # Another profiler (a debugger, an outer cProfile) is active
+            self._profile = None
+        return self
+
+    def __exit__(self, *exc):
+        if self._profile is None:
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            _profiler._busy.release()
+            return False
+        self._profile.disable()
+        elapsed = time.perf_counter() - self._t0
+        try:
+            if elapsed >= _profiler.slow_s:
+                self.path = self._write(elapsed, tracemalloc.take_snapshot())
+        finally:
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            _profiler._busy.release()
+        return False
+
+    def _write(self, elapsed: float, snapshot) -> str:
+        os.makedirs(_profiler.directory, exist_ok=True)
+        tag = "-".join(re.sub(r"[^A-Za-z0-9_.]", "_", str(v)) for v in (self.name, *self.attrs.values()))
+        base = os.path.join(_profiler.directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{tag}")
+        self._profile.dump_stats(base + ".prof")
+
+        out = io.StringIO()
+        out.write(f"{self.name} {self.attrs} took {elapsed:.3f}s\n\n")
+        pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(_profiler.top)
+        out.write("\nTop allocations (tracemalloc):\n")
+        for stat in snapshot.statistics("lineno")[:_profiler.top]:
+            out.write(f"{stat}\n")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        return base + ".prof"
+
+
+def profile(name: str, **attrs):
+    """
+    cProfile + tracemalloc capture of a whole run when profiling is enabled
+    (enable_profiling() or VALUATION_PROFILE=<seconds>). A run slower than
+    the threshold is written as <name>.prof and a readable .txt summary.
+    One run is captured at a time; concurrent ones are not profiled.
+    """
+    if _profiler.slow_s is None or not _profiler._busy.acquire(blocking=False):
+        return _NOOP
+    return _Profile(name, attrs)
+
+
+def _configure_from_env():
+    value = os.environ.get("VALUATION_TRACE", "").strip()
+    if value and value.lower() not in ("0", "false", "no"):
+        enable(jsonl_path=None if value.lower() in ("1", "true", "yes") else value)
+    port = os.environ.get("VALUATION_METRICS_PORT", "").strip()
+    if port:
+        try:
+            serve_metrics(int(port))
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not serve metrics on port '{port}': {e}")
+    slow = os.environ.get("VALUATION_PROFILE", "").strip()
+    if slow:
+        try:
+            enable_profiling(float(slow))
+        except ValueError:
+            print(f"Warning: VALUATION_PROFILE must be a number of seconds, got '{slow}'")
+
+
+_configure_from_env()
@@ -0,0 +1,118 @@
+import io
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from src.artifacts import atomic_write
+from src.formula_engine import FormulaEngine, LiveSheet, recalculate_worksheet, save_workbook_with_values
+from src.llm_valuation_summary import apply_llm_result, context_from_values
+from src.schema import SheetSchema, ValuationRecord
+from src.single_flight import SingleFlight
+from src.stock_valuation import build_valuation_workbook, data_fetcher, valuation_inputs
+from src.template_cache import get_template
+from src.tracing import traced
+
+# Concurrent sessions analysing the same ticker share one fetch + calculation
+_valuations = SingleFlight()
+
+
+@dataclass
+class ValuationResult:
+    """
+    One analysis kept in memory: the filled-in workbook, its calculated
+    values and everything the UI shows. Nothing touches the disk unless
+    save() is called.
+    """
+    ticker: str
+    workbook: Any
+    schema: SheetSchema
+    values: Dict[str, Any]
+    context: Dict[str, Any]
+    report_text: str = ""
+    scenario_json: Optional[Dict[str, Any]] = None
+    _bytes: Optional[bytes] = field(default=None, repr=False)
+
+    @property
+    def worksheet(self):
+        # build_valuation_workbook fills the active sheet (stock_val)
+        return self.workbook.active
+
+    @property
+    def record(self) -> ValuationRecord:
+        """Typed view of the calculated sheet (targets, fundamentals, scenarios)."""
+        return self.schema.record(self.values)
+
+    @property
+    def predictions(self) -> Dict[str, str]:
+        predictions = self.record.predictions()
+        predictions["ticker"] = self.ticker
+        return predictions
+
+    def live_sheet(self) -> LiveSheet:
+        """What-if copy of the calculated sheet: edits recalculate only the cells they affect."""
+        return LiveSheet(FormulaEngine.from_worksheet(self.worksheet), self.values)
+
+    def to_bytes(self) -> bytes:
+        """.xlsx file content with cached formula values, serialized once."""
+        if self._bytes is None:
+            buf = io.BytesIO()
+            save_workbook_with_values(self.workbook, buf, self.values)
+            self._bytes = buf.getvalue()
+        return self._bytes
+
+    def save(self, path: str) -> str:
+        atomic_write(path, self.to_bytes())
+        return path
+
+
+@traced("run_valuation", "ticker", "api_source")
+def run_valuation(
+    ticker: str,
+    template_path: str = "./data/format.xlsx",
+    api_source: str = "YF",
+    use_cache: bool = True,
+    data: Optional[Dict[str, Any]] = None,
+) -> ValuationResult:
+    """
+    In-memory counterpart of value_stock + load_valuation_excel: fetch the
+    fundamentals (unless `data` is given), fill the template and calculate it.
+    Calls for the same ticker in flight at the same time share the fetch and
+    the calculation; each still gets its own workbook to edit.
+    """
+    template = get_template(template_path)
+    if data is None:
+        fetcher = data_fetcher(ticker, api_source, use_cache)
+        key = (ticker, template_path, api_source, use_cache)
+        data, values = _valuations.do(key, _fetch_and_calculate, ticker, template, fetcher)
+    else:
+        values = template.calculate(valuation_inputs(ticker, data, template.schema))
+
+    values = dict(values)
+    wb = build_valuation_workbook(ticker, data, template_path)
+    return ValuationResult(
+        ticker=ticker,
+        workbook=wb,
+        schema=template.schema,
+        values=values,
+        context=context_from_values(values, template.schema),
+    )
+
+
+def _fetch_and_calculate(ticker: str, template, fetcher):
+    data = fetcher.fetch_all_data()
+    return data, template.calculate(valuation_inputs(ticker, data, template.schema))
+
+
+@traced("apply_llm_text")
+def apply_llm_text(result: ValuationResult, llm_text: str, history: bool = False) -> ValuationResult:
+    """
+    In-memory counterpart of write_llm_result_to_excel: write the LLM report
+    and scenarios into the same workbook and recalculate it. history=True
+    appends the result to the valuation history (data/history).
+    """
+    result.report_text, result.scenario_json = apply_llm_result(result.worksheet, llm_text, result.schema)
+    result.values = recalculate_worksheet(result.worksheet)
+    result._bytes = None
+    if history:
+        from src.history_store import record_history
+        record_history([result.record.as_row()], "llm", report_text=llm_text)
+    return result
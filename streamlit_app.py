@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import math
 import os
 import sys
 import time
@@ -9,16 +10,27 @@ sys.path.append(os.getcwd())
 
 # Import your existing functions
 try:
-    from src.stock_valuation import value_stock
-    from src.llm_valuation_summary import (
-        load_valuation_excel, 
-        generate_llm_investment_summary, 
-        write_llm_result_to_excel
+    from src.implied import implied_value
+    from src.jobs import get_job_queue
+    from src.schema import FUNDAMENTAL_LABELS, INPUT_LABELS
+    from src.template_cache import DEFAULT_TEMPLATE, get_template
+    from src.lazy_imports import lazy_import
+    from src.tracing import span
+    from src.sensitivity import (
+        SCENARIO_LABELS,
+        base_inputs,
+        default_range,
+        default_tornado_ranges,
+        grid_frame,
+        tornado,
     )
 except ImportError as e:
     st.error(f"Import Error: {e}. Make sure 'stock_valuation.py' and 'llm_valuation_summary.py' are correctly located in the 'src' directory.")
     st.stop()
 
+# The charts are below the fold; altair is imported when they are drawn
+alt = lazy_import("altair")
+
 # Page Config
 st.set_page_config(page_title="AI Stock Valuation", layout="wide")
 
@@ -117,6 +129,238 @@ def styled_table(df: pd.DataFrame, numeric_cols=None):
     return styler
 
 
+# ---------- HELPER: metrics & live (streaming) view ----------
+FUNDAMENTAL_ROWS = {label: key for key, label in FUNDAMENTAL_LABELS.items() if key != "ticker"}
+
+
+def show_metrics(preds):
+    m1, m2, m3 = st.columns(3)
+    m1.metric(
+        "Current Price", preds.get("current_price", "N/A")
+    )
+    m2.metric("Mid Target", preds.get("lower_prediction", "N/A"))
+    m3.metric("Upper Target", preds.get("upper_prediction", "N/A"))
+
+
+def fundamentals_frame(fundamentals):
+    """Fundamentals table from a load_valuation_excel context."""
+    return pd.DataFrame(
+        [(label, fundamentals.get(key)) for label, key in FUNDAMENTAL_ROWS.items()],
+        columns=["Metric", "Qtr Value (000s)"],
+    )
+
+
+def live_scenario_targets(ticker, fundamentals, scenario_json):
+    """
+    Predictions and Scenarios table of the LLM's scenario JSON, calculated
+    on the cached template (about 0.1 ms) exactly as the final workbook will be.
+    """
+    template = get_template(DEFAULT_TEMPLATE)
+    schema = template.schema
+    inputs = {schema.cell("Ticker"): ticker}
+    for key, label in FUNDAMENTAL_LABELS.items():
+        if label in INPUT_LABELS:
+            inputs[schema.cell(label)] = fundamentals.get(key)
+    inputs.update(schema.scenario_inputs(scenario_json))
+    record = schema.record(template.calculate(inputs))
+    return record.predictions(), pd.DataFrame(record.scenario_table, columns=["Metric", "Mid Scenario", "Good Scenario"])
+
+
+# ---------- HELPER: job progress ----------
+# Seconds between reruns while a job runs
+JOB_POLL_SECONDS = 0.5
+
+
+def render_job_progress(job):
+    """Progressive view of a running job; the results below replace it once it is done."""
+    with span("app.job_progress", ticker=job.ticker, status=job.status):
+        status = st.status("Processing...", expanded=True)
+        for message in job.steps:
+            status.write(message)
+
+        fundamentals = job.fundamentals
+        if fundamentals is None:
+            return
+
+        # Fundamentals and current price are known before the LLM answers
+        st.subheader("🎯 Valuation Targets")
+        scenario_json = job.scenario_json
+        live_preds, df_live_scen = (live_scenario_targets(job.ticker, fundamentals, scenario_json)
+                                    if scenario_json is not None else (None, None))
+        share_price = fundamentals.get("share_price")
+        show_metrics(live_preds or {"current_price": f"{share_price:.2f}" if share_price else "N/A",
+                                    "lower_prediction": "…", "upper_prediction": "…"})
+        st.write("")
+        col_fund, col_scen, col_text = st.columns([1, 1, 2])
+        with col_fund:
+            st.subheader("📊 Fundamentals")
+            st.markdown(
+                styled_table(fundamentals_frame(fundamentals), numeric_cols=["Qtr Value (000s)"]).to_html(),
+                unsafe_allow_html=True
+            )
+        with col_scen:
+            st.subheader("📈 Scenarios")
+            # Scenario targets as soon as the JSON block is complete, each input before that
+            if df_live_scen is None and job.scenarios:
+                df_live_scen = pd.DataFrame(
+                    [(label, job.scenarios[k].get("mid"), job.scenarios[k].get("good"))
+                     for k, label in SCENARIO_LABELS.items() if isinstance(job.scenarios.get(k), dict)],
+                    columns=["Metric", "Mid Scenario", "Good Scenario"],
+                )
+            if df_live_scen is not None:
+                st.markdown(
+                    styled_table(df_live_scen, numeric_cols=["Mid Scenario", "Good Scenario"]).to_html(),
+                    unsafe_allow_html=True
+                )
+            else:
+                st.caption("Waiting for the AI scenario inputs...")
+        with col_text:
+            st.subheader("📝 AI Analysis")
+            if job.report_text:
+                st.info(job.report_text)
+
+
+# ---------- HELPER: what-if inputs ----------
+# Step of the number inputs; rates and margins move in 1% steps
+WHATIF_STEPS = {"lt_earning_multiple": 1.0, "lt_net_debt": 1000.0}
+
+
+def _whatif_key(key, case):
+    return f"whatif_{key}_{case}"
+
+
+def reset_whatif():
+    """Back to the analysed values (callback of the Reset button and new analyses)."""
+    valuation = st.session_state.valuation
+    st.session_state.live = valuation.live_sheet() if valuation is not None else None
+    for name in [k for k in st.session_state if str(k).startswith("whatif_")]:
+        del st.session_state[name]
+
+
+def _apply_whatif(coord, widget_key):
+    # Runs before the rerun, so the targets shown below already include the edit
+    st.session_state.live.set({coord: st.session_state[widget_key]})
+
+
+def render_whatif_inputs(live, schema):
+    """
+    Number inputs for every scenario assumption. An edit recalculates only
+    the dependent cells of the live sheet: no refetch, no LLM call.
+    """
+    h_mid, h_good = st.columns(2)
+    h_mid.caption("Mid")
+    h_good.caption("Good")
+    for key, label in SCENARIO_LABELS.items():
+        cols = st.columns(2)
+        for col, case in zip(cols, ("mid", "good")):
+            coord = schema.cell(label, case)
+            widget_key = _whatif_key(key, case)
+            if widget_key not in st.session_state:
+                value = live.values.get(coord)
+                st.session_state[widget_key] = float(value) if isinstance(value, (int, float)) else 0.0
+            col.number_input(
+                label if case == "mid" else f"{label} (good)",
+                key=widget_key,
+                label_visibility="visible" if case == "mid" else "hidden",
+                step=WHATIF_STEPS.get(key, 0.01),
+                format="%.2f" if key in WHATIF_STEPS else "%.4f",
+                on_change=_apply_whatif,
+                args=(coord, widget_key),
+            )
+    st.button("Reset", on_click=reset_whatif, key="reset_whatif_btn")
+
+
+# ---------- HELPER: sensitivity panel ----------
+def render_sensitivity_panel(fundamentals, scenario_inputs, share_price=None):
+    """
+    2-D heatmap of the discounted target price over two scenario inputs,
+    plus a tornado chart of one-at-a-time deltas. Both come from a single
+    vectorized projection call, no workbook recalculation. Inputs without
+    a mid value are left out.
+    """
+    mid_base = base_inputs(fundamentals, scenario_inputs, case="mid")
+    keys = [key for key in scenario_inputs if key in mid_base and math.isfinite(mid_base[key])]
+    missing = [SCENARIO_LABELS[key] for key in scenario_inputs if key in mid_base and key not in keys]
+    if missing:
+        st.warning(f"No mid value for {', '.join(missing)}; left out of the sensitivity views.")
+    if len(keys) < 2:
+        return
+    c1, c2, c3 = st.columns([2, 2, 1])
+    with c1:
+        row_key = st.selectbox(
+            "Rows", keys, index=keys.index("expected_rev_cagr_5y") if "expected_rev_cagr_5y" in keys else 0,
+            format_func=SCENARIO_LABELS.get, key="sens_row",
+        )
+    with c2:
+        col_key = st.selectbox(
+            "Columns", keys,
+            index=keys.index("lt_earning_multiple") if "lt_earning_multiple" in keys else len(keys) - 1,
+            format_func=SCENARIO_LABELS.get, key="sens_col",
+        )
+    with c3:
+        case = st.radio("Base case", ["mid", "good"], horizontal=True, key="sens_case")
+
+    if row_key == col_key:
+        st.warning("Pick two different inputs.")
+        return
+
+    base = base_inputs(fundamentals, scenario_inputs, case=case)
+    row_values = default_range(row_key, scenario_inputs[row_key].get("mid"), scenario_inputs[row_key].get("good"))
+    col_values = default_range(col_key, scenario_inputs[col_key].get("mid"), scenario_inputs[col_key].get("good"))
+    grid = grid_frame(base, row_key, row_values, col_key, col_values)
+
+    df_grid = grid.stack().rename("Target").reset_index()
+    df_grid.columns = ["row", "col", "Target"]
+    color_scale = alt.Scale(scheme="redyellowgreen")
+    if share_price:
+        color_scale = alt.Scale(scheme="redyellowgreen", domainMid=share_price)
+
+    heatmap = alt.Chart(df_grid).mark_rect().encode(
+        x=alt.X("col:O", title=SCENARIO_LABELS[col_key], axis=alt.Axis(format=".2f", labelOverlap=True)),
+        y=alt.Y("row:O", title=SCENARIO_LABELS[row_key], sort="descending",
+                axis=alt.Axis(format=".2f", labelOverlap=True)),
+        color=alt.Color("Target:Q", scale=color_scale, title="Disc. Price"),
+        tooltip=[
+            alt.Tooltip("row:Q", title=SCENARIO_LABELS[row_key], format=".3f"),
+            alt.Tooltip("col:Q", title=SCENARIO_LABELS[col_key], format=".3f"),
+            alt.Tooltip("Target:Q", format=",.2f"),
+        ],
+    ).properties(height=380)
+
+    df_tornado = tornado(base, default_tornado_ranges(scenario_inputs, base))
+    df_bars = df_tornado.melt(
+        id_vars=["label"], value_vars=["delta_low", "delta_high"],
+        var_name="Shock", value_name="Delta",
+    )
+    df_bars["Shock"] = df_bars["Shock"].map({"delta_low": "Low", "delta_high": "High"})
+    tornado_chart = alt.Chart(df_bars).mark_bar().encode(
+        y=alt.Y("label:N", sort=list(df_tornado["label"]), title=None),
+        x=alt.X("Delta:Q", title="Change in Disc. Price"),
+        color=alt.Color("Shock:N", scale=alt.Scale(domain=["Low", "High"], range=["#ef4444", "#22c55e"])),
+        tooltip=["label", "Shock", alt.Tooltip("Delta:Q", format=",.2f")],
+    ).properties(height=380)
+
+    h_col, t_col = st.columns([3, 2])
+    with h_col:
+        st.altair_chart(heatmap, use_container_width=True)
+    with t_col:
+        st.altair_chart(tornado_chart, use_container_width=True)
+
+    if share_price:
+        # Reverse DCF: each input alone, the others at the base case
+        rows = []
+        for key in keys:
+            solved = implied_value(key, share_price, base)
+            rows.append({
+                "Input": SCENARIO_LABELS[key],
+                f"{case.title()} case": base[key],
+                "Implied by price": solved["value"].item() if solved["converged"] else None,
+            })
+        st.markdown(f"**What the current price ({share_price:,.2f}) implies**")
+        st.dataframe(pd.DataFrame(rows).style.format(precision=4, thousands=",", na_rep="out of range"),
+                     hide_index=True, use_container_width=True)
+
+
 st.title("🤖 AI Stock Valuation")
 st.markdown("Enter a ticker symbol to generate a valuation model and an AI-driven investment report.")
 
@@ -135,293 +379,149 @@ if "analysis_done" not in st.session_state:
     st.session_state.analysis_done = False
 if "ticker" not in st.session_state:
     st.session_state.ticker = ""
-if "ai_excel_path" not in st.session_state:
-    st.session_state.ai_excel_path = ""
+if "valuation" not in st.session_state:
+    st.session_state.valuation = None
 if "report_text" not in st.session_state:
     st.session_state.report_text = ""
 if "predictions" not in st.session_state:
     st.session_state.predictions = {}
+if "live" not in st.session_state:
+    st.session_state.live = None
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
+if "job_loaded" not in st.session_state:
+    st.session_state.job_loaded = None
 
 # --- MAIN LOGIC ---
+# The analysis runs as a background job (src/jobs.py): this script only
+# submits it and polls, so reruns and page reloads do not cancel it
+jobs = get_job_queue()
+
 if submit_btn and ticker_input:
     st.session_state.ticker = ticker_input
-    
-    status_container = st.status("Processing...", expanded=True)
-    
-    try:
-        # 1. Fetch Data
-        status_container.write(f"📊 Fetching latest quarter financial data for {ticker_input}...")
-        value_stock(ticker_input)
-        
-        base_excel_path = os.path.join("data", "valuations", f"{ticker_input}.xlsx")
-        if not os.path.exists(base_excel_path):
-            raise FileNotFoundError(f"Could not find generated file: {base_excel_path}")
-
-        # 2. Generate LLM Summary
-        status_container.write("🧠 Generating AI Investment Summary...")
-        context = load_valuation_excel(base_excel_path)
-        
-        llm_text = generate_llm_investment_summary(
-            context, 
-            provider="gemini", 
-            model="gemini-2.5-flash" 
-        )
-
-        # 3. Write to Excel
-        status_container.write("💾 Saving results and calculating scenarios...")
-        report_text, predictions, ai_excel_path = write_llm_result_to_excel(
-            excel_path=base_excel_path, 
-            ticker=ticker_input, 
-            llm_text=llm_text
-        )
-        
-        st.session_state.ai_excel_path = ai_excel_path
-        st.session_state.report_text = report_text
-        st.session_state.predictions = predictions
+    st.session_state.job_id = jobs.submit(ticker_input, provider="gemini", model="gemini-2.5-flash")
+    st.session_state.analysis_done = False
+    # Kept in the URL, a reloaded page picks the job up again
+    st.query_params["job"] = st.session_state.job_id
+elif st.session_state.job_id is None and st.query_params.get("job"):
+    st.session_state.job_id = st.query_params["job"]
+
+job = jobs.get(st.session_state.job_id)
+# Decided once: a job finishing while this run renders still gets the rerun below
+job_running = job is not None and job.active
+if job_running:
+    st.session_state.ticker = job.ticker
+    render_job_progress(job)
+
+elif job is not None and st.session_state.job_loaded != job.id:
+    # First run after the job finished: take over its result
+    st.session_state.job_loaded = job.id
+    st.session_state.ticker = job.ticker
+    if job.status == "done":
+        valuation = job.result
+        st.session_state.valuation = valuation
+        st.session_state.report_text = valuation.report_text
+        st.session_state.predictions = valuation.predictions
         st.session_state.analysis_done = True
-        
-        status_container.update(label="Analysis Complete!", state="complete", expanded=False)
-
-
-
-
-    except Exception as e:
-        status_container.update(label="Error Occurred", state="error")
-        st.error(f"An error occurred: {str(e)}")
+        reset_whatif()
+    else:
+        st.status(job.message, state="error")
+        st.error(f"An error occurred: {job.error}")
         st.session_state.analysis_done = False
 
 # --- RESULTS DISPLAY ---
-if st.session_state.analysis_done:
+# Results and what-if reruns; the analysis above has its own spans
+with span("app.render", ticker=st.session_state.ticker):
+    if st.session_state.analysis_done:
+
+        valuation = st.session_state.valuation
 
-    # download button 
-    if st.session_state.ai_excel_path and os.path.exists(st.session_state.ai_excel_path):
-        _, col_dl, _ = st.columns([1, 2, 1])
-        with col_dl:
-            with open(st.session_state.ai_excel_path, "rb") as f:
+        # download button (workbook serialized once, kept on the result)
+        if valuation is not None:
+            _, col_dl, _ = st.columns([1, 2, 1])
+            with col_dl:
                 st.download_button(
                     label="📥 Download Valuation Excel",
-                    data=f,
-                    file_name=os.path.basename(st.session_state.ai_excel_path),
+                    data=valuation.to_bytes(),
+                    file_name=f"{valuation.ticker}_ai.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     use_container_width=True,
                 )
     
-    st.divider()
-
-
-    # Load and prepare data for Fundamentals & Scenarios
-    if os.path.exists(st.session_state.ai_excel_path):
-
-        df = pd.read_excel(st.session_state.ai_excel_path, header=None)
-
-
-        df = df.iloc[:38, :3]  # keep A–C, and limit rows if needed
-
-        # find split index
-        split_idx = 20
-        start_keyword = "Expected Revenue CAGR"
-        for i, row in df.iterrows():
-            val = row.iloc[0]
-            if isinstance(val, str) and start_keyword in val:
-                split_idx = i
-                break
-
-        # ---------- Fundamentals ----------
-        df_fund = df.iloc[:split_idx].copy()
-        df_fund.columns = ["Metric", "Qtr Value (000s)", "Notes"]
-
-        df_fund_display = df_fund[["Metric", "Qtr Value (000s)"]].copy()
-        df_fund_display = df_fund_display.dropna(how="all")
-        df_fund_display = df_fund_display[df_fund_display["Metric"].notna()]
-        df_fund_display = df_fund_display[
-            df_fund_display["Metric"].astype(str).str.strip() != ""
-        ]
-
-        # ---------- Scenarios ----------
-        df_scenarios = df.iloc[split_idx:].copy()
-        df_scenarios.columns = ["Metric", "Mid Scenario", "Good Scenario"]
-
-        df_scenarios = df_scenarios.dropna(how="all")
-        df_scenarios = df_scenarios[df_scenarios["Metric"].notna()]
-        df_scenarios = df_scenarios[
-            df_scenarios["Metric"].astype(str).str.strip() != ""
-        ]
-
-        # ---- Fundamentals değerlerini çek ----
-        def get_fund(metric):
-            try:
-                val = df_fund_display.loc[
-                    df_fund_display["Metric"] == metric, "Qtr Value (000s)"
-                ].iloc[0]
-                return float(val)
-            except IndexError:
-                return None
-
-        share_price   = get_fund("Share Price")
-        shares_out    = get_fund("Shares Outstanding")
-        revenue_qtr   = get_fund("Revenue (Qtr)")
-        cogs          = get_fund("COGS")
-        opex          = get_fund("OPEX")
-        op_profit     = get_fund("Operating Profit")
-        cash          = get_fund("Cash")
-        debt          = get_fund("Debt")
-
-        # ---- Python ile temel türevler ----
-        market_cap       = share_price * shares_out if share_price and shares_out else None
-        gross_profit     = revenue_qtr - cogs if revenue_qtr is not None and cogs is not None else None
-        gross_margin     = (gross_profit / revenue_qtr) if revenue_qtr else None
-        ebitda_ps        = op_profit / shares_out if op_profit is not None and shares_out else None
-        operating_margin = (op_profit / revenue_qtr) if revenue_qtr else None
-        net_cash         = (cash - debt) if cash is not None and debt is not None else None
-
-        # Fundamentals tablosunu override et
-        fund_overrides = {
-            "Market Cap (auto)": market_cap,
-            "Gross Profit": gross_profit,
-            "Gross Margin": gross_margin,
-            "Operating Margin": operating_margin,
-            "Net Cash (auto)": net_cash,
-            "EBITDA PS": ebitda_ps,
-        }
-        for metric, val in fund_overrides.items():
-            if val is not None:
-                mask = df_fund_display["Metric"] == metric
-                if mask.any():
-                    df_fund_display.loc[mask, "Qtr Value (000s)"] = val
-
-        # ---- Scenarios değerlerini çek ----
-        def get_scen(metric, col):
-            try:
-                val = df_scenarios.loc[df_scenarios["Metric"] == metric, col].iloc[0]
-                return float(val)
-            except IndexError:
-                return None
-
-        cagr_mid   = get_scen("Expected Revenue CAGR (5y)", "Mid Scenario")
-        cagr_good  = get_scen("Expected Revenue CAGR (5y)", "Good Scenario")
-
-        op_margin_mid   = get_scen("E Operated Margin", "Mid Scenario")
-        op_margin_good  = get_scen("E Operated Margin", "Good Scenario")
-
-        dil_mid   = get_scen("Expected Dilution (5y)", "Mid Scenario")
-        dil_good  = get_scen("Expected Dilution (5y)", "Good Scenario")
-
-        tax_mid   = get_scen("Tax rate", "Mid Scenario") or 0.21
-        tax_good  = get_scen("Tax rate", "Good Scenario") or tax_mid
-
-        mult_mid  = get_scen("Long Term Earning Multiple", "Mid Scenario") or 25
-        mult_good = get_scen("Long Term Earning Multiple", "Good Scenario") or mult_mid
-
-
-        # ---- senaryo bazlı hesaplama fonksiyonu ----
-        def compute_scenario_targets(ticker, cagr, op_margin, tax_rate, dilution, multiple):
-            if revenue_qtr is None or shares_out is None or cagr is None or op_margin is None:
-                return None, None, None
-
-            revenue_year0 = revenue_qtr * 4  # Q'dan yıla
-            rev_5y = revenue_year0 * (1 + cagr) ** 5
-            ebit_5y = rev_5y * op_margin
-            earning_5y = ebit_5y * (1 - tax_rate)
-
-            # basit P/E tarzı değerleme
-            equity_5y = earning_5y * multiple
-
-            shares_5y = shares_out * (1 + (dilution or 0.0))
-            price_5y = equity_5y / shares_5y if shares_5y else None
-
-            if ticker_input[-3:] == ".IS":
-                disc_rate = 0.25  # Türkiye için daha yüksek iskonto
-            else:
-                disc_rate = 0.05  # Standart 5% iskonto            
+        st.divider()
 
-            price_5y_disc = price_5y/(((1+disc_rate) ** 5))  # iskonto ile bugüne indirgeme
 
-            return rev_5y, ebit_5y, earning_5y, shares_5y, price_5y, price_5y_disc, disc_rate
-
-        e_rev_mid, e_ebit_mid, earning_mid,shares_mid, price_mid, price_mid_disc,disc_rate = compute_scenario_targets(
-            ticker_input,cagr_mid, op_margin_mid, tax_mid, dil_mid, mult_mid
-        )
-        e_rev_good, e_ebit_good,earning_good,shares_good, price_good, price_good_disc, disc_rate = compute_scenario_targets(
-            ticker_input,cagr_good, op_margin_good, tax_good, dil_good, mult_good
-        )
+        # Fundamentals & Scenarios straight from the calculated workbook
+        if valuation is not None:
 
-        # EPS hesapla
-        eps_mid = earning_mid / shares_mid  
-        eps_good = earning_good / shares_good   
-
-        # Scenarios tablosunda ilgili satırları override et
-        scen_override_rows = {
-            "E Revenue": (e_rev_mid, e_rev_good),
-            "E EBITDA": (e_ebit_mid, e_ebit_good),
-            "Earning": (earning_mid, earning_good),
-            "E Shares Outstanding": (shares_mid, shares_good),
-            "Expected EPS": (eps_mid, eps_good),
-            "Predicted Share Price 5 yr": (price_mid, price_good),
-            "Predicted Share Price Disc": (price_mid_disc, price_good_disc),
-            "Discounted rate": (disc_rate, disc_rate),
-        }
-        for metric, (mid_val, good_val) in scen_override_rows.items():
-            mask = df_scenarios["Metric"] == metric
-            if mask.any():
-                if mid_val is not None:
-                    df_scenarios.loc[mask, "Mid Scenario"] = mid_val
-                if good_val is not None:
-                    df_scenarios.loc[mask, "Good Scenario"] = good_val
-
-        # ---- Valuation Targets prediction ----
-        if share_price is not None and price_mid_disc is not None and price_good_disc is not None:
-            st.session_state.predictions = {
-                "ticker": st.session_state.ticker,
-                "current_price": f"{share_price:.2f}",
-                "lower_prediction": f"{price_mid_disc:.2f}",
-                "upper_prediction": f"{price_good_disc:.2f}",
-            }
-
-        # 1. Top Level Metrics (Python hesaplarından)
-        st.subheader("🎯 Valuation Targets")
+            # Targets and tables follow the what-if edits of the Scenarios panel
+            if st.session_state.live is None:
+                reset_whatif()
+            live_sheet = st.session_state.live
+            record = valuation.schema.record(live_sheet.values)
+            st.session_state.predictions = record.predictions()
 
-        def show_metrics(preds):
-            m1, m2, m3 = st.columns(3)
-            m1.metric(
-                "Current Price", preds.get("current_price", "N/A")
+            df_fund_display = fundamentals_frame(record.fundamentals)
+            df_scenarios = pd.DataFrame(
+                record.scenario_table, columns=["Metric", "Mid Scenario", "Good Scenario"]
             )
-            m2.metric("Mid Target", preds.get("lower_prediction", "N/A"))
-            m3.metric("Upper Target", preds.get("upper_prediction", "N/A"))
 
-        show_metrics(st.session_state.predictions)
-        st.write("")
+            # 1. Top Level Metrics
+            st.subheader("🎯 Valuation Targets")
 
+            show_metrics(st.session_state.predictions)
+            st.write("")
 
-        # Fundamentals (25%) | Scenarios (25%) | AI Summary (50%)
-        col_fund, col_scen, col_text = st.columns([1, 1, 2])
 
+            # Fundamentals (25%) | Scenarios (25%) | AI Summary (50%)
+            col_fund, col_scen, col_text = st.columns([1, 1, 2])
 
-        with col_fund:
-            st.subheader("📊 Fundamentals")
-            st.markdown(
-                styled_table(df_fund_display, numeric_cols=["Qtr Value (000s)"]).to_html(),
-                unsafe_allow_html=True
-            )
 
-        with col_scen:
-            st.subheader("📈 Scenarios")
-            st.markdown(
-                styled_table(
-                    df_scenarios,
-                    numeric_cols=["Mid Scenario", "Good Scenario"],
-                ).to_html(),
-                unsafe_allow_html=True
-            )
+            with col_fund:
+                st.subheader("📊 Fundamentals")
+                st.markdown(
+                    styled_table(df_fund_display, numeric_cols=["Qtr Value (000s)"]).to_html(),
+                    unsafe_allow_html=True
+                )
 
-        with col_text:
-            st.subheader("📝 AI Analysis")
-            st.info(st.session_state.report_text)
+            with col_scen:
+                st.subheader("📈 Scenarios")
+                st.markdown(
+                    styled_table(
+                        df_scenarios,
+                        numeric_cols=["Mid Scenario", "Good Scenario"],
+                    ).to_html(),
+                    unsafe_allow_html=True
+                )
+                with st.expander("✏️ What-if", expanded=False):
+                    render_whatif_inputs(live_sheet, valuation.schema)
+                    st.caption("Edits update the targets instantly; the download keeps the analysed values.")
+
+            with col_text:
+                st.subheader("📝 AI Analysis")
+                st.info(st.session_state.report_text)
+
+            # ---------- Sensitivity ----------
+            if record.mid_target is not None and record.good_target is not None:
+                st.divider()
+                st.subheader("🔬 Sensitivity")
+                scenario_inputs = {key: dict(cases) for key, cases in record.scenarios.items()}
+                # Inputs that do not change the result when left empty
+                for key in ("expected_dilution", "lt_net_debt", "interest_rate_debt"):
+                    for case in ("mid", "good"):
+                        if scenario_inputs[key][case] is None:
+                            scenario_inputs[key][case] = 0.0
+                render_sensitivity_panel(
+                    fundamentals=record.fundamentals,
+                    scenario_inputs=scenario_inputs,
+                    share_price=record.share_price,
+                )
 
-    else:
-        st.warning("Data file missing.")
+        else:
+            st.warning("Data file missing.")
 
-elif not submit_btn and not st.session_state.analysis_done:
-    st.info("👈 Enter a ticker above to start.")
+    elif job is None:
+        st.info("👈 Enter a ticker above to start.")
 
 
 # --- Footer: Developed by Kaplanbr ---
@@ -434,3 +534,8 @@ st.markdown(
     """,
     unsafe_allow_html=True,
 )
+
+# Poll the running job: rerun until it is done (the job itself runs on a worker thread)
+if job_running:
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
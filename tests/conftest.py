@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The modules are imported as src.x from the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.replay import load_fixtures, offline  # noqa: E402
+from src.fin_data_yf import YFinanceDataFetcher  # noqa: E402
+from src.stock_valuation import valuation_inputs  # noqa: E402
+from src.template_cache import get_template  # noqa: E402
+
+RECORDED = tuple(load_fixtures())   # PANW, GOOG, THYAO.IS
+
+
+@pytest.fixture(scope="session")
+def records():
+    """Template valuation of each recorded ticker (benchmarks/fixtures), calculated offline."""
+    template = get_template()
+    out = {}
+    with offline():
+        for ticker in RECORDED:
+            data = YFinanceDataFetcher(ticker).fetch_all_data()
+            out[ticker] = template.schema.record(template.calculate(valuation_inputs(ticker, data, template.schema)))
+    return out
@@ -0,0 +1,46 @@
+import math
+import os
+
+import openpyxl
+import pytest
+
+from src.formula_engine import FormulaEngine, LiveSheet
+from src.schema import SCENARIO_LABELS, TARGET_LABEL
+from src.template_cache import get_template
+
+# Workbooks saved by Excel, so every formula cell has Excel's cached value
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+SAVED = [os.path.join(DATA, "valuations", "PANW.xlsx"), os.path.join(DATA, "valuations", "ai-summaries", "PANW_ai.xlsx")]
+
+
+def assert_same(actual, expected, where):
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        assert math.isclose(actual, expected, rel_tol=1e-9, abs_tol=1e-9), where
+    else:
+        assert actual == expected, where
+
+
+@pytest.mark.parametrize("path", SAVED)
+def test_engine_matches_excel(path):
+    engine = FormulaEngine.from_worksheet(openpyxl.load_workbook(path).active)
+    cached = openpyxl.load_workbook(path, data_only=True).active
+    values = engine.calculate()
+    assert engine.formulas
+    for coord in engine.formulas:
+        assert_same(values[coord], cached[coord].value, f"{path}!{coord}")
+
+
+def test_live_sheet_matches_full_calculation():
+    template = get_template()
+    schema = template.schema
+    changes = {
+        schema.cell(SCENARIO_LABELS["expected_rev_cagr_5y"]): 0.3,
+        schema.cell(SCENARIO_LABELS["lt_earning_multiple"], "good"): 40,
+        schema.cell("Revenue (Qtr)"): 1_000_000,
+    }
+    live = LiveSheet(template.engine, template.calculate())
+    changed = live.set(changes)
+    expected = template.calculate(changes)
+    assert schema.cell(TARGET_LABEL) in changed
+    for coord, value in expected.items():
+        assert_same(live.values[coord], value, coord)
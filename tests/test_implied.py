@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.implied import implied_frame, implied_value
+from src.projection import project
+from src.sensitivity import base_inputs
+
+from conftest import RECORDED
+
+
+@pytest.mark.parametrize("ticker", RECORDED)
+@pytest.mark.parametrize("key", ["expected_rev_cagr_5y", "expected_op_margin", "lt_earning_multiple"])
+def test_implied_value_reproduces_the_price(records, ticker, key):
+    record = records[ticker]
+    base = base_inputs({**record.fundamentals, "ticker": ticker}, record.scenarios)
+    solved = implied_value(key, record.share_price, base)
+    assert solved["status"] == "converged"
+    price = project(**{**base, key: solved["value"]})["price_5y_disc"]
+    assert np.isclose(price, record.share_price, rtol=1e-8)
+
+
+def test_implied_value_statuses():
+    base = {"revenue_qtr": 1000.0, "shares_outstanding": 100.0, "expected_op_margin": 0.2,
+            "expected_dilution": 0.0, "tax_rate": 0.2, "lt_earning_multiple": 20.0}
+    solved = implied_value("expected_rev_cagr_5y", [50.0, np.nan, 1e12], base)
+    assert list(solved["status"]) == ["converged", "invalid", "no_root"]
+
+
+@pytest.mark.parametrize("case", ["mid", "good"])
+def test_implied_frame_at_the_target_gives_the_input(records, case):
+    frame = pd.DataFrame([records[t].as_row() for t in RECORDED])
+    frame["share_price"] = frame[f"{case}_target"]
+    out = implied_frame(frame, "expected_rev_cagr_5y", scenario=case)
+    assert (out["expected_rev_cagr_5y_status"] == "converged").all()
+    assert np.allclose(out["implied_expected_rev_cagr_5y"], frame[f"expected_rev_cagr_5y_{case}"], rtol=1e-6)
+    # Without the per-case rate column the ticker's rate for the case is used
+    out = implied_frame(frame.drop(columns=["disc_rate_mid", "disc_rate_good"]), "expected_rev_cagr_5y", scenario=case)
+    assert np.allclose(out["implied_expected_rev_cagr_5y"], frame[f"expected_rev_cagr_5y_{case}"], rtol=1e-6)
+
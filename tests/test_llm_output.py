@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from src.llm_output import ScenarioStreamParser, parse_llm_output
+from src.schema import SCENARIO_LABELS
+from src.template_cache import get_schema
+
+SCENARIOS = {
+    "expected_rev_cagr_5y": {"mid": 0.1, "good": 0.15},
+    "expected_op_margin": {"mid": 0.25, "good": 0.3},
+    "expected_dilution": {"mid": 0.01, "good": 0.0},
+    "lt_net_debt": {"mid": 0, "good": 0},
+    "interest_rate_debt": {"mid": 0.05, "good": 0.05},
+    "tax_rate": {"mid": 0.2, "good": 0.2},
+    "lt_earning_multiple": {"mid": 20, "good": 25},
+}
+BODY = json.dumps(SCENARIOS)
+
+
+def answer(report="Rating **Buy**", json_part=BODY, marker="SCENARIO_JSON_START"):
+    return f"{report}\n\n{marker}\n{json_part}"
+
+
+@pytest.mark.parametrize("text, report", [
+    (answer(), "Rating **Buy**"),
+    (answer(marker="**SCENARIO_JSON_START**", json_part=f"```json\n{BODY}\n```"), "Rating **Buy**"),
+    (answer(report="Code:\n```python\nx = 1\n```"), "Code:\n```python\nx = 1\n```"),
+    ("Report\n```\nSCENARIO_JSON_START\n" + BODY + "\n```", "Report"),
+    ("Report\n\n## SCENARIO_JSON_START\n" + BODY, "Report"),
+    ("Report **Buy**\n\n```json\n" + BODY + "\n```", "Report **Buy**"),   # no marker
+])
+def test_report_keeps_its_own_markup(text, report):
+    report_text, scenario_json = parse_llm_output(text)
+    assert report_text == report
+    assert scenario_json == SCENARIOS
+
+
+def test_lenient_json():
+    text = answer(json_part="{expected_rev_cagr_5y: {mid: '12%', good: '18%'}, // growth\n"
+                            "'tax_rate': 0.2,}")
+    _, scenario_json = parse_llm_output(text)
+    assert scenario_json["expected_rev_cagr_5y"] == {"mid": 0.12, "good": 0.18}
+    assert scenario_json["tax_rate"] == {"mid": 0.2, "good": 0.2}
+
+
+def test_no_json():
+    assert parse_llm_output("Just **Buy**\n") == ("Just **Buy**", None)
+
+
+@pytest.mark.parametrize("value", [None, "N/A", [0.1, 0.2]])
+def test_non_numeric_value_keeps_template_cell(value):
+    scenarios = dict(SCENARIOS, lt_net_debt=value, tax="N/A")
+    _, scenario_json = parse_llm_output(answer(json_part=json.dumps(scenarios)))
+    assert scenario_json["lt_net_debt"] == {"mid": None, "good": None}
+
+    schema = get_schema()
+    inputs = schema.scenario_inputs(scenario_json)
+    assert schema.cell(SCENARIO_LABELS["lt_net_debt"]) not in inputs
+    assert schema.cell(SCENARIO_LABELS["lt_net_debt"], "good") not in inputs
+    assert inputs[schema.cell(SCENARIO_LABELS["expected_rev_cagr_5y"])] == 0.1
+
+
+def test_missing_good_defaults_to_mid():
+    schema = get_schema()
+    inputs = schema.scenario_inputs({"tax_rate": {"mid": 0.2, "good": None}, "lt_net_debt": None})
+    assert inputs == {schema.cell(SCENARIO_LABELS["tax_rate"]): 0.2, schema.cell(SCENARIO_LABELS["tax_rate"], "good"): 0.2}
+
+
+def test_streaming_matches_whole_answer():
+    text = answer(marker="**SCENARIO_JSON_START**", json_part=f"```json\n{json.dumps(SCENARIOS, indent=2)}\n```")
+    parser = ScenarioStreamParser()
+    keys = []
+    for i in range(0, len(text), 7):
+        keys += [event[1] for event in parser.feed(text[i:i + 7]) if event[0] == "scenario"]
+    assert parser.close() == parse_llm_output(text)
+    assert keys == list(SCENARIOS)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.projection import discount_rates, project, project_scenarios
+
+from conftest import RECORDED
+
+
+@pytest.mark.parametrize("ticker", RECORDED)
+@pytest.mark.parametrize("case", ["mid", "good"])
+def test_project_matches_template(records, ticker, case):
+    record = records[ticker]
+    projected = project(
+        record.fundamentals["revenue_qtr"],
+        record.fundamentals["shares_outstanding"],
+        disc_rate=discount_rates([ticker], case)[0],
+        **{key: cases[case] or 0.0 for key, cases in record.scenarios.items()},
+    )["price_5y_disc"]
+    assert np.isclose(projected, getattr(record, f"{case}_target"), rtol=1e-9)
+
+
+def test_project_scenarios_on_batch_rows(records):
+    rows = project_scenarios(pd.DataFrame([records[t].as_row() for t in RECORDED]))
+    for i, ticker in enumerate(RECORDED):
+        assert np.isclose(rows["price_5y_disc_mid"][i], records[ticker].mid_target, rtol=1e-9)
+        assert np.isclose(rows["price_5y_disc_good"][i], records[ticker].good_target, rtol=1e-9)
+
+
+def test_is_tickers_get_the_case_rate():
+    assert list(discount_rates(["THYAO.IS", "PANW"], "mid")) == [0.30, 0.05]
+    assert list(discount_rates(["THYAO.IS", "PANW"], "good")) == [0.25, 0.05]